@@ -3,18 +3,21 @@ export_onnx.py — Ejecutar DESPUÉS de que trainer.py haya generado data/model.
 Usa from_keras directo, sin tf.function, para máxima compatibilidad con RKNN 2.3.2
 """
 
+import os
 import tensorflow as tf
 import tf2onnx
 import numpy as np
 
 INPUT_DIM = 90  # TIME_STEPS(10) * FEATURES(9)
+# Batch fijo para la NPU (el bot debe arrancar con el mismo MODEL_BATCH)
+EXPORT_BATCH = max(1, int(os.getenv("EXPORT_BATCH", 1)))
 
 print("📂 Cargando modelo...")
 model = tf.keras.models.load_model("data/model.h5")
 model.summary()
 
 print("\n🔄 Convirtiendo a ONNX via from_keras...")
-spec = (tf.TensorSpec((1, INPUT_DIM), tf.float32, name="input"),)  # batch=1 fijo
+spec = (tf.TensorSpec((EXPORT_BATCH, INPUT_DIM), tf.float32, name="input"),)  # batch fijo
 
 model_proto, _ = tf2onnx.convert.from_keras(
     model, input_signature=spec, opset=11, output_path="data/madness.onnx"
@@ -22,7 +25,7 @@ model_proto, _ = tf2onnx.convert.from_keras(
 
 print("✅ data/madness.onnx generado.")
 print("\n👉 Ahora ejecuta el comando Docker:")
-print("""
+print(f"""
 docker exec -it lula_final python3 -c "
 from rknn.api import RKNN
 rknn = RKNN()
@@ -30,7 +33,7 @@ rknn.config(target_platform='rk3588', optimization_level=0)
 rknn.load_onnx(
     model='/app/data/madness.onnx',
     inputs=['input'],
-    input_size_list=[[1, 90]]
+    input_size_list=[[{EXPORT_BATCH}, {INPUT_DIM}]]
 )
 rknn.build(do_quantization=False)
 rknn.export_rknn('/app/data/madness.rknn')
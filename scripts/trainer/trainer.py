@@ -1,8 +1,13 @@
-import os, ccxt, joblib, numpy as np, pandas as pd, tensorflow as tf, tf2onnx, yfinance as yf
-import pandas_ta as ta
+import os, sys, ccxt, joblib, numpy as np, pandas as pd, tensorflow as tf, tf2onnx, yfinance as yf
+import time
+from pathlib import Path
 from sklearn.preprocessing import MinMaxScaler
 from sklearn.model_selection import train_test_split
 
+# Kernel de features compartido con src/brain.py
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "src"))
+from features import FEATURES, OHLCV, align_spx, closed_spx, compute_indicators, series_to_bars
+
 # ==========================================
 # CONFIGURACIÓN SINCRONIZADA v7.5
 # ==========================================
@@ -31,8 +36,9 @@ SYMBOLS = [
 
 TIME_STEPS = 10
 EPOCHS = 50
-FEATURES = ["returns", "rsi", "volatility", "rvol", "corr_spx", "dist_ema"]
 INPUT_DIM = TIME_STEPS * len(FEATURES)  # 60
+# Batch de exportación: 1 = clásico, N = batch fijo para la NPU, 0 = dinámico (solo ONNX)
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", 1))
 
 
 # ==========================================
@@ -45,10 +51,8 @@ def fetch_sp500():
         sp500 = raw["Close"] if "Close" in raw.columns else raw.iloc[:, 0]
         if isinstance(sp500, pd.DataFrame):
             sp500 = sp500.iloc[:, 0]
-        sp500 = sp500.to_frame("sp500")
-        if hasattr(sp500.index, "tz") and sp500.index.tz is not None:
-            sp500.index = sp500.index.tz_localize(None)
-        sp500.index = sp500.index.floor("h")
+        # [[ts_ms UTC, close]] solo con velas cerradas, como MacroService.spx_bars en vivo
+        sp500 = closed_spx(series_to_bars(sp500.dropna()), time.time() * 1000)
         print(f"   ✅ S&P 500: {len(sp500)} filas.")
         return sp500
     except Exception as e:
@@ -76,20 +80,11 @@ def fetch_crypto(symbol):
 # 2. FEATURE ENGINEERING (Sincronizado con Brain)
 # ==========================================
 def build_features(df, sp500):
-    df["returns"] = np.log(df["close"] / df["close"].shift(1))
-    df["rsi"] = df.ta.rsi(length=14) / 100.0
-    atr = df.ta.atr(length=14)
-    df["volatility"] = (atr / df["close"]).fillna(0)
-    df["vol_sma"] = df["volume"].rolling(20).mean()
-    df["rvol"] = (df["volume"] / df["vol_sma"]).fillna(1.0)
-    df["ema200"] = df.ta.ema(length=200)
-    df["dist_ema"] = ((df["close"] - df["ema200"]) / df["ema200"]).fillna(0)
-
-    if sp500 is not None:
-        df = df.join(sp500, how="left").ffill().bfill()
-        df["corr_spx"] = df["close"].rolling(24).corr(df["sp500"]).fillna(0)
-    else:
-        df["corr_spx"] = 0.0
+    # S&P alineado a las velas con la misma función que brain.py en vivo
+    ts_ms = df.index.values.astype("datetime64[ms]").astype(np.int64)
+    ind = compute_indicators(df[OHLCV].values, align_spx(ts_ms, sp500))
+    for f in FEATURES:
+        df[f] = ind[f][0]
 
     # Target: subida del 0.5% en las próximas 4h
     df["target"] = (df["close"].shift(-4) > df["close"] * 1.005).astype(int)
@@ -147,15 +142,27 @@ def run_pipeline():
         X_train, y_train, epochs=EPOCHS, batch_size=64, validation_data=(X_test, y_test), verbose=1
     )
 
-    # Exportación a ONNX
-    print("\n🔄 Exportando a ONNX...")
-    spec = (tf.TensorSpec((1, INPUT_DIM), tf.float32, name="input"),)
+    # Pesos para el backend NumPy de brain (CPU sin NPU ni onnxruntime)
+    dense = [m for m in model.layers if isinstance(m, tf.keras.layers.Dense)]
+    weights = {}
+    for i, layer in enumerate(dense):
+        W, b = layer.get_weights()
+        weights[f"W{i}"], weights[f"b{i}"] = W, b
+    np.savez("data/madness_mlp.npz", **weights)
+    print(f"✅ Pesos MLP ({len(dense)} capas) guardados en data/madness_mlp.npz")
+
+    # Exportación a ONNX (batch fijo N o dinámico con None)
+    batch_dim = EXPORT_BATCH if EXPORT_BATCH > 0 else None
+    print(f"\n🔄 Exportando a ONNX (batch={batch_dim or 'dinámico'})...")
+    spec = (tf.TensorSpec((batch_dim, INPUT_DIM), tf.float32, name="input"),)
     tf2onnx.convert.from_keras(
         model, input_signature=spec, opset=11, output_path="data/madness.onnx"
     )
 
     print("\n✨ PROCESO COMPLETADO ✨")
-    print(f"Usa input_size_list=[[1, {INPUT_DIM}]] en el script de conversión RKNN.")
+    rknn_batch = EXPORT_BATCH if EXPORT_BATCH > 0 else 1
+    print(f"Usa input_size_list=[[{rknn_batch}, {INPUT_DIM}]] en el script de conversión RKNN.")
+    print(f"Y arranca el bot con MODEL_BATCH={rknn_batch}.")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,349 @@
+"""
+LULA AUDIT v1.0 — AUDITORÍA DEL GUARDIAN EN SEGUNDO PLANO
+El bucle de trading solo mete la entrada en una cola; un hilo la escribe por
+lotes en guardian_audit.json (JSONL). El archivo rota por tamaño o antigüedad y
+los rotados se comprimen (.gz). `export_columnar` vuelca los rotados a
+particiones mensuales NumPy (.npy estructurado) y `query` las recorre con mmap:
+meses de decisiones por símbolo sin cargarlo todo en memoria.
+
+    python src/audit.py --symbol SOL/USDT --since 2025-01-01
+"""
+
+import glob
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+AUDIT_PATH = "/app/data/guardian_audit.json"
+AUDIT_MAX_BYTES = int(float(os.getenv("AUDIT_MAX_MB", 20)) * 1024 * 1024)
+AUDIT_ROTATE_SEC = float(os.getenv("AUDIT_ROTATE_SEC", 86400))
+AUDIT_FLUSH_SEC = float(os.getenv("AUDIT_FLUSH_SEC", 2.0))
+AUDIT_KEEP = int(os.getenv("AUDIT_KEEP", 180))  # nº de archivos rotados a conservar
+
+# Esquema columnar común a las dos clases de entrada (evento y riesgo)
+AUDIT_DTYPE = np.dtype(
+    [
+        ("ts", "f8"),
+        ("symbol", "U20"),
+        ("kind", "U8"),  # "evento" (_log_event) | "riesgo" (analizar_riesgo)
+        ("riesgo", "f4"),
+        ("permitido", "i1"),  # 1 / 0 / -1 (desconocido)
+        ("r_macro", "f4"),
+        ("r_indiv", "f4"),
+        ("r_ext", "f4"),
+        ("vix", "f4"),
+        ("dxy", "f4"),
+        ("fng", "f4"),
+        ("prob", "f4"),
+        ("motivo", "U48"),
+    ]
+)
+
+
+def _ts(value):
+    """ts numérico o "%Y-%m-%d %H:%M:%S" (hora local) → epoch."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return time.mktime(time.strptime(value, "%Y-%m-%d %H:%M:%S"))
+    except Exception:
+        return float("nan")
+
+
+def normalize(entry):
+    """Entrada JSON (cualquiera de los dos formatos) → tupla de AUDIT_DTYPE."""
+    nan = float("nan")
+    macro = entry.get("macro") or {}
+    if "sym" in entry:
+        kind, symbol = "riesgo", entry["sym"]
+        riesgo, permitido, motivo = entry.get("r", nan), -1, ""
+    else:
+        kind, symbol = "evento", entry.get("symbol", "")
+        riesgo = entry.get("riesgo", nan)
+        permitido = 1 if entry.get("permitido") else 0
+        motivo = str(entry.get("motivo", ""))[:48]
+    try:
+        riesgo = float(riesgo)
+    except (TypeError, ValueError):
+        riesgo = nan
+    return (
+        _ts(entry.get("ts")),
+        symbol,
+        kind,
+        riesgo,
+        permitido,
+        entry.get("r_macro", nan),
+        entry.get("r_indiv", nan),
+        entry.get("r_ext", nan),
+        entry.get("vix", macro.get("vix", nan)),
+        entry.get("dxy", macro.get("dxy", nan)),
+        entry.get("fng", macro.get("fng", nan)),
+        entry.get("prob", nan),
+        motivo,
+    )
+
+
+def _open_any(path):
+    return gzip.open(path, "rt") if path.endswith(".gz") else open(path, "r")
+
+
+def iter_file(path, symbol=None):
+    """Recorre un JSONL (plano o .gz) entrada a entrada, filtrando por símbolo."""
+    needle = json.dumps(symbol) if symbol else None
+    try:
+        with _open_any(path) as f:
+            for line in f:
+                if needle and needle not in line:  # descarte barato antes de parsear
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except (OSError, EOFError):
+        return
+
+
+class AuditWriter:
+    """
+    audit = AuditWriter("/app/data/guardian_audit.json").start()
+    audit.write({...})      # no bloquea: cola en memoria
+    """
+
+    def __init__(
+        self,
+        path=AUDIT_PATH,
+        max_bytes=AUDIT_MAX_BYTES,
+        rotate_sec=AUDIT_ROTATE_SEC,
+        flush_sec=AUDIT_FLUSH_SEC,
+        keep=AUDIT_KEEP,
+        maxsize=10000,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_sec = rotate_sec
+        self.flush_sec = flush_sec
+        self.keep = keep
+        self.dropped = 0
+        self._q = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._opened_at = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="lula-audit", daemon=True)
+            self._thread.start()
+        return self
+
+    def write(self, entry):
+        """Encola una entrada. Si la cola está llena se descarta (nunca frena el trading)."""
+        try:
+            self._q.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """Espera a que la cola se vacíe (tests / apagado)."""
+        end = time.time() + timeout
+        while self._q.unfinished_tasks and time.time() < end:
+            time.sleep(0.01)
+
+    # ---------- hilo escritor ----------
+
+    def _run(self):
+        while True:
+            batch = [self._q.get()]
+            deadline = time.time() + self.flush_sec
+            while len(batch) < 1000:
+                try:
+                    batch.append(self._q.get(timeout=max(0.0, deadline - time.time())))
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"⚠️ Error escribiendo auditoría: {e}")
+            finally:
+                for _ in batch:
+                    self._q.task_done()
+
+    def _write_batch(self, batch):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if self._opened_at is None:
+            try:
+                self._opened_at = os.path.getmtime(self.path)
+            except OSError:
+                self._opened_at = time.time()
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(e) + "\n" for e in batch))
+        self._maybe_rotate()
+
+    def _maybe_rotate(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        too_old = time.time() - (self._opened_at or time.time()) >= self.rotate_sec
+        if size < self.max_bytes and not (too_old and size > 0):
+            return
+        base, ext = os.path.splitext(self.path)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        rotated, n = f"{base}-{stamp}{ext}", 1
+        while os.path.exists(rotated + ".gz"):  # dos rotaciones en el mismo segundo
+            rotated, n = f"{base}-{stamp}.{n}{ext}", n + 1
+        os.replace(self.path, rotated)
+        self._opened_at = time.time()
+        with open(rotated, "rb") as src, gzip.open(rotated + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated)
+        viejos = archives(self.path)
+        if self.keep and len(viejos) > self.keep:
+            for old in viejos[: len(viejos) - self.keep]:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+
+
+def archives(path=AUDIT_PATH):
+    """Archivos rotados (.gz) en orden cronológico."""
+    base, ext = os.path.splitext(path)
+    return sorted(glob.glob(f"{base}-*{ext}.gz"))
+
+
+# =========================
+# EXPORTACIÓN COLUMNAR Y CONSULTAS
+# =========================
+
+
+def _columnar_dir(path):
+    return os.path.join(os.path.dirname(path) or ".", "audit_columnar")
+
+
+def _manifest(path):
+    try:
+        with open(os.path.join(_columnar_dir(path), "manifest.json"), "r") as f:
+            return json.load(f)
+    except Exception:
+        return {"exported": []}
+
+
+def export_columnar(path=AUDIT_PATH):
+    """
+    Vuelca los rotados aún no exportados a particiones mensuales
+    audit_columnar/YYYY-MM.npy (arrays estructurados AUDIT_DTYPE, ordenados por ts).
+    Devuelve el nº de filas nuevas.
+    """
+    out_dir = _columnar_dir(path)
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = _manifest(path)
+    done = set(manifest["exported"])
+    pending = [a for a in archives(path) if os.path.basename(a) not in done]
+    if not pending:
+        return 0
+
+    by_month = {}
+    for arc in pending:
+        for e in iter_file(arc):
+            row = normalize(e)
+            if row[0] != row[0]:
+                continue
+            month = datetime.fromtimestamp(row[0]).strftime("%Y-%m")
+            by_month.setdefault(month, []).append(row)
+
+    total = 0
+    for month, rows in by_month.items():
+        part = os.path.join(out_dir, f"{month}.npy")
+        new = np.array(rows, dtype=AUDIT_DTYPE)
+        if os.path.exists(part):
+            new = np.concatenate([np.load(part), new])
+        new = new[np.argsort(new["ts"], kind="stable")]
+        tmp = part + ".tmp.npy"
+        np.save(tmp, new)
+        os.replace(tmp, part)
+        total += len(rows)
+
+    manifest["exported"] = sorted(done | {os.path.basename(a) for a in pending})
+    tmp = os.path.join(out_dir, "manifest.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, os.path.join(out_dir, "manifest.json"))
+    return total
+
+
+def query(symbol, since=None, until=None, path=AUDIT_PATH, kind=None):
+    """
+    Decisiones de riesgo de un símbolo entre `since` y `until` (epoch o "YYYY-MM-DD").
+    Lee las particiones .npy con mmap (solo los meses del rango), los rotados sin
+    exportar y el archivo vivo. Devuelve un array AUDIT_DTYPE ordenado por ts.
+    """
+
+    def to_epoch(v, default):
+        if v is None:
+            return default
+        if isinstance(v, str):
+            return time.mktime(time.strptime(v, "%Y-%m-%d"))
+        return float(v)
+
+    t0 = to_epoch(since, float("-inf"))
+    t1 = to_epoch(until, float("inf"))
+    m0 = datetime.fromtimestamp(t0).strftime("%Y-%m") if t0 > 0 else "0000-00"
+    m1 = datetime.fromtimestamp(t1).strftime("%Y-%m") if t1 < 4e9 else "9999-99"
+
+    chunks = []
+    for part in sorted(glob.glob(os.path.join(_columnar_dir(path), "*.npy"))):
+        month = os.path.basename(part)[:7]
+        if not (m0 <= month <= m1):
+            continue
+        arr = np.load(part, mmap_mode="r")
+        mask = (arr["symbol"] == symbol) & (arr["ts"] >= t0) & (arr["ts"] <= t1)
+        if kind:
+            mask &= arr["kind"] == kind
+        if mask.any():
+            chunks.append(np.array(arr[mask]))
+
+    done = set(_manifest(path)["exported"])
+    raw = [a for a in archives(path) if os.path.basename(a) not in done]
+    rows = []
+    for f in raw + [path]:
+        for e in iter_file(f, symbol):
+            row = normalize(e)
+            if row[1] == symbol and t0 <= row[0] <= t1 and (not kind or row[2] == kind):
+                rows.append(row)
+    if rows:
+        chunks.append(np.array(rows, dtype=AUDIT_DTYPE))
+
+    if not chunks:
+        return np.zeros(0, dtype=AUDIT_DTYPE)
+    out = np.concatenate(chunks)
+    return out[np.argsort(out["ts"], kind="stable")]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Consulta la auditoría del Guardian")
+    parser.add_argument("--symbol", required=True)
+    parser.add_argument("--since", default=None)
+    parser.add_argument("--until", default=None)
+    parser.add_argument("--path", default=AUDIT_PATH)
+    parser.add_argument("--export", action="store_true", help="exporta antes a .npy")
+    args = parser.parse_args()
+
+    if args.export:
+        print(f"📦 Filas exportadas: {export_columnar(args.path)}")
+    res = query(args.symbol, args.since, args.until, path=args.path)
+    print(f"🔎 {args.symbol}: {len(res)} decisiones")
+    if len(res):
+        riesgo = res["riesgo"][~np.isnan(res["riesgo"])]
+        bloqueos = int((res["permitido"] == 0).sum())
+        print(f"   riesgo medio {riesgo.mean():.1f} | máx {riesgo.max():.0f} | bloqueos {bloqueos}")
+        for r in res[-10:]:
+            ts = time.strftime("%Y-%m-%d %H:%M", time.localtime(r["ts"]))
+            print(f"   {ts} | {r['kind']:<6} | riesgo {r['riesgo']:.0f} | {r['motivo']}")
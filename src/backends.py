@@ -0,0 +1,258 @@
+"""
+LULA BACKENDS v1.0 — MOTORES DE INFERENCIA INTERCAMBIABLES
+RKNN (NPU RK3588), ONNX Runtime (CPU) y un ejecutor NumPy puro para la MLP
+densa de trainer.py. Todos reciben (N, 60) float32 y devuelven (N,) probabilidades
+crudas, así Brain puede correr en cualquier x86/CI sin NPU.
+
+Uso del arnés de paridad:
+    python src/backends.py --model /app/data/madness.rknn --n 64 --runs 50
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+# "auto" = primer backend que cargue en orden RKNN → ONNX → NumPy
+BRAIN_BACKEND = os.getenv("BRAIN_BACKEND", "auto").lower()
+MODEL_BATCH = int(os.getenv("MODEL_BATCH", 1))
+
+
+class InferenceBackend:
+    """Interfaz común. `batch` > 0 = batch fijo del modelo, 0 = dinámico."""
+
+    name = "base"
+    batch = 0
+
+    def _run(self, chunk):
+        raise NotImplementedError
+
+    def infer(self, X):
+        """
+        Ejecuta el modelo sobre (N, D) respetando el batch del backend.
+        Devuelve (N,) con NaN en los trozos que fallen.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        n = len(X)
+        raw = np.full(n, np.nan, dtype=np.float32)
+        if n == 0:
+            return raw
+        batch = self.batch if self.batch > 0 else n
+
+        for start in range(0, n, batch):
+            chunk = X[start : start + batch]
+            real = len(chunk)
+            if real < batch:
+                # Modelos con batch fijo: rellenamos con ceros y descartamos la cola
+                pad = np.zeros((batch - real, X.shape[1]), dtype=np.float32)
+                chunk = np.concatenate([chunk, pad])
+            try:
+                out = np.asarray(self._run(chunk), dtype=np.float32).reshape(-1)
+                raw[start : start + real] = out[:real]
+            except Exception:
+                continue
+        return raw
+
+    def release(self):
+        pass
+
+
+# =========================
+# NPU RK3588
+# =========================
+
+
+class RKNNBackend(InferenceBackend):
+    name = "rknn"
+
+    def __init__(self, model_path, batch=MODEL_BATCH):
+        from rknn.api import RKNN
+
+        self.batch = batch
+        os.environ["RKNN_LOG_LEVEL"] = "1"
+
+        # --- SILENCIADOR DE ARRANQUE (Mata avisos de versión y drivers) ---
+        f = open(os.devnull, "w")
+        _old_stdout, _old_stderr = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = f
+        try:
+            self.rknn = RKNN(verbose=False)
+            if self.rknn.load_rknn(model_path) != 0:
+                raise Exception("❌ Error al cargar .rknn")
+            # Runtime en los 3 núcleos de la NPU (0x07)
+            if self.rknn.init_runtime(target="rk3588", core_mask=0x07) != 0:
+                raise Exception("❌ Error NPU RK3588")
+        finally:
+            sys.stdout, sys.stderr = _old_stdout, _old_stderr
+            f.close()
+
+    def _run(self, chunk):
+        # data_format='nhwc' evita el aviso de formato del driver
+        return self.rknn.inference(inputs=[chunk], data_format="nhwc")[0]
+
+    def release(self):
+        self.rknn.release()
+
+
+# =========================
+# ONNX RUNTIME (CPU)
+# =========================
+
+
+class OnnxBackend(InferenceBackend):
+    name = "onnx"
+
+    def __init__(self, onnx_path):
+        import onnxruntime as ort
+
+        opts = ort.SessionOptions()
+        opts.log_severity_level = 3
+        self.session = ort.InferenceSession(
+            onnx_path, sess_options=opts, providers=["CPUExecutionProvider"]
+        )
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        self.input_shape = list(inp.shape)
+        # Dimensión 0 entera = batch fijo; simbólica/None = dinámico
+        self.batch = self.input_shape[0] if isinstance(self.input_shape[0], int) else 0
+
+    def _run(self, chunk):
+        # Modelos CNN de grow.py esperan (N, TIME_STEPS, FEATURES)
+        if len(self.input_shape) == 3:
+            chunk = chunk.reshape(len(chunk), *self.input_shape[1:])
+        return self.session.run(None, {self.input_name: chunk})[0]
+
+
+# =========================
+# NUMPY PURO (MLP DENSA)
+# =========================
+
+
+class NumpyMLPBackend(InferenceBackend):
+    """
+    Ejecutor de la MLP de trainer.py (Dense-ReLU ×3 + Dense-sigmoid).
+    Lee los pesos de madness_mlp.npz: W0, b0, W1, b1, ... en orden de capa.
+    """
+
+    name = "numpy"
+
+    def __init__(self, weights_path):
+        data = np.load(weights_path)
+        n_layers = len([k for k in data.files if k.startswith("W")])
+        self.layers = [
+            (data[f"W{i}"].astype(np.float32), data[f"b{i}"].astype(np.float32))
+            for i in range(n_layers)
+        ]
+        self.batch = 0
+
+    def _run(self, chunk):
+        x = chunk
+        last = len(self.layers) - 1
+        for i, (W, b) in enumerate(self.layers):
+            x = x @ W + b
+            if i < last:
+                np.maximum(x, 0, out=x)
+        # Sigmoide (recortada para no desbordar exp en float32)
+        return 1.0 / (1.0 + np.exp(-np.clip(x, -60, 60)))
+
+
+# =========================
+# SELECCIÓN AUTOMÁTICA
+# =========================
+
+
+BACKENDS = [("rknn", RKNNBackend), ("onnx", OnnxBackend), ("numpy", NumpyMLPBackend)]
+
+
+def model_paths(model_path):
+    """madness.rknn → rutas hermanas .rknn / .onnx / _mlp.npz en la misma carpeta."""
+    base, _ = os.path.splitext(model_path)
+    return {"rknn": base + ".rknn", "onnx": base + ".onnx", "numpy": base + "_mlp.npz"}
+
+
+def load_backend(model_path, prefer=BRAIN_BACKEND):
+    """
+    Carga el backend pedido o, en modo auto, el primero disponible:
+    RKNN (si hay NPU) → ONNX Runtime → NumPy.
+    """
+    paths = model_paths(model_path)
+    errors = []
+    for name, cls in BACKENDS:
+        if prefer != "auto" and name != prefer:
+            continue
+        if not os.path.exists(paths[name]):
+            errors.append(f"{name}: no existe {paths[name]}")
+            continue
+        try:
+            return cls(paths[name])
+        except Exception as e:
+            errors.append(f"{name}: {e}")
+    raise Exception("❌ Ningún backend de inferencia disponible → " + " | ".join(errors))
+
+
+def load_all_backends(model_path):
+    """Todos los backends que se puedan cargar (para el arnés de paridad)."""
+    paths = model_paths(model_path)
+    backends = []
+    for name, cls in BACKENDS:
+        if os.path.exists(paths[name]):
+            try:
+                backends.append(cls(paths[name]))
+            except Exception as e:
+                print(f"⚠️ {name}: {e}")
+    return backends
+
+
+def parity_report(backends, X, runs=20):
+    """
+    Compara todos los backends contra el primero (referencia).
+    Devuelve {nombre: {"max_abs_err", "latency_ms", "per_sample_us"}}.
+    """
+    X = np.asarray(X, dtype=np.float32)
+    report = {}
+    ref = None
+    for be in backends:
+        out = be.infer(X)  # calentamiento + salida para la paridad
+        t0 = time.perf_counter()
+        for _ in range(runs):
+            be.infer(X)
+        dt = (time.perf_counter() - t0) / max(1, runs)
+        if ref is None:
+            ref = out
+        report[be.name] = {
+            "max_abs_err": float(np.nanmax(np.abs(out - ref))) if len(X) else 0.0,
+            "latency_ms": dt * 1000,
+            "per_sample_us": dt * 1e6 / max(1, len(X)),
+        }
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Paridad y latencia de backends de inferencia")
+    parser.add_argument("--model", default="/app/data/madness.rknn")
+    parser.add_argument("--inputs", default=None, help=".npy con un tensor (N, 60)")
+    parser.add_argument("--n", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.inputs:
+        X = np.load(args.inputs)
+    else:
+        X = np.random.default_rng(7).uniform(0, 1, size=(args.n, 60)).astype(np.float32)
+
+    backends = load_all_backends(args.model)
+    if not backends:
+        print("❌ No se pudo cargar ningún backend.")
+        sys.exit(1)
+
+    print(f"🧪 Paridad sobre {len(X)} muestras (referencia: {backends[0].name})")
+    for name, r in parity_report(backends, X, runs=args.runs).items():
+        print(
+            f"  {name:>6} | err máx {r['max_abs_err']:.6f} | "
+            f"{r['latency_ms']:.3f} ms/lote | {r['per_sample_us']:.1f} µs/muestra"
+        )
+    for be in backends:
+        be.release()
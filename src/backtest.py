@@ -0,0 +1,603 @@
+"""
+LULA BACKTEST v1.0 — BACKTEST VECTORIZADO DE LAS REGLAS EN VIVO
+Reproduce sobre velas históricas + probabilidades del modelo las mismas reglas
+que aplica main.py en cada ciclo:
+
+    score    → lullaby.calculate_weighted_score   (kernel NumPy, (S, B) de una vez)
+    estado   → lullaby.get_status_label           (kernel NumPy, incluye STOP_LOSS_PCT)
+    salida   → Guardian.evaluar_salida_emergencia (escalera de trailing, (S,) por vela)
+    tamaño   → lullaby.get_position_size          (la función original, solo en compras)
+    permiso  → feelings.get_market_permission     (la función original, una vez por vela)
+
+Los kernels se comprueban contra las funciones originales antes de cada
+backtest (`verify_rules`): si una regla cambia en lullaby/guardian y el kernel
+no, el backtest se niega a correr. Las órdenes se llenan al cierre de la vela
+con comisión y slippage.
+
+    python src/backtest.py --demo --years 3                # 15 símbolos sintéticos
+    python src/backtest.py --probs /app/data/probs.npz     # velas de candles.db
+    python src/backtest.py --model /app/data/madness.rknn --scalers /app/data/scalers.pkl
+"""
+
+import os
+import sqlite3
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+import feelings
+import lullaby as strat
+from candles import CANDLES_DB_PATH
+from features import compute_indicators, stack_features
+from journal import atomic_write_json
+
+FEE_PCT = float(os.getenv("BACKTEST_FEE_PCT", 0.001))  # taker de Binance (0.1 %)
+SLIPPAGE_BPS = float(os.getenv("BACKTEST_SLIPPAGE_BPS", 5))
+REPORT_PATH = "/app/data/backtest_report.json"
+WARMUP_BARS = 200  # main.py pide 200 velas: antes no hay señal
+
+# Umbrales de saldo de main.py
+HOLD_MIN_USD = 5.0  # a partir de aquí get_status_label evalúa salidas
+FLAT_BELOW_USD = 16.0  # por debajo se considera "sin posición" (se puede comprar)
+MAX_DRAWDOWN = 0.12  # Guardian.max_drawdown_limit
+
+# Estados de get_status_label (la palabra clave de cada etiqueta)
+REPOSO, ACECHO, COMPRA, HOLDING, STOP, SCORE, VENTA, RIESGO = range(8)
+LABELS = ("REPOSO", "ACECHO", "COMPRA", "HOLDING", "STOP", "SCORE", "VENTA", "RIESGO")
+# Motivos de salida de evaluar_salida_emergencia
+EXIT_NONE, EXIT_TRAILING, EXIT_DELTA, EXIT_DELTA_CRIT = range(4)
+EXIT_LABELS = ("", "TRAILING STOP", "DELTA IA", "DELTA IA CRÍTICO")
+
+
+# =========================
+# KERNELS DE REGLAS
+# =========================
+
+
+class Rules:
+    """
+    Versión vectorizada de las reglas de lullaby/guardian. Lee las mismas
+    variables de entorno, en el momento de crearse.
+    """
+
+    def __init__(self):
+        self.buy_threshold = float(os.getenv("BUY_THRESHOLD_IA", 0.55))
+        self.sell_threshold = float(os.getenv("SELL_THRESHOLD_IA", 0.38))
+        self.rsi_buy_zone = float(os.getenv("RSI_BUY_ZONE", 40))
+        self.rsi_sell_zone = float(os.getenv("RSI_SELL_ZONE", 75))
+        self.stop_loss_pct = float(os.getenv("STOP_LOSS_PCT", 0.05))
+        self.scale_in_high = float(os.getenv("SCALE_IN_THRESHOLD_HIGH", 0.75))
+
+    def score(self, prob, rsi, imbalance=0.0, rvol=1.0):
+        """calculate_weighted_score sobre arrays de cualquier forma → int64."""
+        prob, rsi = np.asarray(prob, dtype=np.float64), np.asarray(rsi, dtype=np.float64)
+        prob_n = np.minimum(1.0, prob / self.buy_threshold)
+        prob_n = np.where(prob > 0, np.maximum(0.20, prob_n), prob_n)
+
+        rsi_clamped = np.maximum(20, np.minimum(self.rsi_sell_zone, rsi))
+        rsi_n = 1 - ((rsi_clamped - 20) / (self.rsi_sell_zone - 20))
+        rsi_n = np.where(rsi <= self.rsi_buy_zone, rsi_n + 0.15, rsi_n)
+
+        imb_n = np.maximum(-0.5, np.minimum(0.5, imbalance)) + 0.5
+        rvol_n = (np.maximum(0.5, np.minimum(2.5, rvol)) - 0.5) / 2.0
+
+        w_ia, w_rsi, w_imb, w_vol = 0.45, 0.25, 0.20, 0.10
+        score_f = (prob_n * w_ia) + (rsi_n * w_rsi) + (imb_n * w_imb) + (rvol_n * w_vol)
+        score_f = np.nan_to_num(score_f * 100, nan=0.0)
+        return np.clip(np.trunc(score_f), 0, 100).astype(np.int64)
+
+    def status_flat(self, prob, score, rsi, ok_macro=True):
+        """Estado sin posición (val_usd < 5): COMPRA / ACECHO / REPOSO / RIESGO."""
+        compra = (prob >= self.buy_threshold) & (score >= 65)
+        acecho = ((prob > self.buy_threshold * 0.75) | (rsi <= self.rsi_buy_zone)) & (score >= 38)
+        out = np.where(compra, COMPRA, np.where(acecho, ACECHO, REPOSO))
+        return np.where(ok_macro, out, RIESGO)
+
+    def status_held(self, prob, score, rsi, price, entry, ok_macro=True):
+        """Estado con posición (val_usd >= 5): STOP / SCORE / VENTA / HOLDING / RIESGO."""
+        stop = (entry > 0) & (price > 0) & (price <= entry * (1 - self.stop_loss_pct))
+        venta = (rsi >= self.rsi_sell_zone) | (prob <= self.sell_threshold)
+        out = np.where(stop, STOP, np.where(score < 40, SCORE, np.where(venta, VENTA, HOLDING)))
+        return np.where(ok_macro, out, RIESGO)
+
+    def exit_ladder(self, price, entry, peak, ia_entry, prob):
+        """
+        Guardian.evaluar_salida_emergencia para (S,) posiciones a la vez.
+        Devuelve (motivo (S,) int, nuevo máximo (S,)).
+        """
+        peak = np.where(price > peak, price, peak)
+        rend = (price - entry) / entry
+        stop = np.where(
+            rend >= 0.08,
+            peak * 0.96,
+            np.where(rend >= 0.04, entry * 1.02, np.where(rend >= 0.015, entry * 1.005, 0.0)),
+        )
+        trailing = (stop > 0) & (price <= stop)
+        delta = ia_entry - prob
+        miedo = delta > 0.25
+        reason = np.where(
+            trailing,
+            EXIT_TRAILING,
+            np.where(
+                miedo & (rend > 0.01),
+                EXIT_DELTA,
+                np.where(miedo & (delta > 0.40), EXIT_DELTA_CRIT, EXIT_NONE),
+            ),
+        )
+        return reason, peak
+
+
+def _label_code(label):
+    for code, word in enumerate(LABELS):
+        if word in label:
+            return code
+    return -1
+
+
+def verify_rules(rules=None, n=3000, seed=0):
+    """
+    Compara los kernels con las funciones originales sobre entradas aleatorias
+    (incluidos los bordes de cada umbral). Devuelve {regla: nº de discrepancias}.
+    """
+    from guardian import Guardian
+
+    rules = rules or Rules()
+    rng = np.random.default_rng(seed)
+    prob = rng.choice(
+        np.r_[rng.uniform(0, 1, n), [0.0, rules.buy_threshold, rules.sell_threshold]], n
+    )
+    rsi = rng.choice(np.r_[rng.uniform(0, 100, n), [20.0, rules.rsi_buy_zone, 75.0]], n)
+    imb = rng.uniform(-1, 1, n)
+    rvol = rng.uniform(0, 4, n)
+    ok_macro = rng.uniform(size=n) > 0.1
+    entry = rng.uniform(50, 150, n)
+    price = entry * rng.choice(np.r_[rng.uniform(0.85, 1.2, n), [1 - rules.stop_loss_pct]], n)
+    peak = np.maximum(entry, price) * rng.uniform(1.0, 1.1, n)
+    ia_entry = rng.uniform(0, 1, n)
+
+    mism = {"score": 0, "status": 0, "exit": 0}
+    scores = rules.score(prob, rsi, imb, rvol)
+    flat = rules.status_flat(prob, scores, rsi, ok_macro)
+    held = rules.status_held(prob, scores, rsi, price, entry, ok_macro)
+    reason, peak_new = rules.exit_ladder(price, entry, peak, ia_entry, prob)
+
+    stand_in = SimpleNamespace(posiciones={}, _journal=lambda *a, **k: None)
+    guardian = SimpleNamespace(get_datos_posicion=lambda s: {"precio_entrada": entry[i]})
+    for i in range(n):
+        s = strat.calculate_weighted_score(prob[i], rsi[i], imb[i], rvol=rvol[i])
+        mism["score"] += int(s != scores[i])
+
+        for val_usd, code in ((0.0, flat[i]), (50.0, held[i])):
+            label = strat.get_status_label(
+                prob[i],
+                int(scores[i]),
+                bool(ok_macro[i]),
+                val_usd,
+                rsi[i],
+                symbol="BT/USDT",
+                price=price[i],
+                guardian=guardian,
+            )
+            mism["status"] += int(_label_code(label) != code)
+
+        pos = {"precio_entrada": entry[i], "max_alcanzado": peak[i], "ia_entrada": ia_entry[i]}
+        stand_in.posiciones = {"BT/USDT": pos}
+        sale, motivo = Guardian.evaluar_salida_emergencia(stand_in, "BT/USDT", price[i], prob[i])
+        code = EXIT_NONE
+        if sale:
+            code = next(c for c in (3, 1, 2) if motivo.startswith(EXIT_LABELS[c]))
+        mism["exit"] += int(code != reason[i] or pos["max_alcanzado"] != peak_new[i])
+    return mism
+
+
+# =========================
+# DATOS
+# =========================
+
+
+def load_candles(symbols=None, path=CANDLES_DB_PATH, timeframe="1h"):
+    """
+    Velas de candles.db en una línea temporal común.
+    Devuelve {"symbols", "ts" (B,), "ohlcv" (S, B, 5)} con NaN donde falta una vela.
+    """
+    db = sqlite3.connect(path)
+    try:
+        if symbols is None:
+            rows = db.execute("SELECT DISTINCT symbol FROM candles WHERE tf = ?", (timeframe,))
+            symbols = sorted(r[0] for r in rows)
+        series = {}
+        for s in symbols:
+            rows = db.execute(
+                "SELECT ts, open, high, low, close, volume FROM candles"
+                " WHERE symbol = ? AND tf = ? ORDER BY ts",
+                (s, timeframe),
+            ).fetchall()
+            if rows:
+                series[s] = np.asarray(rows, dtype=np.float64)
+    finally:
+        db.close()
+    if not series:
+        raise ValueError(f"Sin velas en {path}")
+
+    symbols = list(series)
+    ts = np.unique(np.concatenate([a[:, 0] for a in series.values()])).astype(np.int64)
+    ohlcv = np.full((len(symbols), len(ts), 5), np.nan)
+    for i, s in enumerate(symbols):
+        a = series[s]
+        ohlcv[i, np.searchsorted(ts, a[:, 0].astype(np.int64))] = a[:, 1:6]
+    return {"symbols": symbols, "ts": ts, "ohlcv": ohlcv}
+
+
+def load_probs(path, data):
+    """
+    Probabilidades grabadas (.npz con "symbols", "ts", "prob" (S, T)) alineadas
+    a las velas de `data`. Lo que no esté grabado queda NaN (sin señal).
+    """
+    z = np.load(path, allow_pickle=True)
+    src_syms = [str(s) for s in z["symbols"]]
+    src_ts, src = z["ts"].astype(np.int64), np.asarray(z["prob"], dtype=np.float64)
+    out = np.full(data["ohlcv"].shape[:2], np.nan)
+    pos = np.searchsorted(src_ts, data["ts"])
+    hit = (pos < len(src_ts)) & (src_ts[np.minimum(pos, len(src_ts) - 1)] == data["ts"])
+    for i, s in enumerate(data["symbols"]):
+        if s in src_syms:
+            out[i, hit] = src[src_syms.index(s), pos[hit]]
+    return out
+
+
+def model_probs(data, model_path, scaler_path, backend=None, time_steps=10):
+    """
+    Probabilidad de Brain en cada vela: features sobre la historia completa
+    (como grow/trainer), ventanas de `time_steps` escaladas por símbolo y una
+    pasada del backend. Devuelve (S, B) con NaN en el calentamiento.
+    """
+    import joblib
+
+    from backends import load_backend
+
+    be = load_backend(model_path, prefer=backend) if backend else load_backend(model_path)
+    scalers = joblib.load(scaler_path)
+    feats = stack_features(compute_indicators(data["ohlcv"]))
+    S, B, F = feats.shape
+    out = np.full((S, B), np.nan)
+    try:
+        for i, sym in enumerate(data["symbols"]):
+            scaler = scalers.get(sym, next(iter(scalers.values())))
+            ok = np.isfinite(feats[i]).all(axis=1)
+            if ok.sum() < time_steps:
+                continue
+            scaled = np.full((B, F), np.nan)
+            scaled[ok] = scaler.transform(feats[i][ok])
+            win = np.lib.stride_tricks.sliding_window_view(scaled, (time_steps, F))[:, 0]
+            X = win.reshape(len(win), time_steps * F)
+            good = np.isfinite(X).all(axis=1)
+            raw = np.full(len(X), np.nan)
+            raw[good] = be.infer(X[good])
+            out[i, time_steps - 1 :] = np.sqrt(np.clip(raw, 0, None))
+    finally:
+        be.release()
+    out[:, :WARMUP_BARS] = np.nan
+    return out
+
+
+def synthetic_market(n_symbols=15, years=1.0, seed=7, edge=0.15):
+    """
+    Mercado sintético horario (paseo aleatorio con régimen de volatilidad) y una
+    probabilidad ruidosa correlada con el retorno de las próximas 24 velas.
+    Solo para medir el motor: no dice nada de la estrategia real.
+    """
+    rng = np.random.default_rng(seed)
+    B = int(years * 365 * 24)
+    vol = 0.006 * np.exp(rng.normal(0, 0.3, (n_symbols, 1)))
+    rets = rng.normal(0.00002, 1, (n_symbols, B)) * vol
+    close = 100 * np.exp(np.cumsum(rets, axis=1))
+    open_ = np.concatenate([close[:, :1], close[:, :-1]], axis=1)
+    spread = np.abs(rng.normal(0, 1, (n_symbols, B))) * vol * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.lognormal(10, 0.5, (n_symbols, B))
+    ohlcv = np.stack([open_, high, low, close, volume], axis=-1)
+
+    fwd = np.zeros((n_symbols, B))
+    csum = np.concatenate([np.zeros((n_symbols, 1)), np.cumsum(rets, axis=1)], axis=1)
+    fwd[:, :-24] = csum[:, 25:] - csum[:, 1:-24]
+    z = fwd / (vol * np.sqrt(24))
+    prob = 1 / (1 + np.exp(-(edge * 4 * z + rng.normal(0, 1, (n_symbols, B)))))
+    prob[:, :WARMUP_BARS] = np.nan
+
+    t0 = int(time.time() // 3600) * 3_600_000 - B * 3_600_000
+    return {
+        "symbols": [f"SYN{i:02d}/USDT" for i in range(n_symbols)],
+        "ts": t0 + np.arange(B, dtype=np.int64) * 3_600_000,
+        "ohlcv": ohlcv,
+    }, prob
+
+
+# =========================
+# MOTOR
+# =========================
+
+
+class BacktestResult:
+    def __init__(self, symbols, ts, equity, trades, cash0, elapsed):
+        self.symbols = symbols
+        self.ts = ts
+        self.equity = equity
+        self.trades = trades
+        self.cash0 = cash0
+        self.elapsed = elapsed
+        peak = np.maximum.accumulate(equity)
+        self.drawdown = equity / peak - 1
+
+    def summary(self):
+        eq = self.equity
+        rets = np.diff(eq) / eq[:-1] if len(eq) > 1 else np.zeros(0)
+        years = max(len(eq), 1) / (365 * 24)
+        sells = [t for t in self.trades if t["side"] == "sell"]
+        wins = [t for t in sells if t["pnl"] > 0]
+        exits = sorted({t["reason"] for t in sells})
+        sharpe = rets.mean() / rets.std() * np.sqrt(365 * 24) if rets.std() > 0 else 0.0
+        return {
+            "bars": len(eq),
+            "symbols": len(self.symbols),
+            "equity_final": round(float(eq[-1]), 2),
+            "return_pct": round(100 * (eq[-1] / self.cash0 - 1), 2),
+            "cagr_pct": round(100 * ((eq[-1] / self.cash0) ** (1 / years) - 1), 2),
+            "max_drawdown_pct": round(100 * float(self.drawdown.min()), 2),
+            "sharpe": round(float(sharpe), 2),
+            "trades": len(self.trades),
+            "round_trips": len(sells),
+            "win_rate_pct": round(100 * len(wins) / len(sells), 1) if sells else 0.0,
+            "fees": round(sum(t["fee"] for t in self.trades), 2),
+            "exits": {r: sum(1 for t in sells if t["reason"] == r) for r in exits},
+            "elapsed_s": round(self.elapsed, 3),
+        }
+
+    def save(self, path=REPORT_PATH):
+        """Resumen + operaciones + curva de equity (una muestra cada 24 velas)."""
+        step = 24
+        curve = zip(self.ts[::step], self.equity[::step])
+        data = {
+            "summary": self.summary(),
+            "trades": [{k: _round(v) for k, v in t.items()} for t in self.trades],
+            "equity": [[int(t), round(float(e), 2)] for t, e in curve],
+            "drawdown": [round(float(d), 4) for d in self.drawdown[::step]],
+        }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        atomic_write_json(path, data)
+        return path
+
+
+def _round(v):
+    return round(v, 8) if isinstance(v, float) else v
+
+
+def run_backtest(
+    data,
+    prob,
+    cash=1000.0,
+    fee=FEE_PCT,
+    slippage_bps=SLIPPAGE_BPS,
+    macro=None,
+    rules=None,
+    verify=True,
+):
+    """
+    data: {"symbols", "ts" (B,), "ohlcv" (S, B, 5)}; prob: (S, B) probabilidad de Brain.
+    macro: None o {"vix", "dxy", "fng"} con arrays (B,) (sin macro: permiso siempre).
+    Réplica del bucle de main.py vela a vela: salida de emergencia, estado,
+    ventas, compras (T1) por score descendente con los límites del Tier y T2.
+    Lo que no existe en la historia se neutraliza: imbalance 0 y riesgo OK.
+    """
+    rules = rules or Rules()
+    if verify:
+        mism = verify_rules(rules, n=500)
+        if any(mism.values()):
+            raise AssertionError(f"Kernels desalineados con lullaby/guardian: {mism}")
+
+    t_start = time.perf_counter()
+    symbols, ts = list(data["symbols"]), np.asarray(data["ts"])
+    ohlcv = np.asarray(data["ohlcv"], dtype=np.float64)
+    S, B = ohlcv.shape[:2]
+    prob = np.asarray(prob, dtype=np.float64)
+    # Huecos: último valor conocido (valoración e indicadores), sin señal en esa vela
+    filled = np.stack([_ffill(ohlcv[..., k]) for k in range(5)], axis=-1)
+    high, mark = filled[..., 1], filled[..., 3]
+
+    # --- todo lo que no depende de la cartera, de una vez (S, B) ---
+    ind = compute_indicators(filled)
+    rsi = ind["rsi"] * 100
+    rvol = ind["rvol"]
+    valid = np.isfinite(ohlcv[..., 3]) & np.isfinite(prob) & np.isfinite(rsi)
+    with np.errstate(invalid="ignore"):
+        score = rules.score(prob, rsi, 0, rvol=rvol)
+        flat_status = rules.status_flat(prob, score, rsi)
+    # Vela a vela se lee una columna: (B, S) contiguo
+    P, H = np.nan_to_num(mark).T.copy(), np.nan_to_num(high).T.copy()
+    PR, SC, RS = prob.T.copy(), score.T.copy(), rsi.T.copy()
+    FL, OK = flat_status.T.copy(), valid.T.copy()
+    sell_codes = np.isin(np.arange(len(LABELS)), (VENTA, STOP, SCORE))
+    no_exit = np.zeros(S, dtype=bool)
+
+    vix = np.full(B, 20.0) if macro is None else np.asarray(macro["vix"], dtype=np.float64)
+    dxy = np.full(B, 100.0) if macro is None else np.asarray(macro["dxy"], dtype=np.float64)
+    fng = np.full(B, 50) if macro is None else np.asarray(macro["fng"])
+    macro_ok = (vix < 25) & (dxy < 103)
+
+    slip = slippage_bps / 10_000
+    fill_buy = 1 + slip
+    fill_sell = 1 - slip
+
+    qty = np.zeros(S)
+    entry = np.zeros(S)
+    peak = np.zeros(S)
+    ia_entry = np.zeros(S)
+    tramo2 = np.zeros(S)
+    cost = np.zeros(S)  # USDT invertidos (con comisión) en la posición abierta
+    usdt = float(cash)
+    hwm = 0.0
+    equity = np.empty(B)
+    trades = []
+
+    def sell(i, b, price, reason):
+        nonlocal usdt
+        gross = qty[i] * price * fill_sell
+        fee_usd = gross * fee
+        usdt += gross - fee_usd
+        trades.append(
+            {
+                "ts": int(ts[b]),
+                "symbol": symbols[i],
+                "side": "sell",
+                "price": price * fill_sell,
+                "qty": float(qty[i]),
+                "usd": gross,
+                "fee": fee_usd,
+                "reason": reason,
+                "pnl": gross - fee_usd - float(cost[i]),
+            }
+        )
+        qty[i] = entry[i] = peak[i] = ia_entry[i] = tramo2[i] = cost[i] = 0.0
+
+    def buy(i, b, price, usd, label):
+        nonlocal usdt
+        fee_usd = usd * fee
+        qty[i] += (usd - fee_usd) / (price * fill_buy)
+        usdt -= usd
+        cost[i] += usd
+        trades.append(
+            {
+                "ts": int(ts[b]),
+                "symbol": symbols[i],
+                "side": "buy",
+                "price": price * fill_buy,
+                "qty": (usd - fee_usd) / (price * fill_buy),
+                "usd": usd,
+                "fee": fee_usd,
+                "reason": label,
+                "pnl": 0.0,
+            }
+        )
+
+    np_err = np.seterr(divide="ignore", invalid="ignore")  # rend de huecos sin posición
+    for b in range(B):
+        price, ok_bar, prob_b, score_b = P[b], OK[b], PR[b], SC[b]
+        val_usd = qty * price
+        total_equity = usdt + val_usd.sum()
+
+        # Guardian.check_drawdown_safety (HWM con el 12 %)
+        hwm = max(hwm, total_equity)
+        ok_drawdown = hwm == 0 or (hwm - total_equity) / hwm <= MAX_DRAWDOWN
+        ok_macro = bool(macro_ok[b]) and ok_drawdown
+
+        if not ok_bar.any():
+            equity[b] = total_equity
+            continue
+
+        # feelings.get_market_permission (imbalance de BTC neutro)
+        _, max_exp_pct, max_pos, _ = feelings.get_market_permission(
+            0.0, dxy[b], vix[b], fng[b], total_equity
+        )
+        total_invertido = val_usd.sum()
+        holding = qty > 0
+        posiciones_activas = int((holding & (val_usd > HOLD_MIN_USD)).sum())
+
+        status = FL[b] if ok_macro else np.full(S, RIESGO)
+        emergencia = vende = escala = no_exit
+        if holding.any():
+            # 1. Salida de emergencia (escalera de trailing / delta IA), todas a la vez
+            #    El máximo de la vela es el que los eventos de precio traen en vivo
+            peak = np.where(ok_bar & holding, np.maximum(peak, H[b]), peak)
+            open_pos = ok_bar & holding & (val_usd >= FLAT_BELOW_USD)
+            reason, new_peak = rules.exit_ladder(price, entry, peak, ia_entry, prob_b)
+            peak = np.where(open_pos, new_peak, peak)
+            emergencia = open_pos & (reason != EXIT_NONE)
+
+            # 2. Estado con posición (sin posición viene precalculado)
+            held = rules.status_held(prob_b, score_b, RS[b], price, entry, ok_macro)
+            status = np.where(val_usd >= HOLD_MIN_USD, held, status)
+            vende = sell_codes[status] & ok_bar & ~emergencia & (val_usd > HOLD_MIN_USD)
+            escala = ok_bar & ~vende & ~emergencia & (val_usd >= HOLD_MIN_USD) & (tramo2 >= 10.0)
+            escala &= prob_b >= rules.scale_in_high
+        compra = ok_bar & (status == COMPRA) & (val_usd < FLAT_BELOW_USD)
+
+        # 3. Órdenes en el orden de main.py: score descendente, el efectivo se reserva
+        eventos = np.flatnonzero(emergencia | vende | compra | escala)
+        for i in eventos[np.argsort(-score_b[eventos], kind="stable")]:
+            p = float(price[i])
+            if emergencia[i]:
+                sell(i, b, p, EXIT_LABELS[reason[i]])
+            elif vende[i]:
+                sell(i, b, p, LABELS[status[i]])
+            elif compra[i]:
+                if posiciones_activas >= max_pos or total_invertido > total_equity * max_exp_pct:
+                    continue
+                if usdt <= 10.5:
+                    continue
+                tramo1, t2 = strat.get_position_size(
+                    usdt, total_equity, float(val_usd[i]), int(score_b[i]), prob=float(prob_b[i])
+                )
+                if tramo1 >= 10.0:
+                    buy(i, b, p, tramo1, "T1")
+                    entry[i] = peak[i] = p  # registrar_entrada usa el precio de la señal
+                    ia_entry[i] = prob_b[i]
+                    tramo2[i] = t2 if t2 >= 10.0 else 0.0
+                    total_invertido += tramo1
+                    posiciones_activas += 1
+            elif escala[i] and usdt > tramo2[i]:
+                buy(i, b, p, float(tramo2[i]), "T2")
+                tramo2[i] = 0.0
+
+        equity[b] = usdt + (qty * price).sum()
+    np.seterr(**np_err)
+
+    return BacktestResult(symbols, ts, equity, trades, cash, time.perf_counter() - t_start)
+
+
+def _ffill(x):
+    """Rellena hacia delante los NaN por fila (S, B)."""
+    idx = np.where(np.isfinite(x), np.arange(x.shape[1]), 0)
+    np.maximum.accumulate(idx, axis=1, out=idx)
+    return x[np.arange(x.shape[0])[:, None], idx]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Backtest de las reglas de LULA")
+    parser.add_argument("--db", default=CANDLES_DB_PATH)
+    parser.add_argument("--symbols", default=None, help="lista separada por comas")
+    parser.add_argument("--probs", default=None, help=".npz con symbols, ts, prob")
+    parser.add_argument("--model", default=None, help="modelo para calcular las probabilidades")
+    parser.add_argument("--scalers", default="/app/data/scalers.pkl")
+    parser.add_argument("--demo", action="store_true", help="mercado sintético")
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--cash", type=float, default=1000.0)
+    parser.add_argument("--fee", type=float, default=FEE_PCT)
+    parser.add_argument("--slippage-bps", type=float, default=SLIPPAGE_BPS)
+    parser.add_argument("--out", default=REPORT_PATH)
+    args = parser.parse_args()
+
+    if args.demo:
+        data, prob = synthetic_market(len(strat.GENERATOR_COINS), args.years)
+    else:
+        symbols = args.symbols.split(",") if args.symbols else strat.GENERATOR_COINS
+        data = load_candles(symbols, args.db)
+        if args.probs:
+            prob = load_probs(args.probs, data)
+        elif args.model:
+            prob = model_probs(data, args.model, args.scalers)
+        else:
+            print("❌ Indica --probs o --model (o --demo).")
+            sys.exit(1)
+
+    S, B = data["ohlcv"].shape[:2]
+    print(f"🧪 Backtest: {S} símbolos × {B} velas ({B / (365 * 24):.1f} años)")
+    result = run_backtest(
+        data, prob, cash=args.cash, fee=args.fee, slippage_bps=args.slippage_bps
+    )
+    for k, v in result.summary().items():
+        print(f"  {k:>18}: {v}")
+    print(f"💾 Informe: {result.save(args.out)}")
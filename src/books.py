@@ -0,0 +1,152 @@
+"""
+LULA BOOKS v1.0 — FOTO ÚNICA DEL LIBRO DE ÓRDENES POR CICLO
+Descarga todos los libros en paralelo una sola vez, los guarda con TTL y
+calcula el imbalance (plano y ponderado por profundidad) una única vez.
+"""
+
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BOOK_DEPTH = 20
+
+
+def imbalance_flat(bids, asks):
+    """Imbalance clásico: (Σbids - Σasks) / (Σbids + Σasks)."""
+    b = sum(q for _, q in bids)
+    a = sum(q for _, q in asks)
+    return (b - a) / (b + a) if (b + a) > 0 else 0
+
+
+def imbalance_level_weighted(bids, asks, decay=0.5):
+    """Pesa cada nivel con exp(-decay * nivel): el top del libro manda."""
+    b = sum(q * math.exp(-decay * i) for i, (_, q) in enumerate(bids))
+    a = sum(q * math.exp(-decay * i) for i, (_, q) in enumerate(asks))
+    return (b - a) / (b + a) if (b + a) > 0 else 0
+
+
+def imbalance_distance_weighted(bids, asks, band_bps=50.0):
+    """
+    Pesa la liquidez (en USDT) según su distancia al mid-price.
+    Todo lo que esté fuera de `band_bps` puntos básicos no cuenta.
+    """
+    if not bids or not asks:
+        return 0
+    mid = (bids[0][0] + asks[0][0]) / 2
+    if mid <= 0:
+        return 0
+    band = band_bps / 10000.0
+
+    def side(levels):
+        total = 0.0
+        for p, q in levels:
+            dist = abs(p - mid) / mid
+            if dist > band:
+                break
+            total += p * q * (1 - dist / band)
+        return total
+
+    b, a = side(bids), side(asks)
+    return (b - a) / (b + a) if (b + a) > 0 else 0
+
+
+class BookSnapshot:
+    """Libro congelado + imbalances precalculados."""
+
+    __slots__ = ("bids", "asks", "ts", "imbalance", "imbalance_level", "imbalance_dist")
+
+    def __init__(self, book, ts):
+        self.bids = [[float(p), float(q)] for p, q, *_ in book.get("bids", [])[:BOOK_DEPTH]]
+        self.asks = [[float(p), float(q)] for p, q, *_ in book.get("asks", [])[:BOOK_DEPTH]]
+        self.ts = ts
+        self.imbalance = imbalance_flat(self.bids, self.asks)
+        self.imbalance_level = imbalance_level_weighted(self.bids, self.asks)
+        self.imbalance_dist = imbalance_distance_weighted(self.bids, self.asks)
+
+    def get(self, mode="flat"):
+        if mode == "level":
+            return self.imbalance_level
+        if mode == "distance":
+            return self.imbalance_dist
+        return self.imbalance
+
+
+class OrderBookCache:
+    """
+    Capa de snapshots por ciclo. `fetch_fn(symbol)` devuelve un libro ccxt.
+
+        books = OrderBookCache(lambda s: ex.fetch_order_book(s, limit=20), ttl=30)
+        books.refresh(symbols)          # 1 ronda concurrente por ciclo
+        books.imbalance("BTC/USDT")     # sin red
+    """
+
+    def __init__(self, fetch_fn, ttl=30.0, max_workers=8, fetch_many=None):
+        self.fetch_fn = fetch_fn
+        # fetch_many(symbols) → {símbolo: libro}: descarga por lotes (transporte asíncrono)
+        self.fetch_many = fetch_many
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self._snaps = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, symbol, now=None):
+        snap = self._snaps.get(symbol)
+        now = now or time.time()
+        return snap if snap is not None and now - snap.ts <= self.ttl else None
+
+    def _fetch(self, symbol):
+        try:
+            book = self.fetch_fn(symbol)
+            return symbol, BookSnapshot(book, time.time()) if book else None
+        except Exception:
+            return symbol, None
+
+    def refresh(self, symbols, force=False):
+        """Descarga en paralelo solo los libros caducados (o todos si force)."""
+        now = time.time()
+        with self._lock:
+            pending = [s for s in symbols if force or self._fresh(s, now) is None]
+        if not pending:
+            return 0
+        if self.fetch_many is not None:
+            books, ts = self.fetch_many(pending), time.time()
+            results = [(s, BookSnapshot(books[s], ts) if books.get(s) else None) for s in pending]
+        else:
+            workers = max(1, min(self.max_workers, len(pending)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(self._fetch, pending))
+        with self._lock:
+            for sym, snap in results:
+                if snap is not None:
+                    self._snaps[sym] = snap
+        return len(pending)
+
+    def store(self, books):
+        """Guarda libros ya descargados por otra vía ({símbolo: libro ccxt})."""
+        now = time.time()
+        with self._lock:
+            for sym, book in books.items():
+                self._snaps[sym] = BookSnapshot(book, now)
+        return len(books)
+
+    def get(self, symbol):
+        """Snapshot vigente; si no hay o caducó, se descarga solo ese símbolo."""
+        with self._lock:
+            snap = self._fresh(symbol)
+        if snap is None:
+            self.refresh([symbol])
+            with self._lock:
+                snap = self._fresh(symbol)
+        return snap
+
+    def imbalance(self, symbol, mode="flat"):
+        snap = self.get(symbol)
+        return snap.get(mode) if snap is not None else 0
+
+    def invalidate(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._snaps.clear()
+            else:
+                self._snaps.pop(symbol, None)
@@ -1,16 +1,17 @@
 """
 LULA BRAIN v7.5 — NEURAL TENSOR ENGINE (MLP EDITION)
 Sincronizado con Multi-Scaler y limpieza de logs de inferencia.
+El motor (RKNN / ONNX / NumPy) se elige en backends.py.
 """
 
 import joblib
 import numpy as np
-import pandas as pd
-import pandas_ta as ta
-from rknn.api import RKNN
-import os
+import os, sys
 
-os.environ["RKNN_LOG_LEVEL"] = "1"
+from backends import load_backend
+from features import FEATURES, HOUR_MS, align_spx, compute_features_batch, series_to_bars
+from indicators import FeatureState
+import metrics
 
 TIME_STEPS = 10
 
@@ -29,111 +30,159 @@ class SuppressOutput:
 
 
 class Brain:
-    def __init__(self, model_path, scaler_path):
-        import os, sys
-
-        # --- SILENCIADOR DE ARRANQUE (Mata avisos de versión y drivers) ---
-        f = open(os.devnull, "w")
-        _old_stdout = sys.stdout
-        _old_stderr = sys.stderr
-        sys.stdout = f
-        sys.stderr = f
-
-        try:
-            self.rknn = RKNN(verbose=False)
-
-            # 1. Carga del modelo consolidado
-            if self.rknn.load_rknn(model_path) != 0:
-                # Restauramos consola antes de lanzar el error para poder leerlo
-                sys.stdout, sys.stderr = _old_stdout, _old_stderr
-                raise Exception("❌ Error al cargar .rknn")
-
-            # 2. Runtime en los 3 núcleos de la NPU (0x07)
-            if self.rknn.init_runtime(target="rk3588", core_mask=0x07) != 0:
-                sys.stdout, sys.stderr = _old_stdout, _old_stderr
-                raise Exception("❌ Error NPU RK3588")
-
-        finally:
-            # --- RESTAURACIÓN DE CONSOLA ---
-            sys.stdout = _old_stdout
-            sys.stderr = _old_stderr
-            f.close()
+    def __init__(self, model_path, scaler_path, backend=None):
+        # 1-2. Motor de inferencia: RKNN en la NPU, o ONNX/NumPy en CPU (BRAIN_BACKEND)
+        if backend:
+            self.backend = load_backend(model_path, prefer=backend)
+        else:
+            self.backend = load_backend(model_path)
 
         # 3. Carga del Diccionario de Scalers Independientes
         self.scalers = joblib.load(scaler_path)
-        self.features = ["returns", "rsi", "volatility", "rvol", "corr_spx", "dist_ema"]
+        self.features = FEATURES
+        # Estado incremental por símbolo (lo persiste Guardian). None = cálculo por lotes
+        self.feature_states = None
 
         # Este mensaje ya saldrá limpio en tu consola
-        print(f"🧠 Brain v7.5 listo: {len(self.scalers)} scalers cargados.")
-
-    def prepare_data(self, symbol, bars, sp500_data):
-        """Limpia y prepara la matriz de datos aplanada para MLP"""
+        print(
+            f"🧠 Brain v7.5 listo: {len(self.scalers)} scalers cargados "
+            f"(backend: {self.backend.name})."
+        )
+
+    def _scale(self, symbol, feats):
+        """Escala las últimas TIME_STEPS filas (B, 6) con el scaler del símbolo → (60,)"""
+        # Scaler del símbolo. El escáner solo promueve pares con scaler (allowed=
+        # brain.scalers); el primero disponible queda para posiciones fijadas sin él
+        scaler = self.scalers.get(symbol, next(iter(self.scalers.values())))
+        last_seq = feats[-TIME_STEPS:]
+        return scaler.transform(last_seq).flatten().astype(np.float32)  # De (10,6) a (60,)
+
+    def _align_spx(self, bars_by_symbol, sp500_data):
+        """
+        S&P 500 alineado a las velas de cada símbolo ({símbolo: (B,)} o None).
+        Los símbolos con la misma línea temporal comparten un único alineado.
+        """
+        if sp500_data is None:
+            return None
+        if hasattr(sp500_data, "iloc"):  # pd.Series (connection.get_sp500_data)
+            sp500_data = series_to_bars(sp500_data)
+        if not len(sp500_data):
+            return None
+        cache, out = {}, {}
+        for sym, bars in bars_by_symbol.items():
+            if not bars:
+                continue
+            key = (bars[0][0], bars[-1][0], len(bars))
+            if key not in cache:
+                tf_ms = bars[-1][0] - bars[-2][0] if len(bars) > 1 else HOUR_MS
+                cache[key] = align_spx([b[0] for b in bars], sp500_data, tf_ms)
+            out[sym] = cache[key]
+        return out
+
+    def _prepare_incremental(self, assets_raw_data, spx_by_symbol=None, spx_until=None):
+        """
+        Features O(1) por vela nueva a partir del estado guardado de cada símbolo.
+        spx_until: hasta dónde el S&P es definitivo; las velas posteriores no se fijan.
+        """
+        prepared = []
+        for item in assets_raw_data:
+            sym, bars = item["symbol"], item["bars"]
+            try:
+                state = self.feature_states.setdefault(sym, FeatureState())
+                spx = spx_by_symbol.get(sym) if spx_by_symbol else None
+                rows, last = state.sync(bars, spx, final_until=spx_until)
+                if rows is None:
+                    continue
+                last_row = {"rsi": last[1], "close": float(bars[-1][4]), "rvol": last[3]}
+                prepared.append((sym, self._scale(sym, np.array(rows)), last_row))
+            except Exception as e:
+                print(f"⚠️ Error data {sym}: {e}")
+        return prepared
+
+    def prepare_batch(self, assets_raw_data, sp500_data, spx_until=None):
+        """
+        Feature Engineering v7.5 vectorizado: todas las monedas en una pasada del
+        kernel compartido con grow/trainer. Devuelve [(símbolo, secuencia, última fila)].
+        Con feature_states activo se usa el estado incremental en su lugar.
+        sp500_data: velas [[ts_ms, close], ...] (MacroService.spx_bars) o pd.Series.
+        spx_until: ms de la última descarga del S&P (MacroService.spx_asof).
+        """
+        if self.feature_states is not None:
+            spx_by_symbol = self._align_spx(
+                {item["symbol"]: item["bars"] for item in assets_raw_data}, sp500_data
+            )
+            return self._prepare_incremental(assets_raw_data, spx_by_symbol, spx_until)
+
+        bars_by_symbol = {
+            item["symbol"]: item["bars"] for item in assets_raw_data if len(item["bars"]) >= 200
+        }
+        prepared = []
         try:
-            # Buscamos el scaler del símbolo, si no existe usamos el primero disponible
-            scaler = self.scalers.get(symbol, next(iter(self.scalers.values())))
-            df = pd.DataFrame(bars, columns=["ts", "open", "high", "low", "close", "volume"])
-
-            # Feature Engineering v7.5
-            df["returns"] = np.log(df["close"] / df["close"].shift(1))
-            df["rsi"] = df.ta.rsi(length=14) / 100.0
-            df["volatility"] = (df.ta.atr(length=14) / df["close"]).fillna(0)
-            df["rvol"] = (df["volume"] / df["volume"].rolling(20).mean()).fillna(1.0)
-            df["ema200"] = df.ta.ema(length=200)
-            df["dist_ema"] = ((df["close"] - df["ema200"]) / df["ema200"]).fillna(0)
-            df["corr_spx"] = 0.0  # Placeholder para contexto macro
-
-            if len(df) < 200:
-                return None, None
-
-            # --- APLANADO (FLATTEN) PARA MODELO MLP ---
-            last_seq = df[self.features].tail(TIME_STEPS).values
-            scaled = scaler.transform(last_seq).flatten()  # De (10,6) a (60,)
-
-            return scaled.astype(np.float32), df.iloc[-1]
+            spx_by_symbol = self._align_spx(bars_by_symbol, sp500_data)
+            computed = compute_features_batch(bars_by_symbol, spx_by_symbol)
         except Exception as e:
-            print(f"⚠️ Error data {symbol}: {e}")
-            return None, None
+            print(f"⚠️ Error kernel de features: {e}")
+            return prepared
+
+        for sym, data in computed.items():
+            try:
+                feats = data["features"]
+                last_row = {
+                    "rsi": feats[-1, FEATURES.index("rsi")],
+                    "close": data["close"][-1],
+                    "rvol": feats[-1, FEATURES.index("rvol")],
+                }
+                prepared.append((sym, self._scale(sym, feats), last_row))
+            except Exception as e:
+                print(f"⚠️ Error data {sym}: {e}")
+        return prepared
 
-    def analyze_batch(self, assets_raw_data, sp500_data):
-        """Manda las secuencias a la NPU y limpia logs de formato"""
-        import sys, os
+    def prepare_data(self, symbol, bars, sp500_data):
+        """Limpia y prepara la matriz de datos aplanada para MLP (un solo símbolo)"""
+        prepared = self.prepare_batch([{"symbol": symbol, "bars": bars}], sp500_data)
+        if not prepared:
+            return None, None
+        _, seq, last_row = prepared[0]
+        return seq, last_row
 
+    def analyze_batch(self, assets_raw_data, sp500_data, spx_until=None):
+        """Apila todas las secuencias en un tensor (N, 60) y hace una sola pasada por el backend"""
         results = {}
 
-        # Abrimos devnull una sola vez para ahorrar recursos
+        # 1. Preparación de todas las secuencias (kernel vectorizado)
+        prepared = self.prepare_batch(assets_raw_data, sp500_data, spx_until)
+        if not prepared:
+            return results
+        syms, seqs, rows = zip(*prepared)
+
+        X = np.stack(seqs).astype(np.float32)
+
+        # 2. Inferencia por lotes con un único silenciador de stderr
         with open(os.devnull, "w") as fnull:
-            for item in assets_raw_data:
-                sym = item["symbol"]
-                seq, last_row = self.prepare_data(sym, item["bars"], sp500_data)
-
-                if seq is not None:
-                    try:
-                        inp = seq.reshape(1, -1)
-
-                        # --- SILENCIADOR QUIRÚRGICO ---
-                        _old_err = sys.stderr
-                        sys.stderr = fnull  # Redirigimos errores (donde sale el warning)
-
-                        try:
-                            # Cambiamos data_format=None a 'nhwc' para evitar que salte el aviso
-                            out = self.rknn.inference(inputs=[inp], data_format="nhwc")
-                        finally:
-                            sys.stderr = _old_err  # Restauramos siempre
-                        # ------------------------------
-
-                        raw_prob = float(out[0][0][0])
-                        prob = np.sqrt(raw_prob) if raw_prob > 0 else 0.0
-                        results[sym] = (
-                            prob,
-                            last_row["rsi"] * 100,
-                            last_row["close"],
-                            last_row["rvol"],
-                        )
-
-                    except Exception:
-                        continue
+            _old_err = sys.stderr
+            sys.stderr = fnull
+            try:
+                raw_probs = self.backend.infer(X)
+            finally:
+                sys.stderr = _old_err
+
+        # 3. Reparto de resultados por símbolo
+        for sym, raw_prob, last_row in zip(syms, raw_probs, rows):
+            if np.isnan(raw_prob):
+                continue
+            raw_prob = float(raw_prob)
+            prob = np.sqrt(raw_prob) if raw_prob > 0 else 0.0
+            results[sym] = (
+                prob,
+                last_row["rsi"] * 100,
+                last_row["close"],
+                last_row["rvol"],
+            )
         return results
 
     def release(self):
-        """Libera los recursos de la NPU"""
-        self.rknn.release()
+        """Libera los recursos del backend (NPU incluida)"""
+        self.backend.release()
+
+
+metrics.instrument(Brain, "brain", ["prepare_batch", "analyze_batch"])
@@ -0,0 +1,142 @@
+"""
+LULA CANDLES v1.0 — ALMACÉN INCREMENTAL DE VELAS (SQLite)
+Guarda el histórico OHLCV por símbolo en /app/data y solo pide al exchange
+las velas posteriores a la última guardada (since=). La vela abierta se parchea.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+CANDLES_DB_PATH = os.getenv("CANDLES_DB_PATH", "/app/data/candles.db")
+
+# Milisegundos por vela según timeframe de ccxt
+TIMEFRAME_MS = {
+    "1m": 60_000,
+    "5m": 300_000,
+    "15m": 900_000,
+    "1h": 3_600_000,
+    "4h": 14_400_000,
+    "1d": 86_400_000,
+}
+
+
+class CandleStore:
+    """
+    Caché persistente de velas con el mismo formato que ccxt:
+        [[ts, open, high, low, close, volume], ...]
+    Se mantiene una copia en memoria por símbolo para servir lecturas sin disco.
+    """
+
+    def __init__(self, path=CANDLES_DB_PATH, timeframe="1h", max_bars=1000):
+        self.path = path
+        self.timeframe = timeframe
+        self.tf_ms = TIMEFRAME_MS.get(timeframe, 3_600_000)
+        self.max_bars = max_bars
+        self._lock = threading.Lock()
+        self._mem = {}  # {symbol: [[ts, o, h, l, c, v], ...]}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS candles ("
+            " symbol TEXT NOT NULL, tf TEXT NOT NULL, ts INTEGER NOT NULL,"
+            " open REAL, high REAL, low REAL, close REAL, volume REAL,"
+            " PRIMARY KEY (symbol, tf, ts)) WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    # =========================
+    # LECTURA
+    # =========================
+
+    def _load(self, symbol):
+        """Carga perezosa desde SQLite a memoria (arranque en caliente)."""
+        if symbol in self._mem:
+            return self._mem[symbol]
+        rows = self._db.execute(
+            "SELECT ts, open, high, low, close, volume FROM candles"
+            " WHERE symbol = ? AND tf = ? ORDER BY ts DESC LIMIT ?",
+            (symbol, self.timeframe, self.max_bars),
+        ).fetchall()
+        self._mem[symbol] = [list(r) for r in reversed(rows)]
+        return self._mem[symbol]
+
+    def get(self, symbol, limit=500):
+        """Devuelve las últimas `limit` velas guardadas (lista de listas)."""
+        with self._lock:
+            bars = self._load(symbol)
+            return [list(b) for b in bars[-limit:]]
+
+    def last_ts(self, symbol):
+        with self._lock:
+            bars = self._load(symbol)
+            return bars[-1][0] if bars else None
+
+    # =========================
+    # ESCRITURA
+    # =========================
+
+    def upsert(self, symbol, bars):
+        """
+        Inserta o reemplaza velas. Las velas con ts ya existente (p.ej. la vela
+        abierta de la llamada anterior) se sobrescriben con los valores nuevos.
+        """
+        if not bars:
+            return
+        bars = sorted(([int(b[0])] + [float(x) for x in b[1:6]] for b in bars), key=lambda b: b[0])
+        with self._lock:
+            mem = self._load(symbol)
+            first_new = bars[0][0]
+            # Todo lo que sea >= a la primera vela nueva se reemplaza
+            cut = len(mem)
+            while cut > 0 and mem[cut - 1][0] >= first_new:
+                cut -= 1
+            mem[cut:] = bars
+            if len(mem) > self.max_bars:
+                del mem[: len(mem) - self.max_bars]
+
+            self._db.executemany(
+                "INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(symbol, self.timeframe, *b) for b in bars],
+            )
+            # Retención: no dejamos crecer la tabla más allá de max_bars por símbolo
+            self._db.execute(
+                "DELETE FROM candles WHERE symbol = ? AND tf = ? AND ts < ?",
+                (symbol, self.timeframe, mem[0][0]),
+            )
+            self._db.commit()
+
+    # =========================
+    # SINCRONIZACIÓN CON EXCHANGE
+    # =========================
+
+    def fetch_params(self, symbol, limit=500):
+        """
+        kwargs de fetch_ohlcv para ponerse al día: solo las velas nuevas desde la
+        última guardada, o descarga completa si la caché está fría o hay un hueco
+        mayor que `limit`.
+        """
+        last = self.last_ts(symbol)
+        with self._lock:
+            cached = len(self._mem.get(symbol, []))
+        now_ms = int(time.time() * 1000)
+
+        if last is None or cached < limit or (now_ms - last) > limit * self.tf_ms:
+            return {"limit": limit}
+        # since=last incluye la vela abierta anterior para parchear su cierre
+        n_new = int((now_ms - last) // self.tf_ms) + 2
+        return {"since": last, "limit": n_new}
+
+    def sync(self, ex, symbol, limit=500):
+        """Trae las velas nuevas y devuelve las últimas `limit`."""
+        bars = ex.fetch_ohlcv(symbol, self.timeframe, **self.fetch_params(symbol, limit))
+        self.upsert(symbol, bars)
+        return self.get(symbol, limit)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
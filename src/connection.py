@@ -1,10 +1,16 @@
 import ccxt, os, sys, time, yfinance as yf
 from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from datetime import datetime
-from pathlib import Path
-
-LOG_ORDERS = Path("/app/logs/orders.log")
+from books import OrderBookCache
+from candles import CandleStore
+from execution import ExecutionScheduler, volume_profile
+from governor import RequestGovernor, RequestShed, lane
+from ledger import LEDGER_DB_PATH, TradeLedger
+from markets import MarketsCache
+from transport import AsyncTransport, available as async_available
+import metrics
+from stream import MarketStream
+import tape
 
 
 class DualExchangeManager:
@@ -22,43 +28,319 @@ class DualExchangeManager:
                     with open(secret, "r") as f:
                         secret = f.read().strip()
 
-        self.gen = ccxt.binance(
-            {
-                "apiKey": os.getenv(key_env),
-                "secret": secret,
-                "enableRateLimit": True,
-                "options": {
-                    "defaultType": "spot",
-                    "adjustForTimeDifference": True,
-                    "recvWindow": 60000,
-                },
-            }
-        )
+        # 🧪 Paper trading: gen/safe simulados sobre un mismo mercado (ver paper.py)
+        self.paper = os.getenv("PAPER_TRADING", "0") == "1"
+        self.clock_speed = 1.0  # PAPER_SPEED con el reloj simulado instalado
 
-        # 🚀 ACTIVAR MODO SANDBOX (TESTNET)
-        if self.testnet:
-            self.gen.set_sandbox_mode(True)
-            # print("⚠️ LULA v7: TRABAJANDO EN RED DE PRUEBAS (TESTNET)")
+        gen_config = {
+            "apiKey": os.getenv(key_env),
+            "secret": secret,
+            "enableRateLimit": True,
+            "options": {
+                "defaultType": "spot",
+                "adjustForTimeDifference": True,
+                "recvWindow": 60000,
+            },
+        }
+        safe_id = os.getenv("XMR_EXCHANGE_ID", "coinex")
+        safe_config = {"apiKey": os.getenv("XMR_API_KEY"), "secret": os.getenv("XMR_SECRET_KEY")}
 
-        # Exchange secundario (Coinex no suele tener testnet pública tan accesible,
-        # así que lo dejamos normal o lo desactivamos en test)
-        self.safe = getattr(ccxt, os.getenv("XMR_EXCHANGE_ID", "coinex"))(
-            {"apiKey": os.getenv("XMR_API_KEY"), "secret": os.getenv("XMR_SECRET_KEY")}
-        )
+        if self.paper:
+            from paper import paper_pair
+
+            self.gen, self.safe = paper_pair(safe_id)
+            print(f"🧪 PAPER TRADING: mercado simulado ({len(self.gen.markets)} símbolos)")
+            clock = self.gen.market.clock
+            if clock.speed != 1:  # el gestor vive en la hora del mercado simulado
+                self.clock_speed = clock.install().speed
+                print(f"⏩ Reloj acelerado x{clock.speed:g} (time.time/time.sleep)")
+        else:
+            self.gen = ccxt.binance(dict(gen_config))
+
+            # 🚀 ACTIVAR MODO SANDBOX (TESTNET)
+            if self.testnet:
+                self.gen.set_sandbox_mode(True)
+                # print("⚠️ LULA v7: TRABAJANDO EN RED DE PRUEBAS (TESTNET)")
+
+            # Exchange secundario (Coinex no suele tener testnet pública tan accesible,
+            # así que lo dejamos normal o lo desactivamos en test)
+            self.safe = getattr(ccxt, safe_id)(dict(safe_config))
+
+        # 📼 Cinta de la sesión: graba/reproduce el REST crudo, por debajo de todo lo demás
+        self.tape = tape.current()
+        if self.tape is not None:
+            self.tape.wrap_exchange(self.gen, "gen")
+            self.tape.wrap_exchange(self.safe, "safe")
+
+        # ⏱️ Latencia por endpoint REST (ver /metrics)
+        metrics.instrument_exchange(self.gen, "gen")
+        metrics.instrument_exchange(self.safe, "safe")
+
+        # 🚦 Presupuesto de peso de Binance por carriles (las órdenes pasan primero)
+        self.governor = None
+        if os.getenv("REQUEST_GOVERNOR", "0" if self.paper else "1") == "1":
+            self.governor = RequestGovernor().attach(self.gen)
+
+        # 🔀 Lecturas del ciclo por transporte asíncrono (sesión aiohttp persistente,
+        # keep-alive y caché DNS). Sin aiohttp: hilos persistentes sobre ccxt síncrono
+        self._sync = {"gen": self.gen, "safe": self.safe}
+        self._pool = ThreadPoolExecutor(max_workers=int(os.getenv("FETCH_WORKERS", 16)))
+
+        # 🗂️ Mercados y precisiones desde disco (sin load_markets en cada arranque);
+        # se revalidan en segundo plano. Paper y cinta ya traen los suyos
+        self.markets = None
+        if os.getenv("MARKETS_CACHE", "1") == "1" and not self.paper and self.tape is None:
+            try:
+                self.markets = MarketsCache()
+                self.markets.attach("gen", self.gen).attach("safe", self.safe).start()
+            except Exception as e:
+                print(f"⚠️ Caché de mercados desactivada: {e}")
+                self.markets = None
+
+        self.transport = None
+        if (
+            os.getenv("ASYNC_TRANSPORT", "1") == "1"
+            and async_available()
+            and not self.paper
+            and self.tape is None
+        ):
+            try:
+                self.transport = AsyncTransport().start()
+                self.transport.add(
+                    "gen", "binance", gen_config, sandbox=self.testnet, governor=self.governor
+                )
+                self.transport.add("safe", safe_id, safe_config)  # coinex: sin peso de Binance
+            except Exception as e:
+                print(f"⚠️ Transporte asíncrono desactivado: {e}")
+                self.transport = None
+
+        # 📒 Libro local de órdenes y fills (entradas reales, PnL, comisiones)
+        try:
+            if self.tape is not None:
+                self.ledger = TradeLedger(path=":memory:")
+            elif self.paper:
+                self.ledger = TradeLedger(path=LEDGER_DB_PATH.replace(".db", "_paper.db"))
+            else:
+                self.ledger = TradeLedger()
+            self.ledger.fee_price = self._fee_price
+        except Exception as e:
+            print(f"⚠️ Ledger desactivado: {e}")
+            self.ledger = None
+
+        # Saldos y tickers memorizados por ciclo; una orden invalida los de su exchange
+        self._balances = {}  # {nombre: (cycle_id, balance)}
+        self._tickers = {}  # {(nombre, símbolo): (cycle_id, ticker)}
+        for name, ex in self._sync.items():
+            self._invalidate_on_orders(name, ex)
 
         self._macro_cache = {"data": None, "ts": 0}
+        self._cycle_id = 0
+        self._equity_memo = None  # (cycle_id, breakdown)
+        self._equity_last = None  # última valoración completa (reutilizable bajo presión)
 
-    # 🚀 REQUERIDO PARA V7: Descarga en paralelo
-    def get_data_batch(self, symbols, limit=500):
-        def fetch(s):
+        # 🕯️ Almacén incremental de velas (si el disco falla, volvemos a REST puro)
+        try:
+            # En frío y en memoria: con cinta, grabación y reproducción piden lo mismo;
+            # en paper, las velas de otra sesión van por delante del reloj simulado
+            if self.tape is not None or self.paper:
+                self.candles = CandleStore(path=":memory:")
+            else:
+                self.candles = CandleStore()
+        except Exception as e:
+            print(f"⚠️ CandleStore desactivado: {e}")
+            self.candles = None
+
+        # 📡 Feed websocket opcional (se arranca con start_stream)
+        self.stream = None
+
+        # 📚 Foto de libros por ciclo: 1 descarga por símbolo, imbalance calculado 1 vez
+        self.books = OrderBookCache(
+            self._fetch_book, ttl=float(os.getenv("BOOK_TTL", 30)), fetch_many=self._fetch_books
+        )
+
+        # 🌍 Servicio macro compartido con el Guardian (se asigna en main)
+        self.macro = None
+
+        # ⏱️ Planificador de órdenes hijas (se arranca con start_executor)
+        self.executor = None
+
+    def start_stream(self, symbols):
+        """Arranca el feed en vivo. Si no hay websockets, todo sigue por REST."""
+        if os.getenv("MARKET_STREAM", "1") != "1" or self.paper or self.tape is not None:
+            return False
+        stream = MarketStream(symbols, testnet=self.testnet)
+        if stream.start():
+            self.stream = stream
+            return True
+        return False
+
+    def start_executor(self):
+        """TWAP/VWAP/POV en segundo plano; reanuda las órdenes que quedaron a medias."""
+        if self.executor is None:
+            self.executor = ExecutionScheduler(
+                self.gen, price_fn=self._live_price, profile_fn=self._volume_profile
+            ).start()
+        return self.executor
+
+    def _live_price(self, symbol):
+        return self.stream.get_last_price(symbol) if self.stream is not None else None
+
+    def _volume_profile(self, symbol):
+        bars = self.candles.get(symbol, 24 * 14) if self.candles is not None else None
+        return volume_profile(bars)
+
+    def _live_bars(self, symbol, limit):
+        """
+        Sirve las velas desde el stream si la caché local no tiene huecos: las
+        del websocket deben ser consecutivas, la primera solapar la última
+        guardada y la última no ir por detrás. `upsert` reemplaza en memoria todo
+        lo posterior a la primera: un salto (reconexión que se comió una vela)
+        borraría la intermedia, así que entonces se sincroniza por REST.
+        """
+        if self.stream is None or self.candles is None:
+            return None
+        live = self.stream.get_klines(symbol)
+        last = self.candles.last_ts(symbol)
+        if not live or last is None or live[0][0] > last or live[-1][0] < last:
+            return None
+        tf_ms = self.candles.tf_ms
+        if any(b[0] - a[0] != tf_ms for a, b in zip(live, live[1:])):
+            return None
+        self.candles.upsert(symbol, live)
+        bars = self.candles.get(symbol, limit)
+        return bars if len(bars) >= limit else None
+
+    # =========================
+    # LECTURAS CONCURRENTES
+    # =========================
+
+    def _invalidate_on_orders(self, name, ex):
+        """
+        Tras crear una orden el saldo memorizado de ese exchange deja de valer;
+        la orden se anota en el ledger en el acto (sin esperar a la sincronización).
+        """
+        original = ex.create_order
+
+        def create_order(*args, **kwargs):
             try:
-                return s, self.gen.fetch_ohlcv(s, "1h", limit=limit)
-            except:
-                return s, None
+                order = original(*args, **kwargs)
+            finally:
+                self._balances.pop(name, None)
+            if self.ledger is not None:
+                try:
+                    self.ledger.record_order(name, order)
+                except Exception as e:
+                    print(f"⚠️ Ledger: orden sin anotar ({e})")
+            return order
+
+        ex.create_order = create_order
 
-        with ThreadPoolExecutor(max_workers=len(symbols)) as executor:
-            results = dict(executor.map(fetch, symbols))
-        return results
+    def _run_calls(self, calls):
+        """
+        [(exchange, método, args, kwargs)] → resultados en orden (excepción si falla).
+        Todo a la vez: transporte asíncrono o, sin él, el pool de hilos persistente.
+        """
+        if not calls:
+            return []
+        if self.transport is not None:
+            for name, ex in self._sync.items():
+                if self.transport.exchanges[name].markets is None:
+                    self.transport.share_markets(name, ex)
+            try:
+                return self.transport.gather(calls)
+            except Exception as e:  # bucle caído: cada llamada recibe el fallo
+                return [e] * len(calls)
+
+        def run(call):
+            name, method, args, kwargs = call
+            try:
+                return getattr(self._sync[name], method)(*args, **kwargs)
+            except Exception as e:
+                return e
+
+        return list(self._pool.map(run, calls))
+
+    def _ohlcv_calls(self, symbols, limit):
+        """Velas del stream (sin red) y peticiones para el resto."""
+        bars, calls = {}, []
+        timeframe = self.candles.timeframe if self.candles is not None else "1h"
+        for s in symbols:
+            try:
+                live = self._live_bars(s, limit)
+            except Exception:
+                live = None
+            if live is not None:
+                bars[s] = live
+                continue
+            params = self.candles.fetch_params(s, limit) if self.candles is not None else {}
+            calls.append(("gen", "fetch_ohlcv", (s, timeframe), params or {"limit": limit}))
+        return bars, calls
+
+    def _store_ohlcv(self, bars, calls, results, limit):
+        for (_, _, (s, _), _), res in zip(calls, results):
+            if isinstance(res, Exception) or not res:
+                bars[s] = None
+            elif self.candles is not None:
+                self.candles.upsert(s, res)
+                bars[s] = self.candles.get(s, limit)
+            else:
+                bars[s] = res
+        return bars
+
+    # 🚀 REQUERIDO PARA V7: Descarga en paralelo (incremental vía CandleStore)
+    def get_data_batch(self, symbols, limit=500):
+        bars, calls = self._ohlcv_calls(symbols, limit)
+        return self._store_ohlcv(bars, calls, self._run_calls(calls), limit)
+
+    def prefetch_cycle(self, symbols, limit=500, safe=False):
+        """
+        Todas las lecturas del ciclo en UNA ronda concurrente: velas, libros y
+        saldo de gen; con safe=True también saldo y ticker XMR del exchange seguro.
+        Los saldos y tickers quedan memorizados para el resto del ciclo.
+        """
+        bars, calls = self._ohlcv_calls(symbols, limit)
+        n_ohlcv = len(calls)
+        books = {s: self.stream.get_book(s) if self.stream is not None else None for s in symbols}
+        sin_libro = [s for s, b in books.items() if b is None]
+        calls += [("gen", "fetch_order_book", (s,), {"limit": 20}) for s in sin_libro]
+        extra = [("gen", "fetch_balance", (), {})]
+        if safe:
+            extra.append(("safe", "fetch_balance", (), {}))
+            extra.append(("safe", "fetch_ticker", ("XMR/USDT",), {}))
+        calls += extra
+
+        results = self._run_calls(calls)
+        self._store_ohlcv(bars, calls[:n_ohlcv], results[:n_ohlcv], limit)
+        n_books = n_ohlcv + len(sin_libro)
+        books.update(zip(sin_libro, results[n_ohlcv:n_books]))
+        self.books.store({s: b for s, b in books.items() if b and not isinstance(b, Exception)})
+        for (name, method, args, _), res in zip(extra, results[n_books:]):
+            if isinstance(res, Exception) or not res:
+                continue
+            if method == "fetch_balance":
+                self._balances[name] = (self._cycle_id, res)
+            else:
+                self._tickers[(name, args[0])] = (self._cycle_id, res)
+        return bars
+
+    def _name(self, ex):
+        return next((n for n, e in self._sync.items() if e is ex), None)
+
+    # 📏 Dimensionado de órdenes con la tabla de precisiones (sin red)
+    def amount_to_precision(self, symbol, amount, ex=None):
+        ex = ex if ex is not None else self.gen
+        if self.markets is not None:
+            return self.markets.amount_to_precision(self._name(ex), symbol, amount)
+        return ex.amount_to_precision(symbol, amount)
+
+    def min_notional(self, symbol, ex=None):
+        """Mínimo en USDT de una orden (0 si no se conoce)."""
+        ex = ex if ex is not None else self.gen
+        spec = self.markets.spec(self._name(ex), symbol) if self.markets is not None else None
+        if spec is not None:
+            return spec.min_notional
+        market = (getattr(ex, "markets", None) or {}).get(symbol) or {}
+        return float(((market.get("limits") or {}).get("cost") or {}).get("min") or 0.0)
 
     def get_data(self, ex, symbol, limit=500):
         try:
@@ -67,12 +349,32 @@ class DualExchangeManager:
             return None
 
     def get_balance(self, ex):
+        """Saldo memorizado en el ciclo (prefetch_cycle o primera consulta)."""
+        name = self._name(ex)
+        memo = self._balances.get(name)
+        if memo is not None and memo[0] == self._cycle_id:
+            return memo[1]
         try:
-            return ex.fetch_balance()
+            bal = ex.fetch_balance()
         except:
             return None
+        if name is not None and bal:
+            self._balances[name] = (self._cycle_id, bal)
+        return bal
+
+    def get_ticker(self, ex, symbol):
+        name = self._name(ex)
+        memo = self._tickers.get((name, symbol))
+        if memo is not None and memo[0] == self._cycle_id:
+            return memo[1]
+        ticker = ex.fetch_ticker(symbol)
+        self._tickers[(name, symbol)] = (self._cycle_id, ticker)
+        return ticker
 
     def get_sp500_data(self):
+        # Con servicio macro: serie horaria incremental ya en memoria (sin descarga)
+        if self.macro is not None:
+            return self.macro.spx_series()
         try:
             # Tu lógica original con un pequeño timeout
             spx = yf.download(
@@ -87,66 +389,159 @@ class DualExchangeManager:
         except:
             return None
 
-    def get_smart_imbalance(self, symbol):
-        try:
+    def _fetch_book(self, symbol):
+        book = self.stream.get_book(symbol) if self.stream is not None else None
+        if book is None:
             book = self.gen.fetch_order_book(symbol, limit=20)
-            bids = sum(b[1] for b in book["bids"])
-            asks = sum(a[1] for a in book["asks"])
-            return (bids - asks) / (bids + asks) if (bids + asks) > 0 else 0
+        return book
+
+    def _fetch_books(self, symbols):
+        """Libros de varios símbolos: stream primero, el resto en una ronda concurrente."""
+        books = {s: self.stream.get_book(s) if self.stream is not None else None for s in symbols}
+        faltan = [s for s, b in books.items() if b is None]
+        calls = [("gen", "fetch_order_book", (s,), {"limit": 20}) for s in faltan]
+        books.update(zip(faltan, self._run_calls(calls)))
+        return {s: b for s, b in books.items() if b and not isinstance(b, Exception)}
+
+    def refresh_books(self, symbols):
+        """Una sola ronda concurrente de libros al inicio de cada ciclo."""
+        try:
+            return self.books.refresh(symbols, force=True)
+        except:
+            return 0
+
+    def get_smart_imbalance(self, symbol, mode="flat"):
+        """mode: 'flat' (clásico), 'level' (decaimiento por nivel) o 'distance' (bps al mid)."""
+        try:
+            return self.books.imbalance(symbol, mode)
         except:
             return 0
 
+    # 🔄 Marca de ciclo: invalida las cachés que solo valen para un ciclo
+    def begin_cycle(self):
+        self._cycle_id += 1
+        self._equity_memo = None
+
     # 🚀 REQUERIDO PARA V7: Cálculo de capital robusto
-    def get_total_equity_usd(self):
+    def get_equity_breakdown(self, prices_map=None):
         """
-        Calcula el valor total de la cuenta en USDT.
-        Optimizado para RK3588: Filtra tokens basura de Testnet para evitar lags.
+        Valoración de la cuenta activo a activo, memorizada por ciclo.
+        Precios por orden de preferencia: stream en vivo → prices_map (cierre de
+        la última vela) → una única llamada fetch_tickers para lo que falte.
+        Devuelve {"total": usd, "assets": {asset: {"qty", "price", "usd", "source"}}}.
         """
-        try:
-            balance = self.get_balance(self.gen)
-            if not balance or "total" not in balance:
-                return 0.0
-
-            totals = balance["total"]
-            total_usd = 0.0
-
-            # 1. Sumamos balances en dólares directamente
-            total_usd += float(totals.get("USDT", 0.0))
-            total_usd += float(totals.get("USDC", 0.0))
-            total_usd += float(totals.get("BUSD", 0.0))
-
-            # 2. Definimos qué activos REALMENTE nos interesan (para no saturar la API)
-            # Puedes ampliar esta lista con los tokens que quieras tradear
-            activos_validos = ["BTC", "ETH", "BNB", "SOL", "XRP", "ADA", "DOT", "MATIC"]
-
-            for asset, amount in totals.items():
-                # Filtros de limpieza:
-                # - Ignorar si no tenemos cantidad significativa
-                # - Ignorar stablecoins ya sumadas
-                # - FILTRO CRÍTICO TESTNET: Ignorar el valor basura recurrente '18446.0'
-                if amount <= 0.0001 or asset in ["USDT", "USDC", "BUSD"] or amount == 18446.0:
-                    continue
-
-                # Solo buscamos precio si es un activo conocido o si no estamos en Testnet
-                if asset in activos_validos or not self.testnet:
+        if self._equity_memo is not None and self._equity_memo[0] == self._cycle_id:
+            return self._equity_memo[1]
+        # Bajo presión de peso la valoración no urgente reutiliza la anterior
+        if self._equity_last is not None and self.governor and self.governor.shedding():
+            return self._equity_last
+
+        balance = self.get_balance(self.gen)
+        if not balance or "total" not in balance:
+            return {"total": 0.0, "assets": {}}
+
+        totals = balance["total"]
+        assets = {}
+
+        # 1. Stablecoins a la par
+        for stable in ["USDT", "USDC", "BUSD"]:
+            qty = float(totals.get(stable) or 0.0)
+            if qty > 0:
+                assets[stable] = {"qty": qty, "price": 1.0, "usd": qty, "source": "stable"}
+
+        # 2. Definimos qué activos REALMENTE nos interesan (en Testnet hay mucha basura)
+        activos_validos = ["BTC", "ETH", "BNB", "SOL", "XRP", "ADA", "DOT", "MATIC"]
+
+        pendientes = {}
+        for asset, amount in totals.items():
+            # Filtros de limpieza:
+            # - Ignorar si no tenemos cantidad significativa
+            # - Ignorar stablecoins ya sumadas
+            # - FILTRO CRÍTICO TESTNET: Ignorar el valor basura recurrente '18446.0'
+            amount = float(amount or 0.0)
+            if amount <= 0.0001 or asset in ["USDT", "USDC", "BUSD"] or amount == 18446.0:
+                continue
+            if asset in activos_validos or not self.testnet:
+                pendientes[asset] = amount
+
+        # 3. Precios sin red (stream y velas del ciclo)
+        sin_precio = []
+        for asset, amount in pendientes.items():
+            sym = f"{asset}/USDT"
+            price, source = None, None
+            if self.stream is not None:
+                price, source = self.stream.get_last_price(sym), "stream"
+            if not price and prices_map:
+                price, source = prices_map.get(sym), "candle"
+            if price:
+                assets[asset] = {
+                    "qty": amount,
+                    "price": price,
+                    "usd": amount * price,
+                    "source": source,
+                }
+            else:
+                sin_precio.append(sym)
+
+        # 4. Lo que falte, en UNA sola petición (solo pares que existen: uno que
+        #    no esté en los mercados tumba el lote entero con BadSymbol)
+        markets = getattr(self.gen, "markets", None)
+        if markets:
+            sin_precio = [sym for sym in sin_precio if sym in markets]
+        parcial = False
+        if sin_precio:
+            tickers = {}
+            try:
+                with lane("background"):
+                    tickers = self.gen.fetch_tickers(sin_precio)
+            except RequestShed:
+                parcial = True  # descartada por el gobernador, no es un fallo del lote
+            except Exception as e:
+                print(f"⚠️ Tickers en lote fallidos ({e}): precio símbolo a símbolo")
+                for sym in sin_precio:
                     try:
-                        ticker = self.gen.fetch_ticker(f"{asset}/USDT")
-                        valor_asset = amount * ticker.get("last", 0.0)
-                        total_usd += valor_asset
-                    except:
-                        # Si el par no existe en el exchange, simplemente lo saltamos
-                        continue
+                        with lane("background"):
+                            tickers[sym] = self.gen.fetch_ticker(sym)
+                    except RequestShed:
+                        parcial = True
+                        break
+                    except Exception:
+                        pass
+            # Un total sin parte de los activos no se memoriza: mejor el anterior completo
+            if parcial and self._equity_last is not None:
+                return self._equity_last
+            for sym in sin_precio:
+                last = (tickers.get(sym) or {}).get("last")
+                if last:
+                    asset = sym.split("/")[0]
+                    qty = pendientes[asset]
+                    assets[asset] = {
+                        "qty": qty,
+                        "price": last,
+                        "usd": qty * last,
+                        "source": "ticker",
+                    }
 
-            return round(float(total_usd), 2)
+        breakdown = {
+            "total": round(float(sum(a["usd"] for a in assets.values())), 2),
+            "assets": assets,
+        }
+        if not parcial:
+            self._equity_memo = (self._cycle_id, breakdown)
+            self._equity_last = breakdown
+        return breakdown
 
+    def get_total_equity_usd(self, prices_map=None):
+        """
+        Calcula el valor total de la cuenta en USDT.
+        Optimizado para RK3588: O(1) peticiones por ciclo (ver get_equity_breakdown).
+        """
+        try:
+            return self.get_equity_breakdown(prices_map)["total"]
         except Exception as e:
             print(f"⚠️ Error calculando Equity: {e}")
             return 0.0
 
-        except Exception as e:
-            print(f"❌ Error crítico en Equity: {e}")
-            return 0.0
-
     def ensure_bnb_for_fees(self):
         """En Testnet, a veces es mejor no forzar la compra de BNB si no hay liquidez"""
         if self.testnet:
@@ -165,27 +560,34 @@ class DualExchangeManager:
             return self.gen.withdraw("USDT", amount, addr, params={"network": net})
         except:
             return None
+        finally:
+            self._balances.pop("gen", None)
 
-    def revisar_log_ordenes(
-        self, symbols=["BTC/USDT", "ETH/USDT", "SOL/USDT", "NEAR/USDT", "PEPE/USDT", "FET/USDT"]
-    ):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    def _fee_price(self, currency, ts_ms):
+        """Precio en USDT de la moneda de una comisión (BNB): cierre de su vela de 1m."""
+        if currency in ("USDT", "USDC", "FDUSD", "BUSD"):
+            return 1.0
+        minute = int(ts_ms) // 60_000 * 60_000
+        with lane("background"):
+            bars = self.gen.fetch_ohlcv(f"{currency}/USDT", "1m", since=minute, limit=1)
+        return float(bars[0][4]) if bars else None
 
-        # Abrimos el archivo directamente para no ensuciar la consola
-        with open(LOG_ORDERS, "a", encoding="utf-8") as f:
-            f.write(f"\n[{timestamp}] === REVISIÓN DE ÓRDENES ===\n")
+    # 📒 Sincronización incremental del ledger (sustituye a la revisión en orders.log)
+    def sync_ledger(self, symbols, safe_symbols=("XMR/USDT",), force=False):
+        """
+        Trades y órdenes nuevos desde el cursor de cada símbolo, todos en una ronda
+        concurrente. Respeta LEDGER_SYNC_SEC salvo `force`. Devuelve los fills nuevos.
+        """
+        if self.ledger is None or not (force or self.ledger.due()):
+            return 0
+        calls = self.ledger.sync_calls("gen", self.gen, symbols)
+        calls += self.ledger.sync_calls("safe", self.safe, safe_symbols)
+        new, errors = self.ledger.apply(calls, self._run_calls(calls))
+        if new or errors:
+            fallos = f" | {errors} errores" if errors else ""
+            print(f"📒 Ledger: {new} fills nuevos en {len(calls)} consultas{fallos}")
+        return new
 
-            for symbol in symbols:
-                try:
-                    orders = self.gen.fetch_orders(symbol, limit=5)
-                    if not orders:
-                        f.write(f"[{timestamp}] [{symbol}] Sin historial.\n")
-                        continue
-                    for o in orders:
-                        f.write(
-                            f"[{timestamp}] 🔹 {symbol} | {o['side'].upper()} | {o['status']} | Cant: {o['amount']} | Precio: {o['price']}\n"
-                        )
-                except Exception as e:
-                    f.write(f"[{timestamp}] ❌ Error en {symbol}: {e}\n")
 
-            f.write(f"[{timestamp}] ============================\n")
+# Un span por método del gestor (get_data_batch, refresh_books, get_balance...)
+metrics.instrument(DualExchangeManager, "conn")
@@ -0,0 +1,278 @@
+"""
+LULA DASHBOARD v1.0 — PANEL WEB EN MEMORIA (JSON + SSE)
+El bucle de trading publica el estado del ciclo con `board.publish(...)`: se
+serializa UNA vez (JSON, gzip y ETag precalculados) y se reparte a los clientes
+SSE por colas acotadas. Publicar nunca bloquea: un cliente lento pierde su cola
+y recibe un "reset" para recargar /api/state.
+
+    GET /              → página (se actualiza sola por SSE, sin meta refresh)
+    GET /api/state     → estado completo (ETag / If-None-Match → 304, gzip)
+    GET /api/stream    → SSE: solo las filas que cambian ("rows"), cabecera ("meta")
+    GET /metrics       → latencias por etapa/endpoint en formato Prometheus
+    GET /index.html    → HTML estático (solo si DASHBOARD_WRITE_HTML=1)
+"""
+
+import gzip
+import hashlib
+import json
+import math
+import numbers
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import metrics
+
+DASHBOARD_PORT = int(os.getenv("DASHBOARD_PORT", 5000))
+MAX_SSE_CLIENTS = int(os.getenv("DASHBOARD_MAX_CLIENTS", 16))
+SSE_QUEUE = 64  # eventos pendientes por cliente antes de forzar un reset
+SSE_HEARTBEAT_SEC = 15
+CLIENT_TIMEOUT_SEC = 10  # escritura bloqueada más de esto → se corta el cliente
+WEB_DIR = "/app/data"
+
+
+def _json_safe(x):
+    """Copia apta para JSON estricto: NaN/±inf → null (JSON.parse del navegador no los admite)."""
+    if isinstance(x, dict):
+        return {k: _json_safe(v) for k, v in x.items()}
+    if isinstance(x, (list, tuple)):
+        return [_json_safe(v) for v in x]
+    if isinstance(x, numbers.Real) and not isinstance(x, numbers.Integral):  # numpy incluido
+        x = float(x)
+        return x if math.isfinite(x) else None
+    return x
+
+
+class DashboardState:
+    """Último estado del ciclo, compartido entre el bucle y los hilos HTTP."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = set()
+        self.version = 0
+        self.header = ""
+        self.footer = ""
+        self.meta = {}
+        self.rows = {}  # {símbolo: {campos..., "html": fila}}
+        self.order = []
+        self._body = b"{}"
+        self._gz = gzip.compress(self._body)
+        self._etag = '"0"'
+
+    # ---------- publicación (hilo principal) ----------
+
+    def publish(self, rows, order=None, header="", footer="", meta=None):
+        """
+        rows: {símbolo: dict JSON-serializable}. Solo se emiten por SSE las filas
+        que cambian respecto a la publicación anterior (None = fila eliminada).
+        Los valores no finitos (rsi/imb NaN) se publican como null.
+        """
+        rows = {s: _json_safe(r) for s, r in rows.items()}
+        meta = _json_safe(dict(meta or {}))
+        order = list(order if order is not None else rows)
+        with self._lock:
+            changed = {s: r for s, r in rows.items() if self.rows.get(s) != r}
+            changed.update({s: None for s in self.rows if s not in rows})
+            head_changed = (header, footer, meta, order) != (
+                self.header,
+                self.footer,
+                self.meta,
+                self.order,
+            )
+            if not changed and not head_changed:
+                return 0
+            self.rows, self.order = dict(rows), order
+            self.header, self.footer, self.meta = header, footer, meta
+            self.version += 1
+            state = self._snapshot()
+            body = json.dumps(state, separators=(",", ":"), default=str, allow_nan=False)
+            body = body.encode()
+            self._body, self._gz = body, gzip.compress(body, compresslevel=5)
+            self._etag = '"%s"' % hashlib.sha1(body).hexdigest()[:16]
+            if changed:
+                self._broadcast("rows", {"v": self.version, "rows": changed, "order": order})
+            if head_changed:
+                self._broadcast("meta", {k: state[k] for k in ("v", "header", "footer", "meta")})
+        return len(changed)
+
+    def _snapshot(self):
+        return {
+            "v": self.version,
+            "ts": time.time(),
+            "header": self.header,
+            "footer": self.footer,
+            "meta": self.meta,
+            "order": self.order,
+            "rows": self.rows,
+        }
+
+    def _broadcast(self, event, data):
+        data = json.dumps(data, default=str, allow_nan=False)
+        msg = f"event: {event}\ndata: {data}\n\n".encode()
+        for q in self._clients:
+            try:
+                q.put_nowait(msg)
+            except queue.Full:
+                # Cliente lento: vaciamos su cola y que recargue el estado completo
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait(b"event: reset\ndata: {}\n\n")
+
+    # ---------- lectura (hilos HTTP) ----------
+
+    def body(self, gzipped=False):
+        with self._lock:
+            return (self._gz if gzipped else self._body), self._etag
+
+    def subscribe(self):
+        with self._lock:
+            if len(self._clients) >= MAX_SSE_CLIENTS:
+                return None
+            q = queue.Queue(maxsize=SSE_QUEUE)
+            self._clients.add(q)
+            return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._clients.discard(q)
+
+    def clients(self):
+        with self._lock:
+            return len(self._clients)
+
+
+# =========================
+# SERVIDOR HTTP
+# =========================
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    board = None  # DashboardState (se asigna en serve)
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        return
+
+    def setup(self):
+        super().setup()
+        self.connection.settimeout(CLIENT_TIMEOUT_SEC)
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        try:
+            if path in ("/", "/dashboard"):
+                self._send(200, PAGE_HTML.encode(), "text/html; charset=utf-8")
+            elif path == "/api/state":
+                self._state()
+            elif path == "/api/stream":
+                self._stream()
+            elif path == "/metrics":
+                body = metrics.render().encode()
+                self._send(200, body, "text/plain; version=0.0.4; charset=utf-8")
+            elif path == "/index.html":
+                self._static(os.path.join(WEB_DIR, "index.html"))
+            elif path == "/favicon.ico":
+                self._send(204, b"")
+            else:
+                self._send(404, b"not found", "text/plain")
+        except (BrokenPipeError, ConnectionResetError, TimeoutError, OSError):
+            pass
+
+    def _send(self, code, body, ctype=None, headers=None):
+        self.send_response(code)
+        if ctype:
+            self.send_header("Content-Type", ctype)
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _state(self):
+        gz = "gzip" in self.headers.get("Accept-Encoding", "")
+        body, etag = self.board.body(gzipped=gz)
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", headers=headers)
+        if gz:
+            headers["Content-Encoding"] = "gzip"
+        self._send(200, body, "application/json", headers)
+
+    def _static(self, path):
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+        except OSError:
+            return self._send(404, b"not found", "text/plain")
+        self._send(200, body, "text/html; charset=utf-8")
+
+    def _stream(self):
+        q = self.board.subscribe()
+        if q is None:
+            return self._send(503, b"demasiados clientes", "text/plain")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            self.wfile.write(b"retry: 3000\n\n")
+            self.wfile.flush()
+            while True:
+                try:
+                    msg = q.get(timeout=SSE_HEARTBEAT_SEC)
+                except queue.Empty:
+                    msg = b": ping\n\n"  # latido: detecta clientes desconectados
+                self.wfile.write(msg)
+                self.wfile.flush()
+        finally:
+            self.board.unsubscribe(q)
+
+
+def serve(board, port=DASHBOARD_PORT):
+    """Bloquea sirviendo el panel (lanzar en un hilo daemon)."""
+    handler = type("BoundDashboardHandler", (DashboardHandler,), {"board": board})
+    server = ThreadingHTTPServer(("0.0.0.0", port), handler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def start(board, port=DASHBOARD_PORT):
+    threading.Thread(target=serve, args=(board, port), name="lula-web", daemon=True).start()
+    return board
+
+
+# =========================
+# PÁGINA
+# =========================
+
+PAGE_HTML = """<!DOCTYPE html><html><head><meta charset='utf-8'><title>LULA</title>
+<style>
+body{background:#000;color:#fff;font-family:'Consolas','Monaco',monospace;
+  padding:20px;font-size:14px;}
+pre{line-height:1.2;margin:0;white-space:pre;}
+span{text-shadow:none !important;}
+#st{color:#808080;font-size:12px;margin-top:8px;}
+</style></head><body><pre id='h'></pre><pre id='r'></pre><pre id='f'></pre><div id='st'></div>
+<script>
+let S={v:0,rows:{},order:[]};
+const $=id=>document.getElementById(id);
+function rows(){$('r').innerHTML=S.order.filter(s=>S.rows[s]).map(s=>S.rows[s].html).join('\\n');}
+function meta(d){$('h').innerHTML=d.header;$('f').innerHTML=d.footer;S.v=d.v;}
+function load(){fetch('/api/state').then(r=>r.json()).then(d=>{S=d;meta(d);rows();});}
+function connect(){
+  const es=new EventSource('/api/stream');
+  es.onopen=()=>{$('st').textContent='● en vivo';load();};
+  es.onerror=()=>{$('st').textContent='○ reconectando...';};
+  es.addEventListener('rows',e=>{const d=JSON.parse(e.data);
+    for(const s in d.rows){if(d.rows[s]===null)delete S.rows[s];else S.rows[s]=d.rows[s];}
+    S.order=d.order;S.v=d.v;rows();});
+  es.addEventListener('meta',e=>meta(JSON.parse(e.data)));
+  es.addEventListener('reset',load);
+}
+connect();
+</script></body></html>"""
@@ -0,0 +1,237 @@
+"""
+LULA EVENTS v1.0 — PLANIFICADOR POR EVENTOS
+Sustituye los sleeps fijos (600/60/15 s) del bucle principal. El bot despierta:
+    🕯️ candle → al cerrar la vela en hora del servidor (+ margen de gracia)
+    🎯 price  → cuando el precio en vivo (stream) se acerca a un stop/trailing
+                o cruza el siguiente escalón de la escalera del Guardian
+    ✅ fill   → cuando termina una orden del worker o del planificador
+    ⏰ timer  → latido de seguridad si no pasa nada
+Los eventos de precio y fill traen sus símbolos: solo esos se re-evalúan.
+Los precios salen del websocket en memoria: vigilar no añade llamadas REST.
+"""
+
+import os
+import queue
+import threading
+import time
+
+from candles import TIMEFRAME_MS
+
+CANDLE_GRACE_SEC = float(os.getenv("CANDLE_CLOSE_GRACE", 2.0))
+# Desfase horario de las velas respecto a UTC (Binance: velas 1d en otra zona)
+CANDLE_TZ_OFFSET_H = float(os.getenv("CANDLE_TZ_OFFSET_H", 0))
+PRICE_POLL_SEC = float(os.getenv("PRICE_POLL_SEC", 1.0))
+TRIGGER_BAND = float(os.getenv("TRIGGER_BAND", 0.002))  # "cerca" del stop = a menos de 0.2%
+SERVER_RESYNC_SEC = 6 * 3600
+
+
+class Event:
+    """Evento (posiblemente fusionado). symbols=None → todos los símbolos."""
+
+    __slots__ = ("kinds", "symbols", "ts", "detail")
+
+    def __init__(self, kind, symbols=None, detail=""):
+        self.kinds = {kind}
+        self.symbols = set(symbols) if symbols is not None else None
+        self.ts = time.time()
+        self.detail = [detail] if detail else []
+
+    def merge(self, other):
+        self.kinds |= other.kinds
+        if self.symbols is None or other.symbols is None:
+            self.symbols = None
+        else:
+            self.symbols |= other.symbols
+        self.detail += other.detail
+        return self
+
+    @property
+    def full(self):
+        return self.symbols is None
+
+    def __repr__(self):
+        syms = "ALL" if self.symbols is None else ",".join(sorted(self.symbols))
+        return f"Event({'+'.join(sorted(self.kinds))}: {syms})"
+
+
+class PriceTrigger:
+    """
+    Vigilancia de un símbolo. Dispara una vez (se desarma) hasta que main la rearma.
+        below: dispara al bajar de below * (1 + band)
+        above: dispara al subir de above
+        trail_pct: el `below` sigue al máximo visto (trailing), como en el Guardian;
+                   con `below` fijo, este queda de suelo (gana el más alto)
+    Solo dispara al CRUZAR el nivel (la primera lectura solo se anota): si el
+    Guardian decide mantener, rearmar no provoca un bucle de despertares.
+    """
+
+    __slots__ = ("below", "above", "trail_pct", "high", "floor", "band", "reason", "armed", "prev")
+
+    def __init__(
+        self, below=None, above=None, trail_pct=None, high=None, band=TRIGGER_BAND, reason=""
+    ):
+        self.below = below
+        self.above = above
+        self.trail_pct = trail_pct
+        self.high = high
+        self.floor = below if trail_pct else None
+        self.band = band
+        self.reason = reason
+        self.armed = True
+        self.prev = None
+
+    def check(self, price):
+        if not self.armed or not price:
+            return None
+        if self.trail_pct:
+            if self.high is None or price > self.high:
+                self.high = price
+            self.below = max(self.high * (1 - self.trail_pct), self.floor or 0.0)
+        prev, self.prev = self.prev, price
+        if prev is None:
+            return None
+        if self.below is not None:
+            level = self.below * (1 + self.band)
+            if prev > level >= price:
+                self.armed = False
+                return f"{self.reason or 'stop'} {price:.6g} ≤ {self.below:.6g}"
+        if self.above is not None and prev < self.above <= price:
+            self.armed = False
+            return f"{self.reason or 'nivel'} {price:.6g} ≥ {self.above:.6g}"
+        return None
+
+
+class EventScheduler:
+    def __init__(self, timeframe="1h", grace=CANDLE_GRACE_SEC, tz_offset_h=CANDLE_TZ_OFFSET_H):
+        self.tf_ms = TIMEFRAME_MS.get(timeframe, 3_600_000)
+        self.grace_ms = int(grace * 1000)
+        self.tz_ms = int(tz_offset_h * 3_600_000)
+        self.server_offset_ms = 0  # hora servidor - hora local
+        self._synced_at = 0.0
+        self._exchange = None
+        self._q = queue.Queue()
+        self._triggers = {}
+        self._lock = threading.Lock()
+        self._next_close_ms = None  # cierre pendiente (no se pierde si el ciclo se alarga)
+        self.virtual = False  # reproducción de cinta: la espera avanza el reloj (time.sleep)
+        self.speed = 1.0  # reloj acelerado (PAPER_SPEED): la espera en cola se acorta igual
+
+    # ---------- hora del servidor ----------
+
+    def sync_server_time(self, exchange):
+        """Mide el desfase con el reloj del exchange (1 llamada REST cada 6 h)."""
+        self._exchange = exchange
+        try:
+            t0 = time.time() * 1000
+            server = float(exchange.fetch_time())
+            t1 = time.time() * 1000
+            self.server_offset_ms = int(server - (t0 + t1) / 2)
+        except Exception as e:
+            print(f"⚠️ Sin hora del servidor (uso reloj local): {e}")
+        self._synced_at = time.time()
+        return self.server_offset_ms
+
+    def server_now_ms(self):
+        return int(time.time() * 1000) + self.server_offset_ms
+
+    def next_candle_close_ms(self, now_ms=None):
+        """Próximo cierre de vela (hora servidor, ms) ya con el margen de gracia."""
+        now_ms = self.server_now_ms() if now_ms is None else now_ms
+        local = now_ms + self.tz_ms - self.grace_ms
+        return (local // self.tf_ms + 1) * self.tf_ms - self.tz_ms + self.grace_ms
+
+    def next_wake_local(self, timeout):
+        """Hora local del próximo despertar previsto (para la UI)."""
+        close = self._next_close_ms or self.next_candle_close_ms()
+        to_close = max(0.0, (close - self.server_now_ms()) / 1000)
+        return time.time() + min(timeout, to_close)
+
+    # ---------- fuentes de eventos ----------
+
+    def notify(self, kind, symbols=None, detail=""):
+        """Seguro desde cualquier hilo (worker de órdenes, planificador...)."""
+        self._q.put(Event(kind, symbols, detail))
+
+    def watch(self, symbol, **kwargs):
+        """Arma (o rearma) la vigilancia de precio de un símbolo."""
+        with self._lock:
+            self._triggers[symbol] = PriceTrigger(**kwargs)
+
+    def unwatch(self, symbol):
+        with self._lock:
+            self._triggers.pop(symbol, None)
+
+    def high(self, symbol):
+        """Máximo visto por el trailing en vivo (para actualizar el Guardian)."""
+        with self._lock:
+            t = self._triggers.get(symbol)
+            return t.high if t is not None else None
+
+    def watched(self):
+        with self._lock:
+            return [s for s, t in self._triggers.items() if t.armed]
+
+    def check_prices(self, price_fn):
+        """Evalúa los disparadores con precios en memoria. Devuelve cuántos saltaron."""
+        with self._lock:
+            triggers = list(self._triggers.items())
+        fired = 0
+        for symbol, trig in triggers:
+            try:
+                price = price_fn(symbol)
+            except Exception:
+                price = None
+            msg = trig.check(price) if price else None
+            if msg:
+                self.notify("price", [symbol], f"{symbol}: {msg}")
+                fired += 1
+        return fired
+
+    # ---------- espera ----------
+
+    def wait(self, timeout, price_fn=None):
+        """
+        Bloquea hasta el primer evento, el cierre de vela o `timeout` segundos.
+        Los eventos que llegan juntos se fusionan en uno solo.
+        """
+        deadline = time.time() + timeout
+        if self._next_close_ms is None:
+            self._next_close_ms = self.next_candle_close_ms()
+        close_local = (self._next_close_ms - self.server_offset_ms) / 1000
+        ev = None
+
+        while ev is None:
+            now = time.time()
+            if now >= close_local:
+                self._next_close_ms = self.next_candle_close_ms()
+                ev = Event("candle", None, time.strftime("%H:%M", time.localtime(close_local)))
+                break
+            if now >= deadline:
+                ev = Event("timer")
+                break
+            if price_fn is not None:
+                self.check_prices(price_fn)
+            pause = min(deadline, close_local) - now
+            if price_fn is not None:
+                pause = min(pause, PRICE_POLL_SEC)
+            try:
+                if self.virtual:
+                    ev = self._q.get_nowait()
+                else:
+                    ev = self._q.get(timeout=max(0.01, pause / self.speed))
+            except queue.Empty:
+                if self.virtual:
+                    time.sleep(max(0.01, pause))
+                continue
+
+        # Fusionamos todo lo que ya esté en cola
+        while True:
+            try:
+                ev.merge(self._q.get_nowait())
+            except queue.Empty:
+                break
+
+        if "candle" in ev.kinds and self._exchange is not None:
+            if time.time() - self._synced_at > SERVER_RESYNC_SEC:
+                self.sync_server_time(self._exchange)
+        return ev
@@ -0,0 +1,675 @@
+"""
+LULA EXECUTION v1.0 — PLANIFICADOR DE ÓRDENES (TIMER WHEEL)
+Sustituye el bucle `time.sleep` de execute_twap. Cada orden padre se trocea en
+órdenes hijas que una rueda de temporizadores dispara a su hora; muchas órdenes
+padre avanzan a la vez sin bloquear a nadie.
+
+Algoritmos:
+    twap → tramos iguales y equidistantes
+    vwap → tramos proporcionales al perfil de volumen por hora (velas 1h)
+    pov  → cada tramo = % del volumen negociado desde el anterior (participación)
+
+Las órdenes en curso se persisten en /app/data/exec_orders.json y se reanudan
+al arrancar. SimExchange + VirtualClock permiten probar y avanzar en el tiempo:
+    python src/execution.py
+"""
+
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+EXEC_STATE_PATH = "/app/data/exec_orders.json"
+EXEC_TICK = float(os.getenv("EXEC_TICK", 1.0))
+MIN_OP_USDT = float(os.getenv("MIN_OP_USDT", 15.0))
+
+ALGOS = ("twap", "vwap", "pov")
+
+
+# =========================
+# RELOJES
+# =========================
+
+
+class RealClock:
+    def now(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Reloj manual: `sleep` y `advance` mueven el tiempo sin esperar."""
+
+    def __init__(self, start=0.0):
+        self.t = float(start)
+        self._lock = threading.Lock()
+
+    def now(self):
+        with self._lock:
+            return self.t
+
+    def advance(self, seconds):
+        with self._lock:
+            self.t += seconds
+            return self.t
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+
+# =========================
+# RUEDA DE TEMPORIZADORES
+# =========================
+
+
+class TimerWheel:
+    """
+    Rueda hash de `slots` casillas de `tick` segundos. Cada entrada guarda su
+    tick absoluto, así los vencimientos lejanos (más de una vuelta) esperan en
+    su casilla hasta que les toca. add/advance son O(1) amortizados por entrada.
+    """
+
+    def __init__(self, tick=EXEC_TICK, slots=512, start=None):
+        self.tick = tick
+        self.slots = slots
+        self.wheel = [[] for _ in range(slots)]
+        # último tick absoluto procesado
+        self.cursor = self._tick_of(time.time() if start is None else start) - 1
+        self.size = 0
+
+    def _tick_of(self, t):
+        return int(math.floor(t / self.tick))
+
+    def add(self, due, item):
+        k = self._tick_of(due)
+        if k <= self.cursor:
+            k = self.cursor + 1  # ya vencido → salta en el próximo avance
+        self.wheel[k % self.slots].append((k, item))
+        self.size += 1
+
+    def advance(self, now):
+        """Devuelve los elementos vencidos hasta `now`, en orden de vencimiento."""
+        target = self._tick_of(now)
+        if target <= self.cursor:
+            return []
+        steps = target - self.cursor
+        if steps >= self.slots:
+            indices = range(self.slots)
+        else:
+            indices = [(self.cursor + i) % self.slots for i in range(1, steps + 1)]
+
+        due = []
+        for idx in indices:
+            slot = self.wheel[idx]
+            if not slot:
+                continue
+            keep = []
+            for k, item in slot:
+                (due if k <= target else keep).append((k, item))
+            self.wheel[idx] = keep
+        self.cursor = target
+        self.size -= len(due)
+        due.sort(key=lambda e: e[0])
+        return [item for _, item in due]
+
+    def __len__(self):
+        return self.size
+
+
+# =========================
+# PLANES DE EJECUCIÓN
+# =========================
+
+
+def volume_profile(bars, buckets=24):
+    """
+    Velas 1h ccxt → pesos de volumen (en USDT) por hora UTC, normalizados a 1.
+    Sin historial devuelve un perfil plano.
+    """
+    totals = [0.0] * buckets
+    counts = [0] * buckets
+    for b in bars or []:
+        h = int(b[0] // 3_600_000) % buckets
+        totals[h] += float(b[4]) * float(b[5])
+        counts[h] += 1
+    means = [t / c if c else 0.0 for t, c in zip(totals, counts)]
+    s = sum(means)
+    if s <= 0:
+        return [1.0 / buckets] * buckets
+    return [m / s for m in means]
+
+
+def twap_schedule(total_usd, start, duration, n_slices):
+    """[(vencimiento, usd)] con tramos iguales; el primero sale ya."""
+    n = max(1, int(n_slices))
+    step = duration / n
+    usd = total_usd / n
+    return [(start + i * step, usd) for i in range(n)]
+
+
+def vwap_schedule(total_usd, start, duration, n_slices, profile):
+    """Como TWAP, pero cada tramo pesa según el volumen típico de su hora."""
+    n = max(1, int(n_slices))
+    step = duration / n
+    buckets = len(profile)
+    weights = []
+    for i in range(n):
+        mid = start + (i + 0.5) * step  # hora representativa del tramo
+        weights.append(profile[int(mid // 3600) % buckets])
+    s = sum(weights)
+    if s <= 0:
+        return twap_schedule(total_usd, start, duration, n)
+    return [(start + i * step, total_usd * w / s) for i, w in enumerate(weights)]
+
+
+def pov_schedule(start, duration, interval):
+    """Participación: solo horas de revisión; el tamaño se decide al vencer."""
+    n = max(1, int(math.ceil(duration / interval)))
+    return [(start + i * interval, None) for i in range(n + 1)]
+
+
+# =========================
+# ORDEN PADRE
+# =========================
+
+
+class ParentOrder:
+    """
+    Orden grande + sus tramos. Expone `ejecutado`/`error` como los trabajos de
+    pipeline.OrderWorker, así main.aplicar_ordenes sirve para ambos.
+    """
+
+    def __init__(self, symbol, side, total_usd, price, algo="twap", label="", meta=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.symbol = symbol
+        self.side = side
+        self.total_usd = float(total_usd)
+        self.price = float(price)  # precio de referencia (respaldo)
+        self.algo = algo
+        self.label = label
+        self.meta = meta or {}
+        self.rate = 0.0  # solo pov
+        self.slices = []  # [{"due", "usd", "status", "filled_usd", "qty"(, "price")}]
+        self.filled_usd = 0.0
+        self.filled_qty = 0.0
+        self.carry = 0.0  # importe de tramos por debajo del mínimo → pasa al siguiente
+        self.vol_mark = None  # pov: hasta dónde (ts) se ha contado el volumen negociado
+        self.state = "active"
+        self.created = time.time()
+        self.claimed = True  # False = nadie espera el resultado (reanudada tras reinicio)
+        self.error = None
+
+    @property
+    def ejecutado(self):
+        return self.filled_usd
+
+    @property
+    def remaining_usd(self):
+        return max(0.0, self.total_usd - self.filled_usd)
+
+    def progress(self):
+        done = sum(1 for s in self.slices if s["status"] != "pending")
+        return {
+            "id": self.id,
+            "symbol": self.symbol,
+            "algo": self.algo,
+            "label": self.label,
+            "state": self.state,
+            "filled_usd": round(self.filled_usd, 2),
+            "total_usd": round(self.total_usd, 2),
+            "pct": round(100 * self.filled_usd / self.total_usd, 1) if self.total_usd else 0,
+            "avg_price": self.filled_usd / self.filled_qty if self.filled_qty else 0.0,
+            "slices_done": done,
+            "slices_total": len(self.slices),
+        }
+
+    def to_dict(self):
+        d = {k: v for k, v in self.__dict__.items() if k not in ("error", "claimed")}
+        d["error"] = str(self.error) if self.error else None
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        p = cls(d["symbol"], d["side"], d["total_usd"], d["price"], d["algo"], d["label"])
+        for k, v in d.items():
+            if k != "error":
+                setattr(p, k, v)
+        p.claimed = False
+        return p
+
+
+# =========================
+# PLANIFICADOR
+# =========================
+
+
+class ExecutionScheduler:
+    """
+    exchange:  objeto ccxt (o SimExchange) con amount_to_precision/create_market_order
+    price_fn:  símbolo → último precio (stream); si devuelve None se usa fetch_ticker
+    volume_fn: (símbolo, desde) → USDT negociados desde `desde` (pov); por defecto velas 1m
+    profile_fn: símbolo → perfil de volumen por hora (vwap)
+    """
+
+    def __init__(
+        self,
+        exchange,
+        path=EXEC_STATE_PATH,
+        clock=None,
+        tick=EXEC_TICK,
+        price_fn=None,
+        volume_fn=None,
+        profile_fn=None,
+        max_workers=4,
+        min_op=MIN_OP_USDT,
+    ):
+        self.exchange = exchange
+        self.path = path
+        self.clock = clock or RealClock()
+        self.tick = tick
+        self.price_fn = price_fn
+        self.volume_fn = volume_fn
+        self.profile_fn = profile_fn
+        self.min_op = min_op
+        self.wheel = TimerWheel(tick, start=self.clock.now())
+        self.parents = {}
+        self._events = {}
+        self._finished = deque()
+        self._lock = threading.RLock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers)
+        self._stop = threading.Event()
+        self._thread = None
+        self.on_finish = None  # callback(parent) al terminar una orden padre
+
+    # ---------- alta de órdenes ----------
+
+    def submit(
+        self,
+        symbol,
+        total_usd,
+        price,
+        algo="twap",
+        side="buy",
+        label="",
+        duration=300.0,
+        n_slices=5,
+        rate=0.05,
+        meta=None,
+        claim=True,
+    ):
+        """Crea una orden padre y programa sus tramos. Devuelve el ParentOrder."""
+        algo = algo if algo in ALGOS else "twap"
+        p = ParentOrder(symbol, side, total_usd, price, algo, label, meta)
+        p.claimed = claim
+        now = self.clock.now()
+        if algo == "vwap":
+            profile = self.profile_fn(symbol) if self.profile_fn else None
+            plan = vwap_schedule(total_usd, now, duration, n_slices, profile or [1.0])
+        elif algo == "pov":
+            p.rate = rate
+            plan = pov_schedule(now, duration, max(self.tick, duration / max(1, n_slices)))
+            p.vol_mark = now
+        else:
+            plan = twap_schedule(total_usd, now, duration, n_slices)
+        p.slices = [
+            {"due": due, "usd": usd, "status": "pending", "filled_usd": 0.0, "qty": 0.0}
+            for due, usd in plan
+        ]
+        with self._lock:
+            self.parents[p.id] = p
+            self._events[p.id] = threading.Event()
+            for i, s in enumerate(p.slices):
+                self.wheel.add(s["due"], (p.id, i))
+            self.save()
+        return p
+
+    def cancel(self, parent_id):
+        with self._lock:
+            p = self.parents.get(parent_id)
+            if p is None or p.state != "active":
+                return False
+            for s in p.slices:
+                if s["status"] == "pending":
+                    s["status"] = "cancelled"
+            self._finish(p, "cancelled")
+            self.save()
+        return True
+
+    # ---------- consulta ----------
+
+    def progress(self, parent_id=None):
+        with self._lock:
+            if parent_id is not None:
+                p = self.parents.get(parent_id)
+                return p.progress() if p else None
+            return [p.progress() for p in self.parents.values() if p.state == "active"]
+
+    def busy(self, symbol):
+        """Activa, o terminada y aún sin recoger (wait/drain_finished la saca de `parents`)."""
+        with self._lock:
+            return any(p.symbol == symbol for p in self.parents.values())
+
+    def wait(self, parent_id, timeout=None):
+        """Bloquea hasta que la orden termina. Devuelve el USDT ejecutado."""
+        ev = self._events.get(parent_id)
+        if ev is not None and not ev.wait(timeout):
+            p = self.parents.get(parent_id)
+            return p.filled_usd if p else 0.0
+        with self._lock:  # terminada y recogida: fuera del planificador
+            self._events.pop(parent_id, None)
+            p = self.parents.pop(parent_id, None)
+        return p.filled_usd if p else 0.0
+
+    def drain_finished(self):
+        """Órdenes terminadas que nadie esperaba (reanudadas tras reinicio)."""
+        out = []
+        with self._lock:
+            while self._finished:
+                p = self._finished.popleft()
+                self.parents.pop(p.id, None)
+                self._events.pop(p.id, None)
+                out.append(p)
+        return out
+
+    # ---------- motor ----------
+
+    def _price(self, p):
+        try:
+            live = self.price_fn(p.symbol) if self.price_fn else None
+            if live:
+                return float(live)
+            return float(self.exchange.fetch_ticker(p.symbol).get("last") or p.price)
+        except Exception:
+            return p.price
+
+    def _traded(self, symbol, since, now):
+        """
+        USDT negociados en [since, now) → (volumen, nueva marca). Con velas de 1m
+        solo cuentan las cerradas (la primera, en proporción a lo que cae después
+        de `since`); la vela en curso entra en la siguiente revisión.
+        Sin datos → None y la marca no se mueve.
+        """
+        try:
+            if self.volume_fn:
+                return float(self.volume_fn(symbol, since)), now
+            start_ms = int(since // 60) * 60_000
+            bars = self.exchange.fetch_ohlcv(symbol, "1m", since=start_ms)
+        except Exception:
+            return None, since
+        usd, mark = 0.0, since
+        for row in bars or []:
+            start, end = row[0] / 1000, row[0] / 1000 + 60
+            if end <= since or end > now:
+                continue
+            share = (end - max(start, since)) / 60
+            usd += share * (row[5] or 0.0) * (row[4] or 0.0)
+            mark = max(mark, end)
+        return usd, mark
+
+    def _slice_usd(self, p, idx, traded=None):
+        """
+        Importe a enviar en este tramo (incluye lo arrastrado de tramos pequeños).
+        traded: USDT negociados desde la última revisión (pov; se piden sin el lock).
+        """
+        s = p.slices[idx]
+        last = idx == len(p.slices) - 1
+        if p.algo == "pov":
+            usd = p.rate * (traded or 0.0)
+            # En la última revisión se completa el resto (la orden debe terminar)
+            usd = p.remaining_usd if last else min(usd, p.remaining_usd)
+        else:
+            usd = s["usd"] + p.carry
+        usd = min(usd, p.remaining_usd)
+        if usd < self.min_op:
+            p.carry = usd if p.algo != "pov" else 0.0
+            return 0.0
+        p.carry = 0.0
+        return usd
+
+    def _execute_child(self, p, idx, usd):
+        try:
+            with metrics.span("exec.child", p.algo):
+                price = self._price(p)
+                qty = self.exchange.amount_to_precision(p.symbol, usd / price)
+                order = self.exchange.create_market_order(p.symbol, p.side, qty) or {}
+            filled_qty = float(order.get("filled") or qty)
+            cost = float(order.get("cost") or filled_qty * price)
+            avg = float(order.get("average") or price)
+            return idx, cost, filled_qty, avg, None
+        except Exception as e:
+            return idx, 0.0, 0.0, 0.0, e
+
+    def _finish(self, p, state):
+        p.state = state
+        ev = self._events.get(p.id)
+        if ev is not None:
+            ev.set()
+        if not p.claimed:
+            self._finished.append(p)
+        if self.on_finish is not None:
+            try:
+                self.on_finish(p)
+            except Exception:
+                pass
+        print(
+            f"  ↳ {(p.algo.upper() + ' ' + p.label).strip()} {p.symbol}: "
+            f"${p.filled_usd:.2f} ejecutados de ${p.total_usd:.2f} ({state})"
+        )
+
+    def step(self, now=None):
+        """Dispara los tramos vencidos (en paralelo entre órdenes). Devuelve cuántos."""
+        now = self.clock.now() if now is None else now
+        with self._lock:
+            due = self.wheel.advance(now)
+            pov = {self.parents[pid] for pid, _ in due if pid in self.parents}
+            pov = {(p.id, p.symbol, p.vol_mark or now) for p in pov if p.algo == "pov"}
+        if not due:
+            return 0
+
+        # Red fuera del lock: busy()/progress()/wait() no esperan a ningún REST
+        traded = {pid: self._traded(sym, mark, now) for pid, sym, mark in pov}
+        with self._lock:
+            jobs = []
+            for pid, idx in due:
+                p = self.parents.get(pid)
+                if p is None or p.state != "active" or p.slices[idx]["status"] != "pending":
+                    continue
+                vol = None
+                if pid in traded:  # una sola lectura por orden y paso
+                    vol, p.vol_mark = traded.pop(pid)
+                usd = self._slice_usd(p, idx, vol)
+                if usd <= 0:
+                    p.slices[idx]["status"] = "skipped"
+                else:
+                    p.slices[idx]["status"] = "sending"  # ni se cancela ni se reenvía
+                    jobs.append((p, idx, usd))
+
+        futures = [(p, self._pool.submit(self._execute_child, p, idx, usd)) for p, idx, usd in jobs]
+        results = [(p, fut.result()) for p, fut in futures]
+        with self._lock:
+            for p, (idx, cost, qty, avg, err) in results:
+                s = p.slices[idx]
+                if err is not None:
+                    s["status"] = "error"
+                    p.error = err
+                    print(f"  ↳ Tramo {idx+1}/{len(p.slices)} {p.symbol}: ⚠️ Error — {err}")
+                    continue
+                s.update(status="done", filled_usd=cost, qty=qty, price=avg)
+                p.filled_usd += cost
+                p.filled_qty += qty
+                print(f"  ↳ Tramo {idx+1}/{len(p.slices)}: ${cost:.2f} @ ${avg:.4f} ✅")
+            touched = {pid for pid, _ in due}
+            for pid in touched:
+                p = self.parents.get(pid)
+                if p is None or p.state != "active":
+                    continue
+                if p.remaining_usd < 0.01:  # completada antes de tiempo (pov/redondeos)
+                    for s in p.slices:
+                        if s["status"] == "pending":
+                            s["status"] = "skipped"
+                if all(s["status"] != "pending" for s in p.slices):
+                    self._finish(p, "done" if p.filled_usd > 0 else "failed")
+            self.save()
+        return len(jobs)
+
+    def run_until(self, t):
+        """Solo con VirtualClock: avanza tick a tick hasta `t` disparando tramos."""
+        while self.clock.now() < t:
+            self.clock.advance(self.tick)
+            self.step()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                print(f"⚠️ Error en planificador de ejecución: {e}")
+            self.clock.sleep(self.tick)
+
+    def start(self):
+        self.load()
+        self._thread = threading.Thread(target=self._run, name="lula-exec", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    # ---------- persistencia ----------
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            active = [p.to_dict() for p in self.parents.values() if p.state == "active"]
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump({"parents": active}, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"⚠️ Error guardando órdenes en curso: {e}")
+
+    def load(self):
+        """Reanuda las órdenes en curso. Los tramos vencidos se desplazan a ahora."""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Error leyendo órdenes en curso: {e}")
+            return 0
+        now = self.clock.now()
+        n = 0
+        with self._lock:
+            for d in data.get("parents", []):
+                p = ParentOrder.from_dict(d)
+                pending = [i for i, s in enumerate(p.slices) if s["status"] == "pending"]
+                if not pending:
+                    continue
+                shift = max(0.0, now - p.slices[pending[0]]["due"])
+                if p.algo == "pov":
+                    p.vol_mark = now  # el volumen del apagón no cuenta
+                self.parents[p.id] = p
+                self._events[p.id] = threading.Event()
+                for i in pending:
+                    p.slices[i]["due"] += shift  # se respeta el espaciado original
+                    self.wheel.add(p.slices[i]["due"], (p.id, i))
+                n += 1
+        if n:
+            print(f"♻️ Reanudadas {n} órdenes en curso")
+        return n
+
+
+# =========================
+# EXCHANGE SIMULADO
+# =========================
+
+
+class SimExchange:
+    """
+    Sustituto determinista del exchange para el planificador: precios fijos o
+    por función del tiempo, volumen por segundo configurable y registro de fills.
+    """
+
+    def __init__(self, clock, prices, volume_per_sec=1000.0, precision=6, fail_at=()):
+        self.clock = clock
+        self.prices = dict(prices)
+        self.volume_per_sec = volume_per_sec
+        self.precision = precision
+        self.fail_at = set(fail_at)  # nº de orden (1..N) que debe fallar
+        self.fills = []
+        self._n = 0
+
+    def _price(self, symbol):
+        p = self.prices[symbol]
+        return p(self.clock.now()) if callable(p) else p
+
+    def _rate(self, symbol, t=None):
+        v = self.volume_per_sec
+        return v(symbol, self.clock.now() if t is None else t) if callable(v) else v
+
+    def amount_to_precision(self, symbol, amount):
+        q = 10**self.precision
+        return f"{math.floor(float(amount) * q) / q:.{self.precision}f}"
+
+    def create_market_order(self, symbol, side, amount):
+        self._n += 1
+        if self._n in self.fail_at:
+            raise Exception("simulated reject")
+        qty = float(amount)
+        price = self._price(symbol)
+        fill = {
+            "id": str(self._n),
+            "timestamp": int(self.clock.now() * 1000),
+            "symbol": symbol,
+            "side": side,
+            "filled": qty,
+            "average": price,
+            "cost": qty * price,
+        }
+        self.fills.append(fill)
+        return fill
+
+    def fetch_ticker(self, symbol):
+        return {"symbol": symbol, "last": self._price(symbol)}
+
+    def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=500):
+        """Velas de 1m cerradas desde `since` (ms) con el volumen por segundo configurado."""
+        now = self.clock.now()
+        t = math.ceil((since if since is not None else (now - 3600) * 1000) / 60_000) * 60
+        bars = []
+        while t + 60 <= now and len(bars) < limit:
+            price = self._price(symbol)
+            vol = self._rate(symbol, t) * 60 / price  # volumen base, como ccxt
+            bars.append([int(t * 1000), price, price, price, price, vol])
+            t += 60
+        return bars
+
+
+if __name__ == "__main__":
+    # Demo determinista: 3 órdenes a la vez, 10 minutos simulados en milisegundos
+    clock = VirtualClock(start=1_700_000_000.0)
+    ex = SimExchange(clock, {"SOL/USDT": 150.0, "ADA/USDT": 0.5, "XRP/USDT": 0.6})
+    sched = ExecutionScheduler(ex, path=None, clock=clock, min_op=5.0)
+    sched.profile_fn = lambda s: [1.0 + (h % 6) for h in range(24)]
+
+    a = sched.submit("SOL/USDT", 600, 150.0, algo="twap", duration=300, n_slices=5)
+    b = sched.submit("ADA/USDT", 400, 0.5, algo="vwap", duration=7200, n_slices=8)
+    c = sched.submit("XRP/USDT", 200, 0.6, algo="pov", duration=600, n_slices=10, rate=0.001)
+
+    t0 = time.perf_counter()
+    sched.run_until(clock.now() + 7300)
+    dt = time.perf_counter() - t0
+    for p in (a, b, c):
+        print(sched.progress(p.id))
+    print(f"🧪 {len(ex.fills)} fills simulados en {dt*1000:.1f} ms")
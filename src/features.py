@@ -0,0 +1,241 @@
+"""
+LULA FEATURES v1.0 — KERNEL VECTORIZADO DE FEATURES (NumPy)
+Una única implementación de las 6 features para entrenamiento (grow/trainer) e
+inferencia en vivo (brain). Trabaja sobre un tensor (símbolos, velas, ohlcv) y
+calcula todos los símbolos a la vez, replicando la semántica de pandas_ta:
+    rsi/atr → RMA (ewm alpha=1/n, adjust=True, min_periods=n)
+    ema200  → semilla SMA(200) + ewm(span=200, adjust=False)
+"""
+
+import sys
+
+import numpy as np
+
+FEATURES = ["returns", "rsi", "volatility", "rvol", "corr_spx", "dist_ema"]
+OHLCV = ["open", "high", "low", "close", "volume"]
+
+RSI_LEN = 14
+ATR_LEN = 14
+EMA_LEN = 200
+RVOL_LEN = 20
+CORR_LEN = 24
+HOUR_MS = 3_600_000
+SPX_BAR_MS = HOUR_MS  # velas horarias del S&P (ts = apertura)
+
+
+# =========================
+# PRIMITIVAS (eje 0 = símbolo, eje 1 = tiempo)
+# =========================
+
+
+def ewm_adjusted(x, alpha, min_periods):
+    """
+    Equivalente a pandas `ewm(alpha, adjust=True, min_periods).mean()` por filas.
+    Los NaN no aportan observación pero sí decaen el peso de las anteriores.
+    """
+    S, B = x.shape
+    out = np.full((S, B), np.nan)
+    num = np.zeros(S)
+    den = np.zeros(S)
+    count = np.zeros(S)
+    decay = 1.0 - alpha
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for t in range(B):
+            xt = x[:, t]
+            valid = ~np.isnan(xt)
+            num = decay * num + np.where(valid, xt, 0.0)
+            den = decay * den + valid
+            count += valid
+            out[:, t] = np.where(count >= min_periods, num / den, np.nan)
+    return out
+
+
+def ema_sma_seeded(close, length=EMA_LEN):
+    """pandas_ta.ema por defecto: NaN hasta length-1, semilla SMA y recursión adjust=False."""
+    S, B = close.shape
+    out = np.full((S, B), np.nan)
+    if B < length:
+        return out  # pandas_ta devuelve None si no hay suficientes velas
+    alpha = 2.0 / (length + 1)
+    ema = close[:, :length].mean(axis=1)
+    out[:, length - 1] = ema
+    for t in range(length, B):
+        ema = alpha * close[:, t] + (1 - alpha) * ema
+        out[:, t] = ema
+    return out
+
+
+def rolling_mean(x, length):
+    """pandas `rolling(length).mean()` (NaN hasta completar ventana)."""
+    S, B = x.shape
+    out = np.full((S, B), np.nan)
+    if B < length:
+        return out
+    win = np.lib.stride_tricks.sliding_window_view(x, length, axis=1)
+    out[:, length - 1 :] = win.mean(axis=2)
+    return out
+
+
+def rolling_corr(x, y, length=CORR_LEN):
+    """pandas `x.rolling(length).corr(y)` por filas; NaN si la varianza es nula."""
+    S, B = x.shape
+    out = np.full((S, B), np.nan)
+    if B < length:
+        return out
+    wx = np.lib.stride_tricks.sliding_window_view(x, length, axis=1)
+    wy = np.lib.stride_tricks.sliding_window_view(y, length, axis=1)
+    dx = wx - wx.mean(axis=2, keepdims=True)
+    dy = wy - wy.mean(axis=2, keepdims=True)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        den = np.sqrt((dx * dx).sum(axis=2) * (dy * dy).sum(axis=2))
+        corr = np.where(den > 0, (dx * dy).sum(axis=2) / den, np.nan)
+    out[:, length - 1 :] = corr
+    return out
+
+
+# =========================
+# S&P 500 ALINEADO A LAS VELAS
+# =========================
+
+
+def series_to_bars(series):
+    """pd.Series con DatetimeIndex (con zona → UTC; sin zona = UTC) → [[ts_ms, close], ...]."""
+    idx = series.index
+    if getattr(idx, "tz", None) is not None:
+        idx = idx.tz_convert("UTC").tz_localize(None)
+    ts = np.asarray(idx.values).astype("datetime64[ms]").astype(np.int64)
+    return [[int(t), float(c)] for t, c in zip(ts, np.asarray(series.values, dtype=np.float64))]
+
+
+def closed_spx(spx_bars, now_ms):
+    """Quita las velas del S&P aún en curso (la de apertura t cierra en t + SPX_BAR_MS)."""
+    return [b for b in spx_bars if b[0] + SPX_BAR_MS <= now_ms]
+
+
+def align_spx(ts_ms, spx_bars, tf_ms=HOUR_MS):
+    """
+    S&P 500 a la línea temporal de las velas sin lookahead: cada vela (apertura t,
+    cierre t + tf_ms) recibe el cierre de la última vela del S&P ya cerrada a esa
+    hora. Las velas del S&P se indexan por su cierre (apertura + SPX_BAR_MS): la de
+    las 13:30 UTC entra en la vela cripto que cierra a las 15:00, no en la de las
+    13:00. ts_ms: (B,) aperturas de vela. Devuelve (B,) o None sin datos.
+    """
+    if not spx_bars:
+        return None
+    spx = np.asarray(spx_bars, dtype=np.float64)
+    spx = spx[~np.isnan(spx[:, 1])]
+    if not len(spx):
+        return None
+    keys = spx[:, 0].astype(np.int64) + SPX_BAR_MS
+    order = np.argsort(keys, kind="stable")  # con claves repetidas gana la última
+    keys, closes = keys[order], spx[order, 1]
+    closes_at = np.asarray(ts_ms, dtype=np.int64) + tf_ms
+    pos = np.searchsorted(keys, closes_at, side="right") - 1
+    return closes[np.maximum(pos, 0)]  # antes del primer cierre: bfill (inicio del histórico)
+
+
+# =========================
+# KERNEL PRINCIPAL
+# =========================
+
+
+def compute_indicators(ohlcv, spx=None):
+    """
+    ohlcv: (S, B, 5) [open, high, low, close, volume]
+    spx:   None, (B,) o (S, B) con el S&P 500 ya alineado a cada vela
+    Devuelve dict nombre → (S, B) con las FEATURES más "atr" y "ema200".
+    """
+    ohlcv = np.asarray(ohlcv, dtype=np.float64)
+    if ohlcv.ndim == 2:
+        ohlcv = ohlcv[None]
+    high, low, close, volume = ohlcv[..., 1], ohlcv[..., 2], ohlcv[..., 3], ohlcv[..., 4]
+    S, B = close.shape
+
+    prev_close = np.full((S, B), np.nan)
+    prev_close[:, 1:] = close[:, :-1]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # returns
+        returns = np.log(close / prev_close)
+
+        # RSI (RMA de subidas y bajadas)
+        diff = close - prev_close
+        gain = np.where(diff > 0, diff, np.where(np.isnan(diff), np.nan, 0.0))
+        loss = np.where(diff < 0, -diff, np.where(np.isnan(diff), np.nan, 0.0))
+        avg_gain = ewm_adjusted(gain, 1.0 / RSI_LEN, RSI_LEN)
+        avg_loss = ewm_adjusted(loss, 1.0 / RSI_LEN, RSI_LEN)
+        rsi = avg_gain / (avg_gain + avg_loss)
+
+        # ATR (True Range + RMA). non_zero_range suma epsilon si algún high == low
+        hl = high - low
+        hl = hl + np.where((hl == 0).any(axis=1, keepdims=True), sys.float_info.epsilon, 0.0)
+        tr = np.fmax(np.fmax(np.abs(hl), np.abs(high - prev_close)), np.abs(prev_close - low))
+        tr[:, 0] = np.nan
+        atr = ewm_adjusted(tr, 1.0 / ATR_LEN, ATR_LEN)
+        volatility = np.nan_to_num(atr / close, nan=0.0, posinf=np.inf, neginf=-np.inf)
+
+        # Volumen relativo
+        rvol = volume / rolling_mean(volume, RVOL_LEN)
+        rvol = np.where(np.isnan(rvol), 1.0, rvol)
+
+        # Distancia a EMA200
+        ema200 = ema_sma_seeded(close, EMA_LEN)
+        dist_ema = (close - ema200) / ema200
+        dist_ema = np.where(np.isnan(dist_ema), 0.0, dist_ema)
+
+    # Correlación con el S&P 500
+    if spx is not None:
+        spx = np.broadcast_to(np.asarray(spx, dtype=np.float64), (S, B))
+        corr_spx = np.nan_to_num(rolling_corr(close, spx, CORR_LEN), nan=0.0)
+    else:
+        corr_spx = np.zeros((S, B))
+
+    return {
+        "returns": returns,
+        "rsi": rsi,
+        "volatility": volatility,
+        "rvol": rvol,
+        "corr_spx": corr_spx,
+        "dist_ema": dist_ema,
+        "atr": atr,
+        "ema200": ema200,
+    }
+
+
+def stack_features(indicators):
+    """dict de compute_indicators → tensor (S, B, 6) en el orden de FEATURES."""
+    return np.stack([indicators[f] for f in FEATURES], axis=-1)
+
+
+def compute_features(ohlcv, spx=None):
+    """Atajo: (S, B, 5) → (S, B, 6)."""
+    return stack_features(compute_indicators(ohlcv, spx))
+
+
+def bars_to_ohlcv(bars):
+    """Velas ccxt [[ts, o, h, l, c, v], ...] → (B, 5)."""
+    return np.asarray(bars, dtype=np.float64)[:, 1:6]
+
+
+def compute_features_batch(bars_by_symbol, spx_by_symbol=None):
+    """
+    Velas ccxt de varios símbolos → {símbolo: (B, 6)}.
+    Los símbolos se agrupan por nº de velas para hacer una pasada por grupo sin
+    recortar historia (la semilla de la EMA200 depende de la ventana completa).
+    """
+    groups = {}
+    for sym, bars in bars_by_symbol.items():
+        if bars:
+            groups.setdefault(len(bars), []).append(sym)
+
+    out = {}
+    for _, syms in groups.items():
+        tensor = np.stack([bars_to_ohlcv(bars_by_symbol[s]) for s in syms])
+        spx = None
+        if spx_by_symbol is not None:
+            spx = np.stack([spx_by_symbol.get(s, np.full(tensor.shape[1], np.nan)) for s in syms])
+        ind = compute_indicators(tensor, spx)
+        feats = stack_features(ind)
+        for i, s in enumerate(syms):
+            out[s] = {"features": feats[i], "close": tensor[i, :, 3], "rsi": ind["rsi"][i]}
+    return out
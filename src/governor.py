@@ -0,0 +1,443 @@
+"""
+LULA GOVERNOR v1.0 — GOBERNADOR DE PETICIONES (PESO BINANCE + CARRILES)
+Sustituye el `enableRateLimit` de ccxt (una cola FIFO por instancia) por un
+presupuesto del peso por minuto de Binance, leído de `x-mbx-used-weight-1m`.
+
+Cada petición entra por un carril con prioridad y techo de peso propio:
+    order      → crear/cancelar órdenes. Siempre pasa primero, 100 % del presupuesto
+    account    → saldos, historial de órdenes (90 %)
+    data       → velas, libros, tickers (75 %)
+    background → revisiones y valoraciones no urgentes (50 %). Bajo presión se
+                 descartan (RequestShed) en lugar de esperar
+Las lecturas GET idénticas en vuelo se fusionan: una sola petición, mismo resultado.
+
+    gov = RequestGovernor().attach(exchange)   # envuelve exchange.request
+    with lane("background"): exchange.fetch_orders(...)
+
+El gemelo asíncrono (transport.py) se engancha con `attach_async`: mismo
+presupuesto, carriles, descarte y fusión; el carril viaja en un ContextVar.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+WEIGHT_LIMIT = int(os.getenv("BINANCE_WEIGHT_LIMIT", 6000))
+MIN_INTERVAL_SEC = float(os.getenv("GOVERNOR_MIN_INTERVAL", 0.05))
+BACKGROUND_MAX_WAIT = float(os.getenv("GOVERNOR_BG_WAIT", 2.0))  # luego se descarta
+WEIGHT_HEADER = "x-mbx-used-weight-1m"
+
+LANES = ("order", "account", "data", "background")
+PRIORITY = {lane: i for i, lane in enumerate(LANES)}
+LANE_CAPS = {"order": 1.0, "account": 0.9, "data": 0.75, "background": 0.5}
+
+# Peso de los endpoints de spot que usa el bot (el resto cuenta 1)
+ENDPOINT_WEIGHT = {
+    "klines": 2,
+    "depth": 5,
+    "ticker/24hr": 2,
+    "ticker/price": 2,
+    "ticker/bookTicker": 2,
+    "account": 20,
+    "allOrders": 20,
+    "myTrades": 20,
+    "openOrders": 6,
+    "exchangeInfo": 20,
+    "order": 1,
+}
+NO_SYMBOL_WEIGHT = {"ticker/24hr": 80, "ticker/price": 4, "openOrders": 80}
+
+
+class RequestShed(Exception):
+    """Petición de fondo descartada por falta de presupuesto."""
+
+
+# =========================
+# CARRIL POR HILO
+# =========================
+
+_local = threading.local()
+# En el bucle asyncio no hay hilo del llamante: el transporte fija el carril por tarea
+LANE_CTX = contextvars.ContextVar("lula_lane", default=None)
+
+
+@contextmanager
+def lane(name):
+    """Fuerza el carril de las peticiones hechas dentro del bloque (en este hilo)."""
+    prev = getattr(_local, "lane", None)
+    _local.lane = name
+    try:
+        yield
+    finally:
+        _local.lane = prev
+
+
+def current_lane():
+    return getattr(_local, "lane", None) or LANE_CTX.get()
+
+
+def classify(path, api="public", method="GET"):
+    """Carril por defecto según el endpoint."""
+    api = str(api).lower()
+    if method.upper() in ("POST", "DELETE", "PUT") and "order" in path.lower():
+        return "order"
+    if "private" in api or "sapi" in api:
+        return "account"
+    return "data"
+
+
+def request_weight(path, params=None):
+    params = params or {}
+    if "symbol" not in params and "symbols" not in params and path in NO_SYMBOL_WEIGHT:
+        return NO_SYMBOL_WEIGHT[path]
+    if path == "depth":
+        limit = int(params.get("limit", 100))
+        return 5 if limit <= 100 else 25 if limit <= 500 else 50
+    return ENDPOINT_WEIGHT.get(path, 1)
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# =========================
+# GOBERNADOR
+# =========================
+
+
+class RequestGovernor:
+    def __init__(self, limit=WEIGHT_LIMIT, min_interval=MIN_INTERVAL_SEC, clock=time.time):
+        self.limit = limit
+        self.min_interval = min_interval
+        self.clock = clock
+        self._cv = threading.Condition()
+        self._waiting = []  # heap (prioridad, seq, carril, coste)
+        self._seq = itertools.count()
+        self._inflight = {}  # clave GET → _Flight
+        self.window = None  # minuto actual (epoch // 60)
+        self.used = 0
+        self.cooldown_until = 0.0
+        self._last_grant = 0.0
+        self.stats = {
+            ln: {"calls": 0, "waited_s": 0.0, "shed": 0, "coalesced": 0} for ln in LANES
+        }
+
+    # ---------- presupuesto ----------
+
+    def _roll(self, now):
+        minute = int(now // 60)
+        if minute != self.window:
+            self.window, self.used = minute, 0
+
+    def _fits(self, lane_name, cost, now):
+        if now < self.cooldown_until:
+            return False
+        return self.used + cost <= LANE_CAPS[lane_name] * self.limit
+
+    def pressure(self):
+        """Fracción del presupuesto del minuto ya consumida (1.0 = agotado)."""
+        with self._cv:
+            self._roll(self.clock())
+            if self.clock() < self.cooldown_until:
+                return 1.0
+            return self.used / self.limit if self.limit else 0.0
+
+    def shedding(self, lane_name="background"):
+        """True si ahora mismo un carril descartaría sus peticiones."""
+        return self.pressure() >= LANE_CAPS[lane_name]
+
+    def acquire(self, lane_name, cost=1):
+        """Bloquea hasta que el carril tenga turno y presupuesto. background no espera."""
+        t0 = self.clock()
+        with self._cv:
+            self._roll(t0)
+            if lane_name == "background" and not self._fits(lane_name, cost, t0):
+                self.stats[lane_name]["shed"] += 1
+                raise RequestShed(f"presupuesto {self.used}/{self.limit} (carril {lane_name})")
+            ticket = (PRIORITY[lane_name], next(self._seq), lane_name, cost)
+            heapq.heappush(self._waiting, ticket)
+            while True:
+                now = self.clock()
+                self._roll(now)
+                # Turno: el primero (por prioridad) cuyo carril tiene presupuesto
+                turno = next(
+                    (t for t in sorted(self._waiting) if self._fits(t[2], t[3], now)), None
+                )
+                espera = self._last_grant + self.min_interval - now
+                if turno is ticket and espera <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self.used += cost
+                    self._last_grant = now
+                    self._cv.notify_all()
+                    break
+                if lane_name == "background" and now - t0 > BACKGROUND_MAX_WAIT:
+                    # Lo urgente no deja hueco: la petición de fondo se descarta
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self.stats[lane_name]["shed"] += 1
+                    raise RequestShed(f"sin turno en {BACKGROUND_MAX_WAIT:.0f}s ({lane_name})")
+                if turno is None:
+                    # Nadie cabe: hasta el próximo minuto o el fin del enfriamiento
+                    espera = max(self.cooldown_until, (self.window + 1) * 60) - now
+                self._cv.wait(min(max(espera, 0.005), 0.5))
+            waited = now - t0
+            self.stats[lane_name]["calls"] += 1
+            self.stats[lane_name]["waited_s"] += waited
+        metrics.REGISTRY.observe(("governor.wait", lane_name), waited)
+        return waited
+
+    def observe_headers(self, headers):
+        """Sincroniza el peso usado con el que declara el servidor."""
+        if not headers:
+            return
+        value = None
+        for k, v in headers.items():
+            if k.lower() == WEIGHT_HEADER:
+                value = v
+                break
+        if value is None:
+            return
+        with self._cv:
+            self._roll(self.clock())
+            self.used = max(self.used, int(value))
+
+    def penalize(self, headers=None, banned=False):
+        """429/418: nadie sale hasta Retry-After (o el próximo minuto)."""
+        retry = None
+        for k, v in (headers or {}).items():
+            if k.lower() == "retry-after":
+                try:
+                    retry = float(v)
+                except (TypeError, ValueError):
+                    pass
+        now = self.clock()
+        with self._cv:
+            until = now + retry if retry else (int(now // 60) + 1) * 60
+            if banned:
+                until = max(until, now + 120)
+            self.cooldown_until = max(self.cooldown_until, until)
+            self._cv.notify_all()
+        print(f"⛔ Límite de peso alcanzado: pausa de {self.cooldown_until - now:.0f}s")
+
+    # ---------- enganche a ccxt ----------
+
+    def _flight_key(self, path, api, method, params, lane_name):
+        """Clave de fusión: solo lecturas GET de datos o de fondo."""
+        if method.upper() == "GET" and lane_name in ("data", "background"):
+            return (path, str(api), repr(sorted(params.items())))
+        return None
+
+    def _on_error(self, exchange, e):
+        name = type(e).__name__
+        if name in ("RateLimitExceeded", "DDoSProtection"):
+            headers = getattr(exchange, "last_response_headers", None)
+            self.penalize(headers, banned=name == "DDoSProtection")
+
+    def attach(self, exchange):
+        """Envuelve exchange.request y desactiva el limitador propio de ccxt."""
+        if getattr(exchange.request, "__governed__", False):
+            return self
+        original = exchange.request
+        exchange.enableRateLimit = False
+        gov = self
+
+        def request(path, api="public", method="GET", params=None, *args, **kwargs):
+            params = params if params is not None else {}
+            lane_name = current_lane() or classify(path, api, method)
+            key = gov._flight_key(path, api, method, params, lane_name)
+            if key is not None:
+                with gov._cv:
+                    flight = gov._inflight.get(key)
+                    if flight is None:
+                        gov._inflight[key] = _Flight()
+                    else:
+                        gov.stats[lane_name]["coalesced"] += 1
+                if flight is not None:
+                    flight.done.wait()
+                    if flight.error is not None:
+                        raise flight.error
+                    return flight.result
+
+            result, error = None, None
+            try:
+                gov.acquire(lane_name, request_weight(path, params))
+                result = original(path, api, method, params, *args, **kwargs)
+                return result
+            except RequestShed as e:
+                error = e
+                raise
+            except Exception as e:
+                error = e
+                gov._on_error(exchange, e)
+                raise
+            finally:
+                gov.observe_headers(getattr(exchange, "last_response_headers", None))
+                if key is not None:
+                    with gov._cv:
+                        flight = gov._inflight.pop(key, None)
+                    if flight is not None:
+                        flight.result, flight.error = result, error
+                        flight.done.set()
+
+        request.__governed__ = True
+        exchange.request = request
+        return self
+
+    def attach_async(self, exchange, loop):
+        """
+        Lo mismo para un exchange de ccxt.async_support que vive en `loop`: la
+        espera de turno va a un hilo (no bloquea el bucle) y las lecturas GET
+        idénticas en vuelo comparten un futuro del bucle.
+        """
+        if getattr(exchange.request, "__governed__", False):
+            return self
+        original = exchange.request
+        exchange.enableRateLimit = False
+        gov = self
+        flights = {}  # clave GET → asyncio.Future (solo se toca desde el bucle)
+
+        async def request(path, api="public", method="GET", params=None, *args, **kwargs):
+            params = params if params is not None else {}
+            lane_name = current_lane() or classify(path, api, method)
+            key = gov._flight_key(path, api, method, params, lane_name)
+            if key is not None:
+                flight = flights.get(key)
+                if flight is not None:
+                    with gov._cv:
+                        gov.stats[lane_name]["coalesced"] += 1
+                    return await asyncio.shield(flight)
+                flight = flights[key] = loop.create_future()
+            try:
+                cost = request_weight(path, params)
+                await loop.run_in_executor(None, gov.acquire, lane_name, cost)
+                result = await original(path, api, method, params, *args, **kwargs)
+            except BaseException as e:
+                if isinstance(e, Exception) and not isinstance(e, RequestShed):
+                    gov._on_error(exchange, e)
+                if key is not None and isinstance(e, asyncio.CancelledError):
+                    flight.cancel()
+                elif key is not None:
+                    flight.set_exception(e)
+                    flight.exception()  # recuperada: sin aviso si nadie más esperaba
+                raise
+            finally:
+                gov.observe_headers(getattr(exchange, "last_response_headers", None))
+                if key is not None:
+                    flights.pop(key, None)
+            if key is not None:
+                flight.set_result(result)
+            return result
+
+        request.__governed__ = True
+        exchange.request = request
+        return self
+
+    def status(self):
+        with self._cv:
+            self._roll(self.clock())
+            return {
+                "used": self.used,
+                "limit": self.limit,
+                "waiting": len(self._waiting),
+                "cooldown_s": max(0.0, self.cooldown_until - self.clock()),
+                "lanes": {k: dict(v) for k, v in self.stats.items()},
+            }
+
+
+# =========================
+# EXCHANGE FALSO
+# =========================
+
+
+class RateLimitExceeded(Exception):
+    """Mismo nombre que la excepción de ccxt (el gobernador la reconoce por nombre)."""
+
+
+class FakeBinance:
+    """
+    Exchange local que cuenta el peso por minuto como Binance y lo devuelve en
+    `last_response_headers`. Pasado el límite responde 429 (RateLimitExceeded).
+    """
+
+    def __init__(self, limit=WEIGHT_LIMIT, latency=0.0, clock=time.time):
+        self.limit = limit
+        self.latency = latency
+        self.clock = clock
+        self.enableRateLimit = True
+        self.last_response_headers = {}
+        self.calls = []  # (t, path, method)
+        self._lock = threading.Lock()
+        self._window = None
+        self._used = 0
+
+    def request(self, path, api="public", method="GET", params=None, headers=None, body=None):
+        if self.latency:
+            time.sleep(self.latency)
+        now = self.clock()
+        with self._lock:
+            minute = int(now // 60)
+            if minute != self._window:
+                self._window, self._used = minute, 0
+            self._used += request_weight(path, params)
+            self.last_response_headers = {"X-MBX-USED-WEIGHT-1M": str(self._used)}
+            self.calls.append((now, path, method))
+            if self._used > self.limit:
+                self.last_response_headers["Retry-After"] = str(60 - int(now % 60))
+                raise RateLimitExceeded(f"429 peso {self._used}/{self.limit}")
+        return {"path": path, "params": params}
+
+    # Métodos de alto nivel mínimos, como los implícitos de ccxt
+    def fetch_ohlcv(self, symbol, timeframe="1h", limit=500):
+        return self.request("klines", "public", "GET", {"symbol": symbol, "limit": limit})
+
+    def fetch_order_book(self, symbol, limit=20):
+        return self.request("depth", "public", "GET", {"symbol": symbol, "limit": limit})
+
+    def fetch_orders(self, symbol, limit=5):
+        return self.request("allOrders", "private", "GET", {"symbol": symbol, "limit": limit})
+
+    def create_market_order(self, symbol, side, amount):
+        return self.request("order", "private", "POST", {"symbol": symbol, "side": side})
+
+
+if __name__ == "__main__":
+    # Demo: 8 hilos saturando velas; una venta urgente no hace cola detrás
+    ex = FakeBinance(limit=400, latency=0.02)
+    gov = RequestGovernor(limit=400, min_interval=0.01).attach(ex)
+    stop = threading.Event()
+
+    def flood(i):
+        while not stop.is_set():
+            try:
+                ex.fetch_ohlcv(f"C{i}/USDT")
+            except Exception:
+                pass
+
+    hilos = [threading.Thread(target=flood, args=(i,), daemon=True) for i in range(8)]
+    for h in hilos:
+        h.start()
+    time.sleep(0.5)
+    t0 = time.perf_counter()
+    ex.create_market_order("SOL/USDT", "sell", 1)
+    print(f"🚨 venta servida en {(time.perf_counter() - t0) * 1000:.0f} ms")
+    try:
+        with lane("background"):
+            ex.fetch_orders("SOL/USDT")
+        print("🗂️ revisión de fondo servida")
+    except RequestShed as e:
+        print(f"🗂️ revisión de fondo descartada: {e}")
+    stop.set()
+    print(gov.status())
@@ -6,7 +6,6 @@ Optimizado para CNN-1D y NPU RK3588 (INT8 w8a8)
 import os, sys, time, json, joblib, ccxt
 import numpy as np
 import pandas as pd
-import pandas_ta as ta
 import yfinance as yf
 from datetime import datetime
 from pathlib import Path
@@ -14,6 +13,8 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.utils import class_weight
 
+from features import FEATURES, OHLCV, align_spx, closed_spx, compute_indicators, series_to_bars
+
 # Desactivar avisos de TensorFlow
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 import tensorflow as tf
@@ -40,8 +41,9 @@ SYMBOLS = [
     "XMR/USDT",  # <--- Agregada para la Bóveda de Riqueza
 ]
 TIME_STEPS = 10
-# Features de alta fidelidad sincronizadas con brain.py
-FEATURES = ["returns", "rsi", "volatility", "rvol", "corr_spx", "dist_ema"]
+# Batch de exportación: 1 = clásico, N = batch fijo NPU, 0 = dinámico (solo ONNX)
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", 1))
+# Features de alta fidelidad sincronizadas con brain.py (ver features.py)
 # Ruta absoluta para Docker
 
 # Rutas relativas a la carpeta src (donde vive grow.py)
@@ -81,22 +83,17 @@ def log(msg, col=C.CY):
 # ══════════════════════════════════════════════════════════════
 #  INGENIERÍA DE FEATURES (VOLATILITY ADAPTIVE)
 # ══════════════════════════════════════════════════════════════
-def prepare_dataframe(df, sp500_df=None):
+def prepare_dataframe(df, spx_bars=None):
     df = df.copy()
-    df["returns"] = np.log(df["close"] / df["close"].shift(1))
-    df["rsi"] = df.ta.rsi(length=14) / 100.0
-    atr = df.ta.atr(length=14)
-    df["volatility"] = (atr / df["close"]).fillna(0)
-    df["rvol"] = (df["volume"] / df["volume"].rolling(20).mean()).fillna(1)
-    ema200 = df.ta.ema(length=200)
-    df["dist_ema"] = ((df["close"] - ema200) / ema200).fillna(0)
-
-    # 1. Fallback Macro robusto contra NaNs
-    if sp500_df is not None:
-        df = df.join(sp500_df, how="left").ffill().bfill()
-        df["corr_spx"] = df["close"].rolling(24).corr(df["sp500"]).fillna(0)
-    else:
-        df["corr_spx"] = 0.0
+
+    # 1. Macro: S&P 500 alineado a las velas igual que en vivo (brain.py)
+    spx = align_spx(df["ts"].values, spx_bars)
+
+    # Kernel compartido con brain.py (mismas features en entrenamiento y en vivo)
+    ind = compute_indicators(df[OHLCV].values, spx)
+    for f in FEATURES:
+        df[f] = ind[f][0]
+    atr = pd.Series(ind["atr"][0], index=df.index)
 
     # 2. TARGET MÁS REALISTA: 1.2 * ATR (Antes era 1.5, era muy difícil de alcanzar)
     future_max = df["close"].shift(-4).rolling(window=4).max()
@@ -152,20 +149,16 @@ def run_training():
         if spx_raw.empty:
             raise Exception("Yahoo retornó DataFrame vacío")
 
-        # Seleccionamos 'Close' de forma segura
-        spx = pd.DataFrame(spx_raw["Close"]).rename(columns={"Close": "sp500"})
-        spx.index = spx.index.tz_localize(None).floor("h")
+        # Seleccionamos 'Close' de forma segura (índice en UTC, como las velas);
+        # la última vela horaria sigue abierta y su cierre aún no es definitivo
+        spx = closed_spx(series_to_bars(spx_raw["Close"].dropna()), time.time() * 1000)
         log("Macro S&P 500 cargada con éxito.", C.G)
 
     except Exception as e:
         log(f"⚠️ Error Yahoo Finance: {e}. Usando BTC como Proxy Macro...", C.RE)
         # FALLBACK: Ahora 'ex' ya existe, por lo que no dará UnboundLocalError
         bars_btc = ex.fetch_ohlcv("BTC/USDT", "1h", limit=5000)
-        spx = pd.DataFrame(bars_btc, columns=["ts", "open", "high", "low", "close", "volume"])
-        spx["ts"] = pd.to_datetime(spx["ts"], unit="ms")
-        spx.set_index("ts", inplace=True)
-        spx = spx[["close"]].rename(columns={"close": "sp500"})
-        spx.index = spx.index.floor("h")
+        spx = closed_spx([[b[0], b[4]] for b in bars_btc], time.time() * 1000)
 
     # 2. Descargar Historial Cripto para el resto de símbolos
     all_dfs = []
@@ -242,13 +235,15 @@ def run_training():
     )
 
     # 6. Exportación ONNX con Batch Size Fijo (Solución al error unk__74)
-    log("Exportando Cerebro a ONNX (Batch=1)...", C.G)
+    # EXPORT_BATCH=N fija el batch para inferencia por lotes; 0 lo deja dinámico (solo ONNX)
+    batch_dim = EXPORT_BATCH if EXPORT_BATCH > 0 else None
+    npu_batch = EXPORT_BATCH if EXPORT_BATCH > 0 else 1
+    log(f"Exportando Cerebro a ONNX (Batch={batch_dim or 'dinámico'})...", C.G)
     # Nota: scaler.pkl ya fue guardado arriba (contiene el dict de scalers por símbolo)
 
     import tf2onnx
 
-    # Fijamos el primer parámetro a 1 en lugar de None
-    spec = (tf.TensorSpec((1, TIME_STEPS, len(FEATURES)), tf.float32, name="input"),)
+    spec = (tf.TensorSpec((batch_dim, TIME_STEPS, len(FEATURES)), tf.float32, name="input"),)
     tf2onnx.convert.from_keras(
         model, input_signature=spec, output_path=str(DATA_DIR / "madness.onnx")
     )
@@ -273,11 +268,12 @@ def run_training():
             shutil.rmtree(calib_dir)
         calib_dir.mkdir()
 
-        # Tomamos 32 muestras (suficiente para calibrar INT8)
-        indices = np.random.choice(X_train.shape[0], 32, replace=False)
+        # Tomamos 32 muestras (suficiente para calibrar INT8), cada una con el batch de la NPU
+        indices = np.random.choice(X_train.shape[0], 32 * npu_batch, replace=False)
         with open("dataset.txt", "w") as f:
-            for i, idx in enumerate(indices):
-                sample = X_train[idx].reshape(1, TIME_STEPS, len(FEATURES)).astype(np.float32)
+            for i, idx in enumerate(indices.reshape(32, npu_batch)):
+                sample = X_train[idx].reshape(npu_batch, TIME_STEPS, len(FEATURES))
+                sample = sample.astype(np.float32)
                 sample_path = calib_dir / f"sample_{i}.npy"
                 np.save(sample_path, sample)
                 f.write(f"{sample_path}\n")  # Escribimos la ruta de cada archivo individual
@@ -289,14 +285,14 @@ def run_training():
             rknn.load_onnx(
                 model=str(DATA_DIR / "madness.onnx"),
                 inputs=["input"],
-                input_size_list=[[1, TIME_STEPS, len(FEATURES)]],
+                input_size_list=[[npu_batch, TIME_STEPS, len(FEATURES)]],
             )
             == 0
         ):
 
             if rknn.build(do_quantization=True, dataset="dataset.txt") == 0:
                 rknn.export_rknn(str(DATA_DIR / "madness.rknn"))
-                log("🧠 CEREBRO V7 INSTALADO CON ÉXITO EN NPU.", C.G)
+                log(f"🧠 CEREBRO V7 INSTALADO CON ÉXITO EN NPU (MODEL_BATCH={npu_batch}).", C.G)
             else:
                 log("Error en fase Build RKNN.", C.RE)
         else:
@@ -1,10 +1,12 @@
 import pandas as pd
-import requests
-import yfinance as yf
 import time
 import os
 from collections import deque
-import json
+from indicators import FeatureState
+from journal import StateJournal
+from audit import AuditWriter
+from macro import MacroService
+import metrics
 
 
 class Guardian:
@@ -12,9 +14,11 @@ class Guardian:
     def __init__(self):
         self.posiciones = {}  # { "BTC/USDT": {"precio_entrada": 60000, "max_alcanzado": 65000} }
         self.log_path = "/app/data/guardian_audit.json"
-        self._fng_cache = {"value": 50, "ts": 0}
+        self.macro = None  # MacroService (VIX/DXY/F&G en segundo plano)
+        self.ledger = None  # TradeLedger: precio medio de entrada de los fills reales
         self._last_prices = {}
         self._ema200_data = {}  # {symbol: deque(maxlen=200)}
+        self.feature_states = {}  # {symbol: FeatureState} indicadores incrementales de Brain
 
         self.high_water_mark = 0.0  # Punto más alto del saldo
         self.max_drawdown_limit = 0.12  # v7.5: ampliado al 12% (era 10%)
@@ -26,7 +30,54 @@ class Guardian:
 
         self.log_path = "/app/data/guardian_audit.json"
 
+        # Auditoría asíncrona con rotación (el bucle de trading no toca el disco)
+        self.audit = AuditWriter(self.log_path).start()
+
+        # Diario de deltas + foto compactada (guardian_memory.json / .journal)
+        self.journal = StateJournal("/app/data/guardian_memory")
+
+    def _journal(self, op, symbol=None, data=None, critical=False):
+        try:
+            self.journal.append(op, symbol, data, critical=critical)
+        except Exception as e:
+            print(f"⚠️ Error escribiendo diario del Guardian: {e}")
+
+    def _replay(self, rec):
+        """Aplica un delta del diario sobre el estado (recuperación)."""
+        op, sym, data = rec.get("op"), rec.get("sym"), rec.get("data")
+        if op == "entry":
+            self.posiciones[sym] = data
+        elif op == "exit":
+            self.posiciones.pop(sym, None)
+        elif op == "max" and sym in self.posiciones:
+            self.posiciones[sym]["max_alcanzado"] = data
+        elif op == "pos" and sym in self.posiciones:
+            self.posiciones[sym].update(data)
+        elif op == "hwm":
+            self.high_water_mark = data
+
+    def entrada_real(self, symbol, price=None):
+        """Precio medio de entrada según el ledger (fills reales); sin datos, `price`."""
+        if self.ledger is None:
+            return price
+        try:
+            return self.ledger.avg_entry(symbol, price)
+        except Exception as e:
+            print(f"⚠️ Ledger sin entrada para {symbol}: {e}")
+            return price
+
+    def sincronizar_entradas(self, symbols=None):
+        """Alinea precio_entrada de las posiciones abiertas con el ledger (tras fills o sync)."""
+        for symbol in list(symbols or self.posiciones):
+            pos = self.posiciones.get(symbol)
+            if not pos:
+                continue
+            entrada = self.entrada_real(symbol)
+            if entrada and abs(entrada - pos["precio_entrada"]) > pos["precio_entrada"] * 1e-6:
+                self.actualizar_posicion(symbol, precio_entrada=entrada)
+
     def registrar_entrada(self, symbol, price, prob_ia):
+        price = self.entrada_real(symbol, price)
         self.posiciones[symbol] = {
             "precio_entrada": price,
             "max_alcanzado": price,
@@ -35,7 +86,13 @@ class Guardian:
             "breakeven_activo": False,
             "tramo2_pendiente": 0,
         }
-        self.save_state()
+        self._journal("entry", symbol, self.posiciones[symbol], critical=True)
+
+    def actualizar_posicion(self, symbol, **campos):
+        """Cambia campos de una posición abierta (p.ej. tramo2_pendiente) vía diario."""
+        if symbol in self.posiciones:
+            self.posiciones[symbol].update(campos)
+            self._journal("pos", symbol, campos, critical=True)
 
     def evaluar_salida_emergencia(self, symbol, current_price, current_prob):
         pos = self.posiciones.get(symbol)
@@ -52,6 +109,7 @@ class Guardian:
         if current_price > max_alc:
             pos["max_alcanzado"] = current_price
             max_alc = current_price
+            self._journal("max", symbol, current_price)
 
         # --- MEJORA: ESCALERA DE PROTECCIÓN (Smart Trailing) ---
         # En lugar de solo Breakeven, creamos niveles de seguridad:
@@ -86,11 +144,30 @@ class Guardian:
 
         return False, "HOLD"
 
+    def niveles_salida(self, symbol):
+        """
+        Niveles de precio en los que evaluar_salida_emergencia puede cambiar de
+        opinión, para vigilarlos en vivo (events.PriceTrigger) entre ciclos.
+        """
+        pos = self.posiciones.get(symbol)
+        if not pos:
+            return None
+        precio_ent = pos["precio_entrada"]
+        max_alc = pos.get("max_alcanzado", precio_ent)
+        # Stop duro de lullaby.get_status_label (🛑 STOP)
+        stop = precio_ent * (1 - float(os.getenv("STOP_LOSS_PCT", 0.05)))
+        if max_alc >= precio_ent * 1.08:
+            # Moon-shot: el stop sigue al pico con un 4% de retroceso (nunca bajo el duro)
+            return {"below": stop, "trail_pct": 0.04, "high": max_alc, "reason": "TRAILING"}
+        # Los escalones 1.5% / 4% no cortan por precio: vigilamos el stop y la entrada al 8%
+        return {"below": stop, "above": precio_ent * 1.08, "reason": "STOP / ESCALÓN 8%"}
+
     def actualizar_maximo(self, symbol, current_price):
         """Actualiza el punto más alto para gestionar Trailing Stops."""
         if symbol in self.posiciones:
             if current_price > self.posiciones[symbol]["max_alcanzado"]:
                 self.posiciones[symbol]["max_alcanzado"] = current_price
+                self._journal("max", symbol, current_price)
 
     def get_datos_posicion(self, symbol):
         """Devuelve los datos de entrada para calcular SL."""
@@ -100,7 +177,7 @@ class Guardian:
         """Borra el rastro al vender."""
         if symbol in self.posiciones:
             del self.posiciones[symbol]
-            self.save_state()
+            self._journal("exit", symbol, critical=True)
 
     # =========================
     # SISTEMA DE AUDITORÍA
@@ -110,15 +187,14 @@ class Guardian:
         """Registra por qué el Guardian tomó una decisión."""
         try:
             entry = {
-                "ts": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "ts": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time())),
                 "symbol": symbol,
                 "riesgo": score_riesgo,
                 "permitido": ok,
                 "motivo": msg,
                 "macro": {"vix": round(self.vix, 2), "dxy": round(self.dxy, 2), "fng": self.fng},
             }
-            with open(self.log_path, "a") as f:
-                f.write(json.dumps(entry) + "\n")
+            self.audit.write(entry)
         except:
             pass
 
@@ -128,27 +204,16 @@ class Guardian:
 
     def actualizar_indicadores(self):
         """
-        Actualiza VIX y DXY desde Yahoo Finance y F&G desde alternative.me.
-        Cache de 1 hora para F&G.
+        Lee VIX, DXY y F&G del servicio macro (macro.py): lectura sin red.
+        Sin servicio en marcha, se crea uno sin hilo y se refresca aquí lo vencido.
         """
-        try:
-            macro = yf.download(
-                ["^VIX", "DX-Y.NYB"], period="5d", interval="1d", progress=False, threads=False
-            )
-            if not macro.empty:
-                self.vix = float(macro["Close"]["^VIX"].ffill().iloc[-1])
-                self.dxy = float(macro["Close"]["DX-Y.NYB"].ffill().iloc[-1])
-        except:
-            pass
-
-        ahora = time.time()
-        if ahora - self._fng_cache["ts"] > 3600:
-            try:
-                r = requests.get("https://api.alternative.me/fng/", timeout=5).json()
-                self.fng = int(r["data"][0]["value"])
-                self._fng_cache = {"value": self.fng, "ts": ahora}
-            except:
-                pass
+        if self.macro is None:
+            self.macro = MacroService()
+        if not self.macro.running:
+            self.macro.refresh_due()
+        self.vix = float(self.macro.get("vix", self.vix))
+        self.dxy = float(self.macro.get("dxy", self.dxy))
+        self.fng = int(self.macro.get("fng", self.fng))
 
     # =========================
     # EMA200 ACUMULATIVA
@@ -187,6 +252,7 @@ class Guardian:
         """
         if current_balance > self.high_water_mark:
             self.high_water_mark = current_balance
+            self._journal("hwm", data=current_balance)
             return True, 0.0
 
         if self.high_water_mark == 0:
@@ -274,8 +340,7 @@ class Guardian:
                     "fng": self.fng,
                     "prob": round(prob, 4),
                 }
-                with open(self.log_path, "a") as f:
-                    f.write(json.dumps(entry) + "\n")
+                self.audit.write(entry)
             except:
                 pass
 
@@ -285,31 +350,34 @@ class Guardian:
     # PERSISTENCIA DE ESTADO
     # =========================
 
-    def save_state(self):
-        """Guarda la memoria del Guardian en disco incluyendo posiciones."""
-        state = {
+    def _state_dict(self):
+        return {
             "high_water_mark": self.high_water_mark,
             "ema200_data": {s: list(d) for s, d in self._ema200_data.items()},
             "posiciones": self.posiciones,  # Guardamos los precios de entrada
+            "feature_states": {s: st.to_dict() for s, st in self.feature_states.items()},
         }
+
+    def save_state(self, force=False):
+        """
+        Punto de control: los deltas ya están en el diario, aquí solo se hace el
+        fsync agrupado y, cada cierto tiempo o nº de cambios, la foto compactada.
+        Las cachés voluminosas (ema200_data, feature_states) solo viajan en la foto.
+        """
         try:
             os.makedirs("/app/data", exist_ok=True)
-            with open("/app/data/guardian_memory.json", "w") as f:
-                json.dump(state, f)
+            self.journal.checkpoint(self._state_dict, force=force)
         except Exception as e:
             print(f"⚠️ Error guardando Guardian: {e}")
 
     def load_state(self):
-        """Recupera la memoria al arrancar de forma segura."""
-        path = "/app/data/guardian_memory.json"
-
+        """Recupera la memoria al arrancar: foto compactada + reproducción del diario."""
         # 1. Inicializamos con valores vacíos por seguridad
         state = {}
 
-        if os.path.exists(path):
+        if os.path.exists(self.journal.snapshot_path) or os.path.exists(self.journal.journal_path):
             try:
-                with open(path, "r") as f:
-                    state = json.load(f)
+                state, ops = self.journal.recover()
 
                 # Carga de datos antiguos
                 self.high_water_mark = state.get("high_water_mark", 0.0)
@@ -321,8 +389,20 @@ class Guardian:
                 # 2. Recuperar POSICIONES (Precios de entrada para el Stop Loss)
                 self.posiciones = state.get("posiciones", {})
 
+                # 3. Recuperar indicadores incrementales (arranque en caliente de Brain)
+                for s, d in state.get("feature_states", {}).items():
+                    try:
+                        self.feature_states[s] = FeatureState.from_dict(d)
+                    except Exception:
+                        continue
+
+                # 4. Deltas posteriores a la foto
+                for rec in ops:
+                    self._replay(rec)
+
                 print(
                     f"🧠 Memoria recuperada. HWM: ${self.high_water_mark:,.2f} | Posiciones: {len(self.posiciones)}"
+                    f" | Deltas reproducidos: {len(ops)}"
                 )
                 return  # Salimos con éxito
             except Exception as e:
@@ -340,5 +420,10 @@ class Guardian:
             guardian.reset_high_water_mark(current_balance)
         """
         self.high_water_mark = new_balance
-        self.save_state()
+        self._journal("hwm", data=new_balance, critical=True)
         print(f"🔄 High Water Mark reseteado a ${new_balance:,.2f}")
+
+
+metrics.instrument(
+    Guardian, "guardian", ["analizar_riesgo", "actualizar_indicadores", "save_state"]
+)
@@ -0,0 +1,441 @@
+"""
+LULA INDICATORS v1.0 — ESTADO INCREMENTAL DE INDICADORES (O(1) POR VELA)
+RSI (RMA), ATR de Wilder, EMA200, media y correlación móviles que se actualizan
+con cada vela cerrada en lugar de recalcular toda la ventana. La vela abierta se
+evalúa con `peek` sin tocar el estado. Serializable a JSON (guardian_memory).
+
+Misma semántica que features.py / pandas_ta sobre el historial visto desde el
+arranque. Ojo: el cálculo por lotes sobre las últimas 200 velas re-siembra la
+EMA200 en cada ciclo; el estado incremental la siembra una sola vez (como en el
+entrenamiento sobre miles de velas).
+"""
+
+import copy
+import math
+import sys
+from collections import deque
+
+TIME_STEPS = 10
+TIMEFRAME_MS = 3_600_000
+# Versión del estado persistido: el S&P se alinea por el cierre de su vela horaria
+STATE_VERSION = 2
+NAN = float("nan")
+
+
+# =========================
+# PRIMITIVAS
+# =========================
+
+
+class EWMState:
+    """ewm(alpha, adjust=True, min_periods) incremental (RMA de pandas_ta)."""
+
+    def __init__(self, alpha, min_periods):
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.num = 0.0
+        self.den = 0.0
+        self.count = 0
+
+    def _calc(self, x):
+        decay = 1.0 - self.alpha
+        valid = x == x
+        num = decay * self.num + (x if valid else 0.0)
+        den = decay * self.den + (1.0 if valid else 0.0)
+        count = self.count + (1 if valid else 0)
+        value = num / den if count >= self.min_periods and den > 0 else NAN
+        return num, den, count, value
+
+    def peek(self, x):
+        return self._calc(x)[3]
+
+    def update(self, x):
+        self.num, self.den, self.count, value = self._calc(x)
+        return value
+
+    def to_dict(self):
+        return {"num": self.num, "den": self.den, "count": self.count}
+
+    def load(self, d):
+        self.num, self.den, self.count = d["num"], d["den"], d["count"]
+
+
+class EMAState:
+    """pandas_ta.ema: semilla SMA(length) y luego recursión adjust=False."""
+
+    def __init__(self, length=200):
+        self.length = length
+        self.alpha = 2.0 / (length + 1)
+        self.seed = []  # cierres hasta completar la SMA inicial
+        self.ema = None
+
+    def _calc(self, x):
+        if self.ema is not None:
+            return self.alpha * x + (1 - self.alpha) * self.ema
+        if len(self.seed) == self.length - 1:
+            return (sum(self.seed) + x) / self.length
+        return NAN
+
+    def peek(self, x):
+        return self._calc(x)
+
+    def update(self, x):
+        value = self._calc(x)
+        if self.ema is None and value != value:
+            self.seed.append(x)
+        else:
+            self.ema = value
+            self.seed = []
+        return value
+
+    def to_dict(self):
+        return {"seed": list(self.seed), "ema": self.ema}
+
+    def load(self, d):
+        self.seed, self.ema = list(d["seed"]), d["ema"]
+
+
+class RollingMeanState:
+    """rolling(length).mean() con suma corrida (re-sumada cada `length` pasos)."""
+
+    def __init__(self, length=20):
+        self.length = length
+        self.buf = deque(maxlen=length)
+        self.total = 0.0
+        self._steps = 0
+
+    def _calc(self, x):
+        total = self.total + x
+        n = len(self.buf) + 1
+        if len(self.buf) == self.length:
+            total -= self.buf[0]
+            n = self.length
+        return total / n if n == self.length else NAN
+
+    def peek(self, x):
+        return self._calc(x)
+
+    def update(self, x):
+        value = self._calc(x)
+        if len(self.buf) == self.length:
+            self.total -= self.buf[0]
+        self.buf.append(x)
+        self.total += x
+        self._steps += 1
+        if self._steps % self.length == 0:
+            self.total = sum(self.buf)  # anti-deriva numérica
+        return value
+
+    def to_dict(self):
+        return {"buf": list(self.buf)}
+
+    def load(self, d):
+        self.buf = deque(d["buf"], maxlen=self.length)
+        self.total = sum(self.buf)
+
+
+class RollingCorrState:
+    """
+    rolling(length).corr() de dos series con sumas corridas centradas en un
+    ancla (evita la cancelación numérica con precios grandes). Se re-ancla y
+    re-suma cada `length` pasos: coste amortizado O(1).
+    """
+
+    def __init__(self, length=24):
+        self.length = length
+        self.buf = deque(maxlen=length)
+        self._reset_sums()
+
+    def _reset_sums(self):
+        valid = [p for p in self.buf if p[0] == p[0] and p[1] == p[1]]
+        self.kx, self.ky = valid[-1] if valid else (0.0, 0.0)
+        self._anchored = bool(valid)
+        self.sx = self.sy = self.sxx = self.syy = self.sxy = 0.0
+        self.nans = 0
+        for x, y in self.buf:
+            self._add(x, y, 1)
+        self._steps = 0
+
+    def _add(self, x, y, sign):
+        if x != x or y != y:
+            self.nans += sign  # los pares con NaN no suman, solo invalidan la ventana
+            return
+        dx, dy = x - self.kx, y - self.ky
+        self.sx += sign * dx
+        self.sy += sign * dy
+        self.sxx += sign * dx * dx
+        self.syy += sign * dy * dy
+        self.sxy += sign * dx * dy
+
+    def _calc(self, x, y):
+        if x != x or y != y or len(self.buf) < self.length - 1:
+            return NAN
+        if self.nans - (1 if self._evicts_nan() else 0) > 0:
+            return NAN
+        sx, sy, sxx, syy, sxy = self.sx, self.sy, self.sxx, self.syy, self.sxy
+        dx, dy = x - self.kx, y - self.ky
+        sx, sy, sxx, syy, sxy = sx + dx, sy + dy, sxx + dx * dx, syy + dy * dy, sxy + dx * dy
+        if len(self.buf) == self.length and not self._evicts_nan():
+            ox, oy = self.buf[0][0] - self.kx, self.buf[0][1] - self.ky
+            sx, sy, sxx, syy, sxy = sx - ox, sy - oy, sxx - ox * ox, syy - oy * oy, sxy - ox * oy
+        n = self.length
+        vx = sxx - sx * sx / n
+        vy = syy - sy * sy / n
+        if vx <= 0 or vy <= 0:
+            return NAN
+        return (sxy - sx * sy / n) / math.sqrt(vx * vy)
+
+    def _evicts_nan(self):
+        if len(self.buf) < self.length:
+            return False
+        ox, oy = self.buf[0]
+        return ox != ox or oy != oy
+
+    def peek(self, x, y):
+        return self._calc(x, y)
+
+    def update(self, x, y):
+        value = self._calc(x, y)
+        if len(self.buf) == self.length:
+            self._add(*self.buf[0], -1)
+        if not self._anchored and x == x and y == y:
+            # Ancla en el primer par válido: una serie plana da varianza 0 exacta
+            self.kx, self.ky, self._anchored = x, y, True
+        self.buf.append((x, y))
+        self._add(x, y, 1)
+        self._steps += 1
+        if self._steps >= self.length:
+            self._reset_sums()
+        return value
+
+    def to_dict(self):
+        return {"buf": [list(p) for p in self.buf]}
+
+    def load(self, d):
+        self.buf = deque((tuple(p) for p in d["buf"]), maxlen=self.length)
+        self._reset_sums()
+
+
+# =========================
+# ESTADO DE FEATURES POR SÍMBOLO
+# =========================
+
+
+class FeatureState:
+    """
+    Las 6 features de features.py mantenidas vela a vela para un símbolo.
+    `sync(bars)` consume solo las velas cerradas nuevas y evalúa la abierta.
+    """
+
+    def __init__(self, timeframe_ms=TIMEFRAME_MS):
+        self.timeframe_ms = timeframe_ms
+        self.reset()
+
+    def reset(self):
+        self.last_ts = None
+        self.prev_close = None
+        self.count = 0
+        self.gain = EWMState(1.0 / 14, 14)
+        self.loss = EWMState(1.0 / 14, 14)
+        self.atr = EWMState(1.0 / 14, 14)
+        self.ema = EMAState(200)
+        self.vol_mean = RollingMeanState(20)
+        self.corr = RollingCorrState(24)
+        self.rows = deque(maxlen=TIME_STEPS)  # últimas filas de features cerradas
+
+    def _step(self, bar, spx, commit):
+        _, _, high, low, close, volume = [float(x) for x in bar[:6]]
+        prev = self.prev_close
+        op = "update" if commit else "peek"
+
+        if prev is None:
+            ret, diff, tr = NAN, NAN, NAN
+        else:
+            ret = math.log(close / prev) if prev > 0 and close > 0 else NAN
+            diff = close - prev
+            hl = high - low
+            if hl == 0:
+                hl += sys.float_info.epsilon  # non_zero_range de pandas_ta
+            tr = max(abs(hl), abs(high - prev), abs(prev - low))
+
+        gain = NAN if diff != diff else max(diff, 0.0)
+        loss = NAN if diff != diff else max(-diff, 0.0)
+        g = getattr(self.gain, op)(gain)
+        lo = getattr(self.loss, op)(loss)
+        rsi = g / (g + lo) if (g + lo) > 0 else NAN
+        atr = getattr(self.atr, op)(tr)
+        ema = getattr(self.ema, op)(close)
+        vmean = getattr(self.vol_mean, op)(volume)
+        corr = getattr(self.corr, op)(close, spx) if spx is not None else NAN
+
+        row = [
+            ret,
+            rsi,
+            atr / close if atr == atr and close else 0.0,
+            volume / vmean if vmean == vmean and vmean else 1.0,
+            corr if corr == corr else 0.0,
+            (close - ema) / ema if ema == ema and ema else 0.0,
+        ]
+        if commit:
+            self.prev_close = close
+            self.last_ts = int(bar[0])
+            self.count += 1
+            self.rows.append(row)
+        return row
+
+    def update(self, bar, spx=None):
+        """Vela cerrada → avanza el estado (O(1))."""
+        return self._step(bar, spx, commit=True)
+
+    def peek(self, bar, spx=None):
+        """Vela abierta → fila de features sin modificar el estado."""
+        return self._step(bar, spx, commit=False)
+
+    def sync(self, bars, spx=None, final_until=None):
+        """
+        bars: velas ccxt con la última abierta. spx: lista alineada o None.
+        final_until: ms hasta donde el S&P ya es definitivo (última descarga). Las
+        velas cerradas después se evalúan sobre una copia sin fijarse en el estado:
+        se fijan en un ciclo posterior con el S&P que les corresponde, igual que en
+        el entrenamiento. Devuelve (filas TIME_STEPS x 6, última fila) o (None, None)
+        si falta historia. Si hay un hueco o el historial retrocede, se re-arranca.
+        """
+        if len(bars) < 2:
+            return None, None
+        # Estado sin correlación (S&P no disponible hasta ahora) → se re-arranca una vez
+        sin_corr = self.count >= self.corr.length and len(self.corr.buf) < self.corr.length
+        if spx is not None and sin_corr:
+            self.reset()
+        if spx is None:
+            spx, final_until = [None] * len(bars), None
+        closed = list(zip(bars[:-1], spx[:-1]))
+
+        if self.last_ts is not None:
+            nuevas = [(b, s) for b, s in closed if b[0] > self.last_ts]
+            retrocede = bars[-1][0] <= self.last_ts
+            hueco = nuevas and nuevas[0][0][0] - self.last_ts > self.timeframe_ms
+            if retrocede or hueco:
+                self.reset()
+                nuevas = closed
+        else:
+            nuevas = closed
+
+        fijas = nuevas
+        if final_until is not None:
+            fijas = [(b, s) for b, s in nuevas if b[0] + self.timeframe_ms <= final_until]
+        for bar, s in fijas:
+            self.update(bar, s)
+
+        st = self
+        if len(fijas) < len(nuevas):  # S&P provisional → no se fija
+            st = copy.deepcopy(self)
+            for bar, s in nuevas[len(fijas) :]:
+                st.update(bar, s)
+
+        if st.count < 199:  # mismo mínimo de 200 velas que brain.prepare_data
+            return None, None
+        last = st.peek(bars[-1], spx[-1])
+        rows = list(st.rows)[-(TIME_STEPS - 1) :] + [last]
+        return rows, last
+
+    # =========================
+    # PERSISTENCIA
+    # =========================
+
+    def to_dict(self):
+        return {
+            "version": STATE_VERSION,
+            "last_ts": self.last_ts,
+            "prev_close": self.prev_close,
+            "count": self.count,
+            "gain": self.gain.to_dict(),
+            "loss": self.loss.to_dict(),
+            "atr": self.atr.to_dict(),
+            "ema": self.ema.to_dict(),
+            "vol_mean": self.vol_mean.to_dict(),
+            "corr": self.corr.to_dict(),
+            "rows": [list(r) for r in self.rows],
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        if d.get("version") != STATE_VERSION:
+            raise ValueError(f"estado de features v{d.get('version')} (se re-arranca)")
+        st = cls()
+        st.last_ts = d["last_ts"]
+        st.prev_close = d["prev_close"]
+        st.count = d["count"]
+        for name in ["gain", "loss", "atr", "ema", "vol_mean", "corr"]:
+            getattr(st, name).load(d[name])
+        st.rows = deque(d["rows"], maxlen=TIME_STEPS)
+        return st
+
+
+def _max_errors(inc, batch, tol):
+    """Error máximo por feature entre filas incrementales y del kernel por lotes."""
+    import numpy as np
+
+    from features import FEATURES
+
+    errors = {}
+    for i, f in enumerate(FEATURES):
+        a, b = inc[:, i], np.nan_to_num(batch[:, i], nan=0.0) if f != "returns" else batch[:, i]
+        if f in ("rsi", "returns"):
+            mask = ~(np.isnan(a) | np.isnan(b))
+            diff = np.abs(a[mask] - b[mask])
+        else:
+            diff = np.abs(a - b)
+        errors[f] = float(diff.max()) if len(diff) else 0.0
+    errors["ok"] = all(v <= tol for v in errors.values())
+    return errors
+
+
+def verify_against_batch(bars, tol=1e-6, spx=None):
+    """
+    Compara el estado incremental con el kernel por lotes (features.py, que
+    replica pandas_ta) sobre las mismas velas. Devuelve el error máximo por feature.
+    spx: S&P 500 ya alineado a las velas (features.align_spx) o None.
+    """
+    import numpy as np
+
+    from features import bars_to_ohlcv, compute_features
+
+    batch = compute_features(bars_to_ohlcv(bars)[None], spx)[0]
+    st = FeatureState()
+    spx_list = spx if spx is not None else [None] * len(bars)
+    inc = np.array([st.update(b, s) for b, s in zip(bars, spx_list)])
+    return _max_errors(inc, batch, tol)
+
+
+def verify_replay(bars, spx_bars, tol=1e-6, window=48, lag_ms=0, timeframe_ms=TIMEFRAME_MS):
+    """
+    Paridad vivo/entrenamiento del S&P: reproduce las últimas `window` velas una
+    a una como en vivo (en cada ciclo solo se ven las velas del S&P cerradas
+    `lag_ms` antes de la apertura de la vela actual, y `final_until` es esa hora)
+    y compara cada fila que se fija en el estado con la del kernel por lotes sobre
+    el S&P completo (grow/trainer). Devuelve el error máximo por feature.
+    """
+    import numpy as np
+
+    from features import SPX_BAR_MS, align_spx, bars_to_ohlcv, compute_features
+
+    opens = [b[0] for b in bars]
+    batch = compute_features(
+        bars_to_ohlcv(bars)[None], align_spx(opens, spx_bars, timeframe_ms)
+    )[0]
+    index = {ts: i for i, ts in enumerate(opens)}
+    st, inc, ref = FeatureState(timeframe_ms), [], []
+    for i in range(max(1, len(bars) - window), len(bars)):
+        asof = bars[i][0] - lag_ms
+        visibles = [b for b in spx_bars if b[0] + SPX_BAR_MS <= asof]
+        spx = align_spx(opens[: i + 1], visibles, timeframe_ms)
+        antes = st.count
+        st.sync(bars[: i + 1], None if spx is None else list(spx), final_until=asof)
+        nuevas = min(st.count - antes if st.count >= antes else st.count, len(st.rows))
+        fin = index[st.last_ts] if st.last_ts is not None else -1
+        for k, row in enumerate(list(st.rows)[len(st.rows) - nuevas :]):
+            inc.append(row)
+            ref.append(batch[fin - nuevas + 1 + k])
+    if not inc:
+        return {"ok": True}
+    return _max_errors(np.array(inc), np.array(ref), tol)
@@ -0,0 +1,159 @@
+"""
+LULA JOURNAL v1.0 — DIARIO DE ESCRITURA ANTICIPADA (WAL) PARA EL GUARDIAN
+Cada cambio de estado (entrada, salida, nuevo máximo, HWM...) se añade como una
+línea JSON a `<base>.journal`: escribir cuesta O(delta), no O(estado completo).
+Cada cierto tiempo se compacta en una foto `<base>.json` escrita de forma
+atómica (tmp + fsync + rename + fsync del directorio) y el diario se vacía.
+
+Recuperación: foto + reproducción de las líneas con seq > seq de la foto. Una
+última línea a medias (corte de luz) se descarta. Pensado para la tarjeta SD:
+los fsync se agrupan salvo en operaciones críticas (entradas y salidas).
+"""
+
+import json
+import os
+import time
+
+FSYNC_INTERVAL_SEC = float(os.getenv("JOURNAL_FSYNC_SEC", 2.0))
+COMPACT_EVERY_OPS = int(os.getenv("JOURNAL_COMPACT_OPS", 500))
+COMPACT_EVERY_SEC = float(os.getenv("JOURNAL_COMPACT_SEC", 3600))
+
+
+def fsync_dir(path):
+    """Persiste la entrada de directorio tras un rename (no existe en Windows)."""
+    try:
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    except Exception:
+        pass
+
+
+def atomic_write_json(path, data):
+    """Escribe JSON en `path` sin dejar nunca un archivo a medias."""
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    fsync_dir(path)
+
+
+class StateJournal:
+    """
+    journal = StateJournal("/app/data/guardian_memory")
+    state, ops = journal.recover()          # foto + deltas pendientes
+    journal.append("entry", "SOL/USDT", {...}, critical=True)
+    journal.checkpoint(lambda: state_dict)  # compacta si toca
+    """
+
+    def __init__(self, base_path):
+        self.snapshot_path = base_path + ".json"
+        self.journal_path = base_path + ".journal"
+        self.seq = 0
+        self.ops_since_snapshot = 0
+        self.last_snapshot = time.time()
+        self._fh = None
+        self._dirty = False
+        self._last_fsync = 0.0
+
+    # ---------- recuperación ----------
+
+    def recover(self):
+        """Devuelve (foto, [ops del diario posteriores a la foto])."""
+        state = {}
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r") as f:
+                state = json.load(f)
+        snap_seq = int(state.get("_seq", 0))
+        self.seq = snap_seq
+
+        ops = []
+        if os.path.exists(self.journal_path):
+            good = 0  # bytes válidos: una cola rota por un corte se recorta
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        op = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    good += len(line)
+                    if op.get("seq", 0) > snap_seq:
+                        ops.append(op)
+                        self.seq = max(self.seq, op["seq"])
+            if good < os.path.getsize(self.journal_path):
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(good)
+                    os.fsync(f.fileno())
+        self.ops_since_snapshot = len(ops)
+        return state, ops
+
+    # ---------- escritura ----------
+
+    def _open(self):
+        if self._fh is None:
+            os.makedirs(os.path.dirname(self.journal_path) or ".", exist_ok=True)
+            self._fh = open(self.journal_path, "a")
+        return self._fh
+
+    def append(self, op, symbol=None, data=None, critical=False):
+        """Añade un delta. `critical` fuerza fsync ya (entradas/salidas con dinero)."""
+        self.seq += 1
+        rec = {"seq": self.seq, "ts": round(time.time(), 3), "op": op}
+        if symbol is not None:
+            rec["sym"] = symbol
+        if data is not None:
+            rec["data"] = data
+        fh = self._open()
+        fh.write(json.dumps(rec) + "\n")
+        fh.flush()
+        self._dirty = True
+        self.ops_since_snapshot += 1
+        if critical or time.time() - self._last_fsync >= FSYNC_INTERVAL_SEC:
+            self.sync()
+
+    def sync(self):
+        """fsync agrupado de todo lo pendiente."""
+        if self._fh is not None and self._dirty:
+            os.fsync(self._fh.fileno())
+            self._dirty = False
+        self._last_fsync = time.time()
+
+    def needs_compaction(self):
+        return self.ops_since_snapshot >= COMPACT_EVERY_OPS or (
+            time.time() - self.last_snapshot >= COMPACT_EVERY_SEC
+        )
+
+    def snapshot(self, state):
+        """Foto atómica del estado completo y diario vacío."""
+        self.sync()
+        state = dict(state)
+        state["_seq"] = self.seq
+        atomic_write_json(self.snapshot_path, state)
+        # La foto ya cubre todo: si caemos antes de vaciar, recover() ignora seq <= _seq
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        with open(self.journal_path, "w") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        self.ops_since_snapshot = 0
+        self.last_snapshot = time.time()
+
+    def checkpoint(self, state_fn, force=False):
+        """Fin de ciclo: fsync de lo pendiente y compactación si toca."""
+        if force or self.needs_compaction():
+            self.snapshot(state_fn())
+        else:
+            self.sync()
+
+    def close(self):
+        self.sync()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
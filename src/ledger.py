@@ -0,0 +1,410 @@
+"""
+LULA LEDGER v1.0 — LIBRO LOCAL DE ÓRDENES Y FILLS (SQLite)
+Sustituye al texto libre de /app/logs/orders.log: órdenes y fills en SQLite con
+índices por símbolo y hora, consultables al instante.
+
+Dos vías de entrada:
+  1. Cada `create_order` se anota al momento (fill provisional con el precio medio).
+  2. Sincronización incremental desde el exchange con cursores `since` por
+     símbolo (fetch_my_trades + fetch_orders, todos los símbolos a la vez); los
+     trades reales sustituyen a los fills provisionales de su orden.
+
+Las comisiones se guardan tal cual (importe y moneda) y valoradas en USDT: en
+quote o base directamente; en otra moneda (BNB con el descuento de Binance) al
+cierre de su par USDT en el minuto del fill (`fee_price`, lo pone el gestor).
+
+Consultas (coste medio ponderado, comisiones en USDT):
+    ledger.position("SOL/USDT")   # {"qty", "avg_entry", "realized", "fees", ...}
+    ledger.avg_entry("SOL/USDT")  # entrada real de la posición abierta
+    ledger.realized_pnl(since=ts_ms)
+    ledger.fees("SOL/USDT")
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+
+LEDGER_DB_PATH = os.getenv("LEDGER_DB_PATH", "/app/data/ledger.db")
+LEDGER_SYNC_SEC = float(os.getenv("LEDGER_SYNC_SEC", 3600))
+SYNC_LIMIT = 500  # por símbolo y ronda; si llega lleno, la siguiente ronda sigue el cursor
+SYNC_WINDOW_MS = 24 * 3600 * 1000  # Binance: allOrders/myTrades con startTime abarcan 24 h
+SYNC_LAG_MS = 60_000  # una ventana vacía solo avanza hasta ahora - 1 min (fills tardíos)
+DUST_USD = 1.0  # por debajo, la posición se da por cerrada (restos de comisiones)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS orders ("
+    " exchange TEXT NOT NULL, id TEXT NOT NULL, symbol TEXT NOT NULL, ts INTEGER NOT NULL,"
+    " side TEXT, type TEXT, status TEXT, amount REAL, filled REAL, price REAL, average REAL,"
+    " cost REAL, fee_quote REAL, PRIMARY KEY (exchange, id))",
+    "CREATE TABLE IF NOT EXISTS fills ("
+    " exchange TEXT NOT NULL, id TEXT NOT NULL, order_id TEXT, symbol TEXT NOT NULL,"
+    " ts INTEGER NOT NULL, side TEXT NOT NULL, price REAL NOT NULL, amount REAL NOT NULL,"
+    " cost REAL, fee_quote REAL DEFAULT 0, fee_base REAL DEFAULT 0,"
+    " provisional INTEGER DEFAULT 0, fee_cost REAL, fee_currency TEXT,"
+    " PRIMARY KEY (exchange, id))",
+    "CREATE TABLE IF NOT EXISTS cursors ("
+    " exchange TEXT NOT NULL, symbol TEXT NOT NULL, kind TEXT NOT NULL, since INTEGER,"
+    " PRIMARY KEY (exchange, symbol, kind))",
+    "CREATE INDEX IF NOT EXISTS fills_symbol_ts ON fills (symbol, ts)",
+    "CREATE INDEX IF NOT EXISTS fills_order ON fills (exchange, order_id)",
+    "CREATE INDEX IF NOT EXISTS orders_symbol_ts ON orders (symbol, ts)",
+)
+
+
+class TradeLedger:
+    def __init__(self, path=LEDGER_DB_PATH, sync_every=LEDGER_SYNC_SEC, clock=time.time):
+        self.path = path
+        self.sync_every = sync_every
+        self.clock = clock
+        self.last_sync = 0.0
+        self._lock = threading.Lock()
+        self._version = 0  # sube con cada escritura: invalida las posiciones memorizadas
+        self._positions = {}  # {símbolo: (versión, posición)}
+        self.fee_price = None  # (moneda, ts_ms) → precio en USDT; lo pone el gestor
+        self._rates = {}  # {(moneda, minuto): precio} de comisiones ya valoradas
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        for stmt in SCHEMA:
+            self._db.execute(stmt)
+        self._migrate()
+        self._db.commit()
+
+    def _migrate(self):
+        """
+        Ledgers anteriores no guardaban la comisión en bruto (las de BNB contaban 0):
+        se añaden las columnas y se olvidan los cursores de trades para re-bajarlos.
+        """
+        cols = {r[1] for r in self._db.execute("PRAGMA table_info(fills)")}
+        if "fee_currency" in cols:
+            return
+        self._db.execute("ALTER TABLE fills ADD COLUMN fee_cost REAL")
+        self._db.execute("ALTER TABLE fills ADD COLUMN fee_currency TEXT")
+        self._db.execute("DELETE FROM cursors WHERE kind = 'trades'")
+
+    # =========================
+    # COMISIONES
+    # =========================
+
+    def _rate(self, currency, ts, fetch=True):
+        """Precio en USDT de `currency` en el minuto `ts` (ms). None si no se sabe aún."""
+        key = (currency, int(ts) // 60_000)
+        if key in self._rates:
+            return self._rates[key]
+        if not fetch or self.fee_price is None:
+            return None
+        try:
+            rate = self.fee_price(currency, int(ts))
+        except Exception as e:
+            print(f"⚠️ Ledger: sin precio de {currency} para la comisión ({e})")
+            return None
+        if rate:
+            self._rates[key] = float(rate)
+        return self._rates.get(key)
+
+    def _fee(self, fee, symbol, price, ts, fetch=True):
+        """
+        Comisión ccxt → (en USDT, en moneda base, importe, moneda). En otra moneda
+        sin precio todavía, USDT = None: `revalue_fees` la valora más tarde.
+        """
+        if not fee or not fee.get("cost"):
+            return 0.0, 0.0, 0.0, None
+        base, quote = symbol.split("/")[0], symbol.split("/")[-1]
+        cost, currency = float(fee["cost"]), fee.get("currency")
+        if currency == quote:
+            return cost, 0.0, cost, currency
+        if currency == base:
+            return cost * price, cost, cost, currency
+        rate = self._rate(currency, ts, fetch) if currency else None
+        return (cost * rate if rate else None), 0.0, cost, currency
+
+    def revalue_fees(self):
+        """Valora en USDT las comisiones que se anotaron sin precio. Devuelve cuántas."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT rowid, ts, fee_cost, fee_currency FROM fills"
+                " WHERE fee_quote IS NULL AND fee_cost > 0"
+            ).fetchall()
+        updates = []
+        for rowid, ts, cost, currency in rows:
+            rate = self._rate(currency, ts)
+            if rate:
+                updates.append((cost * rate, rowid))
+        if updates:
+            with self._lock:
+                self._db.executemany("UPDATE fills SET fee_quote = ? WHERE rowid = ?", updates)
+                self._db.commit()
+                self._version += 1
+        return len(updates)
+
+    # =========================
+    # ESCRITURA
+    # =========================
+
+    def _order_row(self, exchange, o):
+        symbol = o["symbol"]
+        ts = int(o.get("timestamp") or self.clock() * 1000)
+        price = o.get("average") or o.get("price") or 0.0
+        fee_q = self._fee(o.get("fee"), symbol, price, ts, fetch=False)[0]
+        return (
+            exchange,
+            str(o["id"]),
+            symbol,
+            ts,
+            o.get("side"),
+            o.get("type"),
+            o.get("status"),
+            o.get("amount"),
+            o.get("filled"),
+            o.get("price"),
+            o.get("average"),
+            o.get("cost"),
+            fee_q,
+        )
+
+    def upsert_orders(self, exchange, orders):
+        rows = [self._order_row(exchange, o) for o in orders if o and o.get("id") is not None]
+        if not rows:
+            return 0
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO orders VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)", rows
+            )
+            self._db.commit()
+            self._version += 1
+        return len(rows)
+
+    def upsert_trades(self, exchange, trades):
+        """Trades reales (fetch_my_trades): sustituyen a los provisionales de su orden."""
+        rows = []
+        for t in trades or []:
+            if not t or t.get("id") is None or not t.get("amount"):
+                continue
+            symbol, price, amount = t["symbol"], float(t["price"]), float(t["amount"])
+            ts = int(t["timestamp"])
+            fee_q, fee_b, fee_cost, fee_cur = self._fee(t.get("fee"), symbol, price, ts)
+            order_id = str(t["order"]) if t.get("order") is not None else None
+            cost = t.get("cost") or price * amount
+            row = (exchange, str(t["id"]), order_id, symbol, ts, t["side"])
+            rows.append(row + (price, amount, cost, fee_q, fee_b, 0, fee_cost, fee_cur))
+        if not rows:
+            return 0
+        with self._lock:
+            self._db.executemany(
+                "DELETE FROM fills WHERE exchange = ? AND order_id = ? AND provisional = 1",
+                {(r[0], r[2]) for r in rows if r[2] is not None},
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO fills VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)", rows
+            )
+            self._db.commit()
+            self._version += 1
+        return len(rows)
+
+    def record_order(self, exchange, order):
+        """
+        Orden recién creada: se anota con un fill provisional (precio medio) hasta
+        que la sincronización traiga sus trades reales.
+        """
+        if not order or order.get("id") is None:
+            return
+        self.upsert_orders(exchange, [order])
+        filled = float(order.get("filled") or 0.0)
+        price = float(order.get("average") or order.get("price") or 0.0)
+        if filled <= 0 or price <= 0:
+            return
+        symbol, oid = order["symbol"], str(order["id"])
+        ts = int(order.get("timestamp") or self.clock() * 1000)
+        # Sin red en el camino de la orden: una comisión en BNB se valora al sincronizar
+        fee_q, fee_b, fee_cost, fee_cur = self._fee(order.get("fee"), symbol, price, ts, False)
+        row = (exchange, f"{oid}:p", oid, symbol, ts, order["side"], price, filled)
+        row += (order.get("cost") or price * filled, fee_q, fee_b, 1, fee_cost, fee_cur)
+        with self._lock:
+            # Si los trades reales ya llegaron, el provisional sobra
+            real = self._db.execute(
+                "SELECT 1 FROM fills WHERE exchange = ? AND order_id = ? AND provisional = 0",
+                (exchange, oid),
+            ).fetchone()
+            if real is None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO fills VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?)", row
+                )
+                self._db.commit()
+                self._version += 1
+
+    # =========================
+    # SINCRONIZACIÓN INCREMENTAL
+    # =========================
+
+    def cursor(self, exchange, symbol, kind):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT since FROM cursors WHERE exchange = ? AND symbol = ? AND kind = ?",
+                (exchange, symbol, kind),
+            ).fetchone()
+        return row[0] if row else None
+
+    def _advance(self, exchange, symbol, kind, items, since=None):
+        """
+        Cursor → último timestamp visto. Una página vacía con `since` avanza la
+        ventana consultada (24 h en Binance): tras un día sin fills el cursor no
+        se queda clavado pidiendo siempre la misma ventana vacía.
+        """
+        last = max((int(i["timestamp"]) for i in items if i and i.get("timestamp")), default=None)
+        if last is None and since is not None:
+            last = min(since + SYNC_WINDOW_MS, int(self.clock() * 1000) - SYNC_LAG_MS) - 1
+        if last is None or last <= (self.cursor(exchange, symbol, kind) or 0):
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO cursors VALUES (?,?,?,?)", (exchange, symbol, kind, last)
+            )
+            self._db.commit()
+
+    def sync_calls(self, exchange, ex, symbols):
+        """[(exchange, método, args, kwargs)] para una ronda: trades y órdenes desde el cursor."""
+        kinds = ["orders"]
+        if callable(getattr(ex, "fetch_my_trades", None)):
+            kinds.insert(0, "trades")
+        calls = []
+        for symbol in symbols:
+            for kind in kinds:
+                since = self.cursor(exchange, symbol, kind)
+                kwargs = {"limit": SYNC_LIMIT}
+                if since is not None:
+                    kwargs["since"] = since + 1
+                method = "fetch_my_trades" if kind == "trades" else "fetch_orders"
+                calls.append((exchange, method, (symbol,), kwargs))
+        return calls
+
+    def apply(self, calls, results):
+        """Resultados de sync_calls → tablas y cursores. Devuelve (nuevos, errores)."""
+        new, errors = 0, 0
+        for (exchange, method, (symbol,), kwargs), res in zip(calls, results):
+            if isinstance(res, BaseException):
+                errors += 1
+                continue
+            res = [r for r in (res or []) if r and r.get("symbol", symbol) == symbol]
+            since = kwargs.get("since")
+            if method == "fetch_my_trades":
+                new += self.upsert_trades(exchange, res)
+                self._advance(exchange, symbol, "trades", res, since)
+            else:
+                self.upsert_orders(exchange, res)
+                self._advance(exchange, symbol, "orders", res, since)
+        self.revalue_fees()
+        self.last_sync = self.clock()
+        return new, errors
+
+    def due(self):
+        return self.clock() - self.last_sync >= self.sync_every
+
+    # =========================
+    # CONSULTAS
+    # =========================
+
+    def fills(self, symbol, since=None):
+        """Fills de un símbolo por orden temporal (índice symbol, ts)."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT ts, side, price, amount, fee_quote, fee_base, provisional FROM fills"
+                " WHERE symbol = ? AND ts >= ? ORDER BY ts, rowid",
+                (symbol, since or 0),
+            ).fetchall()
+
+    def _walk(self, symbol, since=0):
+        """
+        Coste medio ponderado sobre todos los fills. Las compras suman coste (y la
+        comisión en USDT); la comisión en base reduce la cantidad. Las ventas
+        realizan PnL contra el coste medio (solo cuentan las de `since` en adelante).
+        Por debajo de DUST_USD la posición se reinicia: la siguiente compra abre otra.
+        """
+        qty = basis = realized = fees = 0.0
+        opened, n = None, 0
+        for ts, side, price, amount, fee_q, fee_b, _ in self.fills(symbol):
+            fee_q, fee_b = fee_q or 0.0, fee_b or 0.0
+            n += 1
+            if side == "buy":
+                if qty * price < DUST_USD:
+                    qty, basis, opened = 0.0, 0.0, ts
+                qty += amount - fee_b
+                basis += price * amount + (0.0 if fee_b else fee_q)
+            else:
+                matched = min(amount, qty)
+                avg = basis / qty if qty > 0 else price
+                if ts >= since:
+                    realized += matched * (price - avg) - fee_q
+                basis -= matched * avg
+                qty -= matched
+            if ts >= since:
+                fees += fee_q
+        open_ = qty > 0 and basis >= DUST_USD
+        return {
+            "qty": qty if open_ else 0.0,
+            "avg_entry": basis / qty if open_ else None,
+            "opened_ts": opened if open_ else None,
+            "realized": realized,
+            "fees": fees,
+            "fills": n,
+        }
+
+    def position(self, symbol):
+        """Posición abierta, PnL realizado y comisiones de un símbolo (memorizado)."""
+        with self._lock:
+            memo = self._positions.get(symbol)
+            version = self._version
+        if memo is not None and memo[0] == version:
+            return memo[1]
+        pos = self._walk(symbol)
+        with self._lock:
+            self._positions[symbol] = (version, pos)
+        return pos
+
+    def avg_entry(self, symbol, default=None):
+        entry = self.position(symbol)["avg_entry"]
+        return entry if entry is not None else default
+
+    def _symbols(self):
+        with self._lock:
+            return [r[0] for r in self._db.execute("SELECT DISTINCT symbol FROM fills")]
+
+    def realized_pnl(self, symbol=None, since=None):
+        """PnL realizado en USDT (neto de comisiones), total o desde `since` (ms)."""
+        symbols = [symbol] if symbol else self._symbols()
+        if since is None:
+            return sum(self.position(s)["realized"] for s in symbols)
+        # Desde una fecha: el coste medio sigue necesitando toda la historia previa
+        return sum(self._walk(s, since)["realized"] for s in symbols)
+
+    def fees(self, symbol=None, since=None):
+        """Comisiones pagadas en USDT (SUM indexado)."""
+        sql, args = "SELECT COALESCE(SUM(fee_quote), 0) FROM fills WHERE ts >= ?", [since or 0]
+        if symbol:
+            sql += " AND symbol = ?"
+            args.append(symbol)
+        with self._lock:
+            return float(self._db.execute(sql, args).fetchone()[0])
+
+    def recent_orders(self, symbol=None, limit=20):
+        cols = ("exchange", "id", "symbol", "ts", "side", "type", "status", "filled", "average")
+        sql, args = f"SELECT {', '.join(cols)} FROM orders", []
+        if symbol:
+            sql += " WHERE symbol = ?"
+            args.append(symbol)
+        sql += " ORDER BY ts DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [dict(zip(cols, r)) for r in rows]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+metrics.instrument(TradeLedger, "ledger", names=("position", "apply", "record_order"))
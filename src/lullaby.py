@@ -1,6 +1,8 @@
 import os
 from datetime import datetime
 
+import metrics
+
 # XMR eliminado de GENERATOR_COINS — Binance no lo tiene desde 2024
 # Se gestiona exclusivamente desde connection.safe (CoinEx)
 GENERATOR_COINS = [
@@ -205,33 +207,40 @@ def get_position_size(available_usdt, total_equity, current_val_usd, score, prob
 # Para órdenes grandes, divide la compra en N micro-órdenes
 # distribuidas a lo largo de `duration_seconds`.
 # Activo cuando el monto supera TWAP_MIN_AMOUNT (default $500).
+# Los tramos los dispara execution.ExecutionScheduler (sin sleeps
+# en este hilo y con reanudación tras reinicio).
 # Configurable por .env:
 #   TWAP_MIN_AMOUNT   = 500    (umbral para activar TWAP)
 #   TWAP_SLICES       = 5      (número de micro-órdenes)
 #   TWAP_DURATION_SEC = 300    (duración total en segundos, 5 min)
+#   EXEC_ALGO         = twap   (twap | vwap | pov)
+#   POV_RATE          = 0.05   (pov: % del volumen negociado)
 # =========================================================
 
 
-def execute_twap(connection, symbol, total_amount_usd, price, label="TWAP"):
+@metrics.traced("lullaby.execute_twap")
+def execute_twap(connection, symbol, total_amount_usd, price, label="TWAP", meta=None):
     """
-    Ejecuta una compra grande mediante micro-órdenes equidistantes.
+    Ejecuta una compra grande mediante micro-órdenes programadas.
     Devuelve el monto total realmente ejecutado (puede ser < total si hay errores parciales).
+    Espera al planificador: llamar desde un hilo de órdenes (pipeline.OrderWorker).
 
     Uso en main.py:
         ejecutado = execute_twap(connection, symbol, monto_final, price)
     """
-    import time as _time
-
     twap_min = get_env_float("TWAP_MIN_AMOUNT", 500.0)
     n_slices = int(get_env_float("TWAP_SLICES", 5))
     duration = get_env_float("TWAP_DURATION_SEC", 300.0)
-    min_op = get_env_float("MIN_OP_USDT", 15.0)
+    algo = os.getenv("EXEC_ALGO", "twap").lower()
 
     # Solo activar TWAP si el monto lo justifica
     if total_amount_usd < twap_min:
         # Orden única normal
+        if total_amount_usd < connection.min_notional(symbol):
+            print(f"⚠️ Compra directa {symbol}: ${total_amount_usd:.2f} bajo el mínimo del par")
+            return 0.0
         try:
-            qty = connection.gen.amount_to_precision(symbol, total_amount_usd / price)
+            qty = connection.amount_to_precision(symbol, total_amount_usd / price)
             connection.gen.create_market_order(symbol, "buy", qty)
             print(f"🚀 COMPRA DIRECTA: {symbol} | ${total_amount_usd:.2f}")
             return total_amount_usd
@@ -239,39 +248,24 @@ def execute_twap(connection, symbol, total_amount_usd, price, label="TWAP"):
             print(f"⚠️ Error compra directa {symbol}: {e}")
             return 0.0
 
-    # TWAP activo
-    monto_slice = round(total_amount_usd / n_slices, 2)
-    sleep_between = duration / n_slices
-    ejecutado = 0.0
-
+    # TWAP activo → planificador (los tramos < MIN_OP_USDT se acumulan al siguiente)
+    scheduler = connection.executor or connection.start_executor()
     print(
-        f"⏱️ TWAP {label}: {symbol} | ${total_amount_usd:.2f} en {n_slices} tramos × ${monto_slice:.2f} cada {sleep_between:.0f}s"
+        f"⏱️ {algo.upper()} {label}: {symbol} | ${total_amount_usd:.2f} en {n_slices} tramos "
+        f"durante {duration:.0f}s"
     )
-
-    for i in range(n_slices):
-        if monto_slice < min_op:
-            print(f"  ↳ Tramo {i+1}: slice ${monto_slice:.2f} < mínimo, abortando TWAP")
-            break
-        try:
-            # Refrescamos precio en cada tramo para mejorar precio medio
-            try:
-                ticker = connection.gen.fetch_ticker(symbol)
-                live_price = ticker.get("last", price)
-            except:
-                live_price = price
-
-            qty = connection.gen.amount_to_precision(symbol, monto_slice / live_price)
-            connection.gen.create_market_order(symbol, "buy", qty)
-            ejecutado += monto_slice
-            print(f"  ↳ Tramo {i+1}/{n_slices}: ${monto_slice:.2f} @ ${live_price:.4f} ✅")
-        except Exception as e:
-            print(f"  ↳ Tramo {i+1}/{n_slices}: ⚠️ Error — {e}")
-
-        if i < n_slices - 1:
-            _time.sleep(sleep_between)
-
-    print(f"  ↳ TWAP completado: ${ejecutado:.2f} ejecutados de ${total_amount_usd:.2f}")
-    return ejecutado
+    parent = scheduler.submit(
+        symbol,
+        total_amount_usd,
+        price,
+        algo=algo,
+        label=label,
+        duration=duration,
+        n_slices=n_slices,
+        rate=get_env_float("POV_RATE", 0.05),
+        meta=meta,
+    )
+    return scheduler.wait(parent.id)
 
 
 # =========================================================
@@ -0,0 +1,285 @@
+"""
+LULA MACRO v1.0 — SERVICIO DE DATOS MACRO (VIX / DXY / F&G / S&P 500)
+Un hilo refresca cada fuente con su propio calendario (VIX/DXY 15 min, F&G 1 h,
+S&P 500 horario incremental). Las lecturas nunca bloquean: devuelven el último
+valor conocido con su antigüedad. Los valores se persisten en disco para
+arrancar en caliente y, si una fuente falla, se reintenta con backoff sin tocar
+el valor anterior.
+
+    macro = MacroService(LiveProvider()).start()
+    macro.get("vix")            # → 17.3 (último valor, sin red)
+    macro.status()              # → {"vix": {"value", "age", "stale", "error"}, ...}
+    MacroService(StubProvider())  # sin red, para pruebas
+"""
+
+import json
+import os
+import threading
+import time
+
+import metrics
+from journal import atomic_write_json
+
+MACRO_CACHE_PATH = "/app/data/macro_cache.json"
+
+# Segundos entre refrescos por fuente (sobrescribibles por .env)
+SCHEDULES = {
+    "vix": float(os.getenv("MACRO_VIX_SEC", 900)),
+    "dxy": float(os.getenv("MACRO_DXY_SEC", 900)),
+    "fng": float(os.getenv("MACRO_FNG_SEC", 3600)),
+    "spx": float(os.getenv("MACRO_SPX_SEC", 900)),
+}
+# Valores neutros de arranque (los mismos que usaba el Guardian)
+DEFAULTS = {"vix": 20.0, "dxy": 100.0, "fng": 50, "spx": []}
+SPX_KEEP_MS = 60 * 86_400_000  # 60 días de velas horarias del S&P
+
+
+# =========================
+# PROVEEDORES
+# =========================
+
+
+class LiveProvider:
+    """Yahoo Finance (VIX, DXY, S&P 500) + alternative.me (F&G)."""
+
+    def fetch(self, name, current=None):
+        return getattr(self, f"_{name}")(current)
+
+    def _yahoo_last(self, ticker):
+        import yfinance as yf
+
+        df = yf.download(ticker, period="5d", interval="1d", progress=False, threads=False)
+        close = df["Close"]
+        if hasattr(close, "columns"):  # yfinance nuevo devuelve columnas por ticker
+            close = close[ticker]
+        return float(close.ffill().iloc[-1])
+
+    def _vix(self, current):
+        return self._yahoo_last("^VIX")
+
+    def _dxy(self, current):
+        return self._yahoo_last("DX-Y.NYB")
+
+    def _fng(self, current):
+        import requests
+
+        r = requests.get("https://api.alternative.me/fng/", timeout=5).json()
+        return int(r["data"][0]["value"])
+
+    def _spx(self, current):
+        """Velas 1h cerradas [[ts_ms, close], ...]; con historia previa solo pide 5 días."""
+        import yfinance as yf
+
+        from features import closed_spx
+
+        spx = yf.download(
+            "^GSPC",
+            period="5d" if current else "1mo",
+            interval="1h",
+            progress=False,
+            multi_level_index=False,
+            timeout=5,
+        )
+        if spx.empty:
+            raise ValueError("S&P 500 vacío")
+        close = spx["Close"].dropna()
+        bars = [[int(ts.timestamp() * 1000), float(v)] for ts, v in close.items()]
+        return closed_spx(bars, time.time() * 1000)  # la vela en curso aún cambia
+
+
+class StubProvider:
+    """
+    Proveedor local determinista. `values` fija lo que devuelve cada fuente
+    (valor o función(current) → valor); `fail` simula caídas por fuente.
+    """
+
+    def __init__(self, values=None, fail=()):
+        now_h = int(time.time() // 3600) * 3_600_000
+        self.values = {
+            "vix": 18.0,
+            "dxy": 100.5,
+            "fng": 55,
+            "spx": [[now_h - i * 3_600_000, 5000.0 + i] for i in range(200, 0, -1)],
+        }
+        self.values.update(values or {})
+        self.fail = set(fail)
+        self.calls = {}
+
+    def fetch(self, name, current=None):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        if name in self.fail:
+            raise ConnectionError(f"stub: {name} caído")
+        v = self.values[name]
+        return v(current) if callable(v) else v
+
+
+# =========================
+# SERVICIO
+# =========================
+
+
+class MacroService:
+    def __init__(self, provider=None, path=MACRO_CACHE_PATH, schedules=None, clock=time.time):
+        self.provider = provider or LiveProvider()
+        self.path = path
+        self.schedules = dict(SCHEDULES, **(schedules or {}))
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        # {name: {"value", "ts", "error", "fails", "next"}}
+        self._data = {
+            n: {"value": DEFAULTS[n], "ts": 0.0, "error": None, "fails": 0, "next": 0.0}
+            for n in self.schedules
+        }
+        self._load()
+
+    # ---------- lecturas (no bloquean) ----------
+
+    def get(self, name, default=None):
+        with self._lock:
+            d = self._data.get(name)
+            return d["value"] if d is not None else default
+
+    def age(self, name):
+        with self._lock:
+            ts = self._data[name]["ts"]
+        return self.clock() - ts if ts else float("inf")
+
+    def is_stale(self, name):
+        """Más viejo que 2 periodos de refresco (o nunca obtenido)."""
+        return self.age(name) > 2 * self.schedules[name]
+
+    def status(self):
+        out = {}
+        for name in self.schedules:
+            with self._lock:
+                d = dict(self._data[name])
+            age = self.clock() - d["ts"] if d["ts"] else None
+            out[name] = {
+                "value": d["value"] if name != "spx" else len(d["value"]),
+                "ts": d["ts"],
+                "age": age,
+                "stale": self.is_stale(name),
+                "error": d["error"],
+            }
+        return out
+
+    def stale_sources(self):
+        return [n for n in self.schedules if self.is_stale(n)]
+
+    def spx_bars(self):
+        """Velas horarias del S&P como lista [[ts_ms, close], ...] ordenada."""
+        return list(self.get("spx", []))
+
+    def spx_asof(self):
+        """ms de la última descarga buena del S&P: hasta ahí sus velas son definitivas."""
+        with self._lock:
+            ts = self._data["spx"]["ts"]
+        return int(ts * 1000) if ts else None
+
+    def spx_series(self):
+        """S&P 500 como pd.Series (índice UTC), igual que el antiguo get_sp500_data."""
+        import pandas as pd
+
+        bars = self.spx_bars()
+        if not bars:
+            return None
+        idx = pd.to_datetime([b[0] for b in bars], unit="ms", utc=True)
+        return pd.Series([b[1] for b in bars], index=idx, name="Close")
+
+    # ---------- refresco ----------
+
+    def _merge_spx(self, current, new):
+        merged = {int(ts): float(c) for ts, c in (current or [])}
+        merged.update({int(ts): float(c) for ts, c in new})
+        if not merged:
+            return []
+        cutoff = max(merged) - SPX_KEEP_MS
+        return [[ts, merged[ts]] for ts in sorted(merged) if ts >= cutoff]
+
+    def refresh(self, name):
+        """Refresca una fuente ya (bloqueante). Devuelve True si hubo dato nuevo."""
+        with self._lock:
+            current = self._data[name]["value"]
+        try:
+            with metrics.span("macro.refresh", name):
+                value = self.provider.fetch(name, current if name == "spx" else None)
+            if name == "spx":
+                value = self._merge_spx(current, value)
+            ok, err = True, None
+        except Exception as e:
+            ok, err = False, f"{type(e).__name__}: {e}"
+        now = self.clock()
+        with self._lock:
+            d = self._data[name]
+            if ok:
+                d.update(value=value, ts=now, error=None, fails=0)
+                d["next"] = now + self.schedules[name]
+            else:
+                # Backoff 60 s, 120 s, 240 s... sin pasar del calendario normal
+                d["fails"] += 1
+                d["error"] = err
+                d["next"] = now + min(self.schedules[name], 60 * 2 ** (d["fails"] - 1))
+        return ok
+
+    def refresh_due(self):
+        """Refresca las fuentes vencidas. Devuelve cuántas se actualizaron."""
+        now = self.clock()
+        with self._lock:
+            due = [n for n, d in self._data.items() if d["next"] <= now]
+        updated = sum(1 for n in due if self.refresh(n))
+        if updated:
+            self._save()
+        return updated
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh_due()
+            except Exception as e:
+                print(f"⚠️ Error en servicio macro: {e}")
+            with self._lock:
+                wake = min(d["next"] for d in self._data.values())
+            self._stop.wait(max(1.0, min(60.0, wake - self.clock())))
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="lula-macro", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    # ---------- persistencia ----------
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            with self._lock:
+                data = {n: {"value": d["value"], "ts": d["ts"]} for n, d in self._data.items()}
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            atomic_write_json(self.path, data)
+        except Exception as e:
+            print(f"⚠️ Error guardando caché macro: {e}")
+
+    def _load(self):
+        """Arranque en caliente: últimos valores conocidos, refresco según su edad."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                saved = json.load(f)
+        except Exception as e:
+            print(f"⚠️ Caché macro ilegible: {e}")
+            return
+        for name, d in saved.items():
+            if name in self._data and d.get("ts"):
+                self._data[name].update(value=d["value"], ts=d["ts"])
+                self._data[name]["next"] = d["ts"] + self.schedules[name]
@@ -1,4 +1,5 @@
 import os, time, threading, warnings, json
+from functools import partial
 from brain import Brain
 from connection import DualExchangeManager
 from guardian import Guardian
@@ -6,6 +7,13 @@ import show as ui
 import lullaby as strat
 import feelings
 import sub
+from dashboard import DashboardState
+from pipeline import OrderWorker, gather_contexts
+from events import EventScheduler
+from macro import LiveProvider, MacroService
+from scanner import UniverseScanner
+import metrics
+import tape
 
 warnings.filterwarnings("ignore")
 
@@ -53,7 +61,7 @@ def rotar_capital(connection, prices_map, full_bal, nivel_ataque):
             valor = qty * precio
             if valor > 1000 and precio > 0:
                 monto = min(valor * pct, cap)
-                q = connection.gen.amount_to_precision(f"{coin}/USDT", monto / precio)
+                q = connection.amount_to_precision(f"{coin}/USDT", monto / precio)
                 connection.gen.create_market_order(f"{coin}/USDT", "sell", q)
                 liberado += monto
                 print(f"🔄 ROTACIÓN {coin}: -${monto:.2f} liberados")
@@ -71,7 +79,7 @@ def get_xmr_row(connection, ok_macro):
     try:
         xmr_bal = connection.get_balance(connection.safe)
         xmr_qty = xmr_bal.get("XMR", {}).get("total", 0) if xmr_bal else 0
-        ticker = connection.safe.fetch_ticker("XMR/USDT")
+        ticker = connection.get_ticker(connection.safe, "XMR/USDT")
         xmr_p = ticker.get("last", 0)
         xmr_val = xmr_qty * xmr_p
         return xmr_p, xmr_val
@@ -79,6 +87,49 @@ def get_xmr_row(connection, ok_macro):
         return 0.0, 0.0
 
 
+def publicar_panel(board, filas, orden, fila_xmr, datos_xmr, header, footer, meta):
+    """Estado del ciclo → panel web (JSON + SSE). Nunca bloquea el bucle."""
+    try:
+        rows = {s: dict(filas[s][2], html=ui.ansi_to_html(filas[s][1])) for s in orden}
+        if datos_xmr:
+            rows["XMR/USDT"] = dict(datos_xmr, html=ui.ansi_to_html(fila_xmr or ""))
+            orden = orden + ["XMR/USDT"]
+        board.publish(
+            rows,
+            order=orden,
+            header=ui.ansi_to_html(header or ""),
+            footer=ui.ansi_to_html(footer or ""),
+            meta=meta,
+        )
+    except Exception as e:
+        print(f"⚠️ Error publicando panel: {e}")
+
+
+def aplicar_ordenes(guardian, jobs):
+    """
+    Aplica en el hilo principal las órdenes que el worker terminó en segundo plano.
+    Devuelve True si alguna llegó a ejecutarse.
+    """
+    hubo = False
+    for job in jobs:
+        symbol, meta = job.symbol, job.meta
+        if job.ejecutado <= 0:
+            continue
+        if job.error is not None:  # tramo fallido en una orden que sí se ejecutó en parte
+            print(f"⚠️ {job.label} {symbol}: parcial (${job.ejecutado:.2f}) — {job.error}")
+        hubo = True
+        if job.label == "T1":
+            # IMPORTANTE: pasamos 'prob' para el cálculo de Delta IA futuro
+            guardian.registrar_entrada(symbol, meta["price"], meta["prob"])
+            if meta.get("tramo2", 0) >= 10.0:
+                guardian.actualizar_posicion(symbol, tramo2_pendiente=meta["tramo2"])
+        elif job.label == "T2":
+            guardian.actualizar_posicion(symbol, tramo2_pendiente=0)
+            guardian.sincronizar_entradas([symbol])  # el T2 mueve el precio medio
+            print(f"  ↳ Scaling In T2 ejecutado: ${job.ejecutado:.2f} @ ${meta['price']:.4f}")
+    return hubo
+
+
 # ─────────────────────────────────────────────────────────────
 # RESET DIARIO — Persistencia del equity inicial por día
 # ─────────────────────────────────────────────────────────────
@@ -91,7 +142,7 @@ def load_daily_state(current_equity):
     Si el archivo no existe o es de un día anterior, reinicia con el equity actual.
     Devuelve (equity_inicial, cycle_offset).
     """
-    today = time.strftime("%Y-%m-%d")
+    today = time.strftime("%Y-%m-%d", time.localtime(time.time()))
     try:
         if os.path.exists(DAILY_STATE_PATH):
             with open(DAILY_STATE_PATH, "r") as f:
@@ -127,7 +178,7 @@ def check_daily_reset(equity_init, cycle, equity_actual):
     Comprueba si han pasado las 00:00. Si es así, resetea equity_init y cycle.
     Devuelve (equity_init, cycle) actualizados.
     """
-    today = time.strftime("%Y-%m-%d")
+    today = time.strftime("%Y-%m-%d", time.localtime(time.time()))
     try:
         if os.path.exists(DAILY_STATE_PATH):
             with open(DAILY_STATE_PATH, "r") as f:
@@ -143,13 +194,47 @@ def check_daily_reset(equity_init, cycle, equity_actual):
 
 
 def main():
+    # 📼 Grabación/reproducción de la sesión (TAPE_MODE, ver tape.py)
+    cinta = tape.from_env()
+
     # 1. BOOT SEQUENCE
     try:
         connection = DualExchangeManager()
-        connection.revisar_log_ordenes(strat.GENERATOR_COINS)
+        connection.start_stream(strat.GENERATOR_COINS)
+        # Ledger al día (trades/órdenes nuevos desde el último arranque) antes del Guardian
+        connection.sync_ledger(strat.GENERATOR_COINS, force=True)
         brain = Brain("/app/data/madness.rknn", "/app/data/scaler.pkl")
         guardian = Guardian()
         guardian.load_state()
+        guardian.ledger = connection.ledger
+        guardian.sincronizar_entradas()
+        # VIX/DXY/F&G/S&P en segundo plano; el bucle solo lee el último valor
+        if cinta is None:
+            macro = MacroService(clock=time.time).start()  # reloj simulado en paper
+        else:  # sin hilo ni caché en disco: se refresca en línea, en el orden de la cinta
+            macro = MacroService(cinta.wrap_provider(LiveProvider()), path=None, clock=time.time)
+            macro.refresh_due()
+        guardian.macro = connection.macro = macro
+        # Indicadores incrementales O(1) por vela, persistidos con la memoria del Guardian
+        if os.getenv("STREAMING_FEATURES", "1") == "1":
+            brain.feature_states = guardian.feature_states
+        # Despertar por eventos: cierre de vela (hora del servidor), precio y fills
+        events = EventScheduler(timeframe="1h")
+        events.virtual = cinta is not None and cinta.mode == "replay"
+        events.speed = connection.clock_speed
+        events.sync_server_time(connection.gen)
+        # Las compras TWAP corren en segundo plano; el ciclo sigue evaluando riesgo
+        orders = OrderWorker(
+            int(os.getenv("ORDER_WORKERS", 4)),
+            on_done=lambda job: events.notify("fill", [job.symbol], job.label),
+        ).start()
+        # Tramos TWAP/VWAP/POV en la rueda del planificador (reanuda los de antes del reinicio)
+        connection.start_executor()
+        connection.executor.on_finish = lambda p: events.notify("fill", [p.symbol], p.label)
+        # Universo dinámico: foto de tickers de todos los USDT → top-K a inferencia
+        scanner = None
+        if os.getenv("UNIVERSE_SCAN", "0") == "1":  # solo pares con scaler entrenado
+            scanner = UniverseScanner(allowed=brain.scalers)
     except Exception as e:
         print(f"❌ Error de Arranque Crítico: {e}")
         return
@@ -162,35 +247,77 @@ def main():
     equity_inicial, cycle_offset = load_daily_state(equity_raw)
     # ────────────────────────────────────────────────────────────
 
-    threading.Thread(target=sub.start_web_server, daemon=True).start()
+    # Panel web multihilo: el bucle solo publica, los clientes leen de memoria
+    board = DashboardState()
+    threading.Thread(target=sub.start_web_server, args=(board,), daemon=True).start()
+    metrics.SummaryWriter().start()  # resumen rodante de latencias en disco
 
-    # ─── Tiempos de ciclo ──────────────────────────────────────
-    SLEEP_NORMAL = 600  # 10 min — sin actividad
+    # ─── Tiempos de ciclo (topes: los eventos despiertan antes) ──
+    SLEEP_NORMAL = 600  # 10 min — latido sin eventos
     SLEEP_POST_OP = 15  # 15 seg — tras compra o venta
-    SLEEP_WATCHING = 60  # 1 min  — señal en ACECHO
+    SLEEP_WATCHING = 60  # 1 min  — ACECHO/posiciones sin stream de precios
+    ACECHO_BAND = float(os.getenv("ACECHO_BAND", 0.005))  # ±0.5% re-evalúa una señal en ACECHO
     # ───────────────────────────────────────────────────────────
 
     MAX_ROTACIONES_POR_CICLO = 2
 
     cycle = 1 + cycle_offset  # Continúa desde donde se quedó hoy
+    objetivo = None  # símbolos a re-evaluar (None = ciclo completo)
+    prices_map, filas, fila_xmr, datos_xmr = {}, {}, "", None
     while True:
         try:
+            reloj = metrics.CycleTimer("ciclo" if objetivo is None else "ciclo_parcial")
             hubo_operacion = False
             hay_acecho = False
             rotaciones_ciclo = 0
+            completo = objetivo is None
+
+            connection.begin_cycle()
+
+            # Órdenes que el worker terminó desde el último ciclo
+            hubo_operacion = aplicar_ordenes(guardian, orders.drain())
+            # ...y las reanudadas tras un reinicio, que no tienen trabajo en el worker
+            hubo_operacion |= aplicar_ordenes(guardian, connection.executor.drain_finished())
+            reloj.lap("ordenes")
+
+            # Universo del ciclo: fijo, o el del escáner (re-escanea en ciclos completos)
+            universo = strat.GENERATOR_COINS
+            if scanner is not None:
+                if completo:
+                    scanner.refresh(connection.gen)
+                universo = scanner.universe(pinned=list(guardian.posiciones))
+                if completo:  # los que salen del universo dejan de pintarse y vigilarse
+                    for s in set(filas) - set(universo):
+                        filas.pop(s, None)
+                        events.unwatch(s)
+            simbolos = [s for s in universo if completo or s in objetivo]
+            reloj.lap("universo")
+
+            # 4. RECOLECCIÓN (adelantada) — Solo el universo (sin XMR, Binance no lo tiene)
+            # Va primero: sus cierres valoran el equity sin pedir tickers sueltos
+            # En eventos parciales solo se piden los símbolos afectados
+            # Una sola ronda concurrente: velas + libros + saldos (+ XMR en ciclos completos)
+            raw_market_data = connection.prefetch_cycle(simbolos, limit=200, safe=completo)
+            prices_map.update({s: b[-1][4] for s, b in raw_market_data.items() if b})
+            reloj.lap("lecturas")
 
             # ── Comprobación de reset diario al inicio de cada ciclo ──
             equity_inicial, cycle = check_daily_reset(
-                equity_inicial, cycle, connection.get_total_equity_usd() or equity_inicial
+                equity_inicial, cycle, connection.get_total_equity_usd(prices_map) or equity_inicial
             )
             # ──────────────────────────────────────────────────────────
 
-            # 2. MACRO Y SALDOS
-            guardian.actualizar_indicadores()
-            sp500 = connection.get_sp500_data()
+            # 2. MACRO Y SALDOS (la macro solo cambia en ciclos completos)
+            sp500 = macro.spx_bars()  # en memoria: el servicio lo mantiene al día
+            if completo:
+                guardian.actualizar_indicadores()
+                viejas = macro.stale_sources()
+                if viejas:
+                    print(f"⚠️ Macro desactualizada: {', '.join(viejas)} (uso último valor)")
             full_bal = connection.get_balance(connection.gen)
-            total_equity = connection.get_total_equity_usd()
+            total_equity = connection.get_total_equity_usd(prices_map)  # memorizado en el ciclo
             usdt_free = full_bal.get("USDT", {}).get("free", 0) if full_bal else 0
+            reloj.lap("macro_saldos")
 
             # 3. SEGURIDAD
             ok_drawdown, _ = guardian.check_drawdown_safety(total_equity)
@@ -201,13 +328,10 @@ def main():
             )
             web_buffer = (header or "") + "\n"
 
-            # 4. RECOLECCIÓN — Solo GENERATOR_COINS (sin XMR, Binance no lo tiene)
-            raw_market_data = connection.get_data_batch(strat.GENERATOR_COINS, limit=200)
-            prices_map = {s: b[-1][4] for s, b in raw_market_data.items() if b}
-
             # 5. INFERENCIA NPU
             batch_input = [{"symbol": s, "bars": b} for s, b in raw_market_data.items() if b]
-            ai_results = brain.analyze_batch(batch_input, sp500)
+            ai_results = brain.analyze_batch(batch_input, sp500, macro.spx_asof())
+            reloj.lap("inferencia")
 
             # 6. PROCESAMIENTO DE SEÑALES
             analyzed_assets = []
@@ -239,10 +363,11 @@ def main():
             # 7. EJECUCIÓN — Motor de Trading v7.7
             # ============================================================
             # --- NUEVA MEJORA: CÁLCULO DE EXPOSICIÓN GLOBAL ---
-            # Sumamos cuánto dinero hay invertido en total en este momento
+            # Todo lo que no es stable cuenta, esté o no en el universo del escáner
+            # (misma valoración memorizada que total_equity)
+            desglose = connection.get_equity_breakdown(prices_map)
             total_invertido = sum(
-                (full_bal.get(s.split("/")[0], {}).get("total", 0) * prices_map.get(s, 0))
-                for s in strat.GENERATOR_COINS
+                a["usd"] for a in desglose["assets"].values() if a["source"] != "stable"
             )
 
             # Consultamos a feelings.py si el mercado da permiso (Filtro IMBAL de BTC)
@@ -264,6 +389,12 @@ def main():
                 ]
             )
 
+            reloj.lap("senales")
+            # FASE 1: contexto de todos los activos en paralelo (imbalance + riesgo)
+            contexts = gather_contexts(connection, guardian, analyzed_assets)
+            reloj.lap("contexto")
+
+            # FASE 2: decisiones en memoria; las compras se encolan (FASE 3)
             for asset in analyzed_assets:
                 symbol, prob, rsi, price = (
                     asset["symbol"],
@@ -273,34 +404,40 @@ def main():
                 )
                 score, bars, rvol = asset["score"], asset["bars"], asset["rvol"]
 
+                # Un evento de precio trae el máximo visto en vivo → trailing al día
+                alto = events.high(symbol)
+                if alto:
+                    guardian.actualizar_maximo(symbol, alto)
+
                 # Datos de la posición actual (si existe)
                 pos_data = guardian.get_datos_posicion(symbol)
                 base_asset = symbol.split("/")[0].upper()
                 held = full_bal.get(base_asset, {}).get("total", 0) if full_bal else 0
                 val_usd = held * price
                 sin_posicion = val_usd < 16.0
+                # Con un TWAP a medias el saldo no refleja la posición: ni vendemos ni compramos
+                en_vuelo = orders.busy(symbol) or connection.executor.busy(symbol)
 
                 # --- NUEVA MEJORA: EVALUAR SALIDA DE EMERGENCIA (DELTA IA / BREAKEVEN) ---
-                if not sin_posicion:
+                if not sin_posicion and not en_vuelo:
                     debe_salir_ya, motivo_emergencia = guardian.evaluar_salida_emergencia(
                         symbol, price, prob
                     )
                     if debe_salir_ya:
                         try:
-                            qty_v = connection.gen.amount_to_precision(symbol, held)
+                            qty_v = connection.amount_to_precision(symbol, held)
                             connection.gen.create_market_order(symbol, "sell", qty_v)
                             guardian.limpiar_posicion(symbol)
+                            events.unwatch(symbol)
+                            filas.pop(symbol, None)
                             hubo_operacion = True
                             print(f"🚨 SALIDA EMERGENCIA: {symbol} | {motivo_emergencia}")
                             continue  # Pasamos al siguiente activo
                         except Exception as e:
                             print(f"⚠️ Error en salida emergencia {symbol}: {e}")
 
-                # Status label normal
-                imb = connection.get_smart_imbalance(symbol)
-                ok_risk, risk_msg, riesgo_n = guardian.analizar_riesgo(
-                    connection, symbol, bars, (prob, rsi, price, rvol)
-                )
+                # Status label normal (contexto ya calculado en la FASE 1)
+                imb, ok_risk, risk_msg, riesgo_n = contexts.get(symbol, (0, False, "ERR", 70))
 
                 status = strat.get_status_label(
                     prob,
@@ -316,12 +453,29 @@ def main():
                 if "ACECHO" in status:
                     hay_acecho = True
 
+                # Vigilancia en vivo hasta la próxima vela (precio del stream, sin REST)
+                niveles = guardian.niveles_salida(symbol) if not sin_posicion else None
+                if niveles:
+                    events.watch(symbol, **niveles)
+                elif "ACECHO" in status:
+                    events.watch(
+                        symbol,
+                        below=price * (1 - ACECHO_BAND),
+                        above=price * (1 + ACECHO_BAND),
+                        band=0,
+                        reason="ACECHO",
+                    )
+                else:
+                    events.unwatch(symbol)
+
                 # --- SECCIÓN DE SALIDA POR ESTRATEGIA (NORMAL) ---
-                if val_usd > 5.0 and ("VENTA" in status or "STOP" in status or "SCORE" in status):
+                vende = "VENTA" in status or "STOP" in status or "SCORE" in status
+                if val_usd > 5.0 and vende and not en_vuelo:
                     try:
-                        qty_v = connection.gen.amount_to_precision(symbol, held)
+                        qty_v = connection.amount_to_precision(symbol, held)
                         connection.gen.create_market_order(symbol, "sell", qty_v)
                         guardian.limpiar_posicion(symbol)
+                        events.unwatch(symbol)
                         usdt_free += val_usd
                         hubo_operacion = True
                         print(f"{status}: {symbol} | Salida estratégica")
@@ -329,7 +483,9 @@ def main():
                         print(f"⚠️ Error en salida {symbol}: {e}")
 
                 # --- SECCIÓN DE COMPRA (CON BLINDAJE v6.2) ---
-                if "🚀 COMPRA" in status and sin_posicion:
+                if en_vuelo:
+                    status = "⏳ ORDEN EN CURSO"
+                elif "🚀 COMPRA" in status and sin_posicion:
                     # 1. Comprobamos límite de posiciones del Tier
                     if posiciones_activas >= max_pos:
                         if cycle % 5 == 0:
@@ -353,23 +509,25 @@ def main():
                         )
 
                         if tramo1 >= 10.0:
-                            try:
-                                ejecutado = strat.execute_twap(
-                                    connection, symbol, tramo1, price, label="T1"
-                                )
-                                if ejecutado > 0:
-                                    # IMPORTANTE: Ahora pasamos 'prob' para el cálculo de Delta IA futuro
-                                    guardian.registrar_entrada(symbol, price, prob)
-                                    usdt_free -= ejecutado
-                                    total_invertido += ejecutado
-                                    posiciones_activas += 1  # Actualizamos el contador
-                                    hubo_operacion = True
-
-                                    if tramo2 >= 10.0:
-                                        guardian.posiciones[symbol]["tramo2_pendiente"] = tramo2
-                                        guardian.save_state()
-                            except Exception as e:
-                                print(f"⚠️ Error en compra {symbol}: {e}")
+                            # TWAP en segundo plano; registrar_entrada al recoger el resultado
+                            meta_t1 = {"price": price, "prob": prob, "tramo2": tramo2}
+                            orders.submit(
+                                symbol,
+                                "T1",
+                                partial(strat.execute_twap, meta=meta_t1),
+                                connection,
+                                symbol,
+                                tramo1,
+                                price,
+                                "T1",
+                                meta=meta_t1,
+                            )
+                            # Reservamos el importe ya: el resto del ciclo no lo reutiliza
+                            usdt_free -= tramo1
+                            total_invertido += tramo1
+                            posiciones_activas += 1  # Actualizamos el contador
+                            hubo_operacion = True
+                            status = "⏳ ORDEN EN CURSO"
 
                 # --- SCALING IN: Tramo 2 si prob sigue confirmando (posición ya abierta) ---
                 elif val_usd >= 5.0:
@@ -382,63 +540,111 @@ def main():
                         and prob >= scale_threshold_high
                         and usdt_free > tramo2_pendiente
                     ):
-                        try:
-                            ejecutado2 = strat.execute_twap(
-                                connection, symbol, tramo2_pendiente, price, label="T2"
-                            )
-                            if ejecutado2 > 0:
-                                usdt_free -= ejecutado2
-                                hubo_operacion = True
-                                guardian.posiciones[symbol].pop("tramo2_pendiente", None)
-                                guardian.save_state()
-                                print(
-                                    f"  ↳ Scaling In T2 ejecutado: ${ejecutado2:.2f} @ ${price:.4f}"
-                                )
-                        except Exception as e:
-                            print(f"⚠️ Error en Tramo 2 {symbol}: {e}")
+                        meta_t2 = {"price": price, "prob": prob}
+                        orders.submit(
+                            symbol,
+                            "T2",
+                            partial(strat.execute_twap, meta=meta_t2),
+                            connection,
+                            symbol,
+                            tramo2_pendiente,
+                            price,
+                            "T2",
+                            meta=meta_t2,
+                        )
+                        usdt_free -= tramo2_pendiente
+                        hubo_operacion = True
 
                 # ── Precio actual desde prices_map para la columna PRECIO ──
                 current_price = prices_map.get(symbol, price)
                 row = ui.print_coin_row(
                     symbol, prob, rsi, imb, score, val_usd, riesgo_n, status, price=current_price
                 )
-                web_buffer += (row or "") + "\n"
+                datos = {
+                    "symbol": symbol,
+                    "prob": round(float(prob), 4),
+                    "rsi": round(float(rsi), 1),
+                    "imb": round(float(imb), 3),
+                    "score": score,
+                    "saldo": round(float(val_usd), 2),
+                    "precio": float(current_price or 0),
+                    "riesgo": int(riesgo_n),
+                    "estado": status,
+                }
+                if pos_data:
+                    datos["entrada"] = float(pos_data.get("precio_entrada") or 0)
+                if connection.ledger is not None:
+                    realizado = connection.ledger.position(symbol)["realized"]
+                    datos["pnl_realizado"] = round(realizado, 2)
+                filas[symbol] = (score, row or "", datos)
+
+            reloj.lap("ejecucion")
+
+            # Dashboard: filas re-evaluadas + las últimas del resto, por score
+            orden = sorted(filas, key=lambda s: filas[s][0], reverse=True)
+            for s in orden:
+                web_buffer += filas[s][1] + "\n"
 
             # ── Fila especial XMR ──
+            xmr_p = xmr_val = 0.0
             try:
-                xmr_p, xmr_val = get_xmr_row(connection, ok_macro)
-                xmr_status = strat.get_status_label(0, -1, ok_macro, xmr_val, 50, symbol="XMR/USDT")
-                row_xmr = ui.print_coin_row(
-                    "XMR/USDT", 0.0, 50, 0.0, -1, xmr_val, 0, xmr_status, price=xmr_p
-                )
-                web_buffer += (row_xmr or "") + "\n"
+                if completo:
+                    xmr_p, xmr_val = get_xmr_row(connection, ok_macro)
+                    xmr_status = strat.get_status_label(
+                        0, -1, ok_macro, xmr_val, 50, symbol="XMR/USDT"
+                    )
+                    fila_xmr = ui.print_coin_row(
+                        "XMR/USDT", 0.0, 50, 0.0, -1, xmr_val, 0, xmr_status, price=xmr_p
+                    )
+                    datos_xmr = {"symbol": "XMR/USDT", "saldo": round(xmr_val, 2)}
+                    datos_xmr.update(precio=float(xmr_p or 0), estado=xmr_status)
+                web_buffer += (fila_xmr or "") + "\n"
             except:
                 pass
 
-            # 8. SLEEP INTELIGENTE
+            # 8. ESPERA POR EVENTOS (cierre de vela, precio, fills) con tope de seguridad
+            live_price = connection.stream.get_last_price if connection.stream else None
             if hubo_operacion:
-                proximo_wake = time.time() + SLEEP_POST_OP
                 sleep_label = f"⚡ Actualizando en {SLEEP_POST_OP}s"
                 sleep_dur = SLEEP_POST_OP
-            elif hay_acecho:
-                proximo_wake = time.time() + SLEEP_WATCHING
+            elif live_price is None and (hay_acecho or guardian.posiciones or orders.pending()):
+                # Sin precios en vivo no hay disparadores: volvemos al sondeo de 1 min
                 sleep_label = f"📡 Acecho activo — refresco en 1 min"
                 sleep_dur = SLEEP_WATCHING
             else:
-                proximo_wake = time.time() + SLEEP_NORMAL
-                sleep_label = f"💤 REPOSO: 10 min"
+                vigilados = len(events.watched())
+                sleep_label = "🕯️ Próxima vela"
+                if vigilados:
+                    sleep_label += f" | 🎯 {vigilados} vigilados"
                 sleep_dur = SLEEP_NORMAL
+            proximo_wake = events.next_wake_local(sleep_dur)
 
             wake_str = time.strftime("%H:%M", time.localtime(proximo_wake))
             footer_line = ui.print_ui_footer(wake_str)
             footer_real = footer_line.replace("💤 REPOSO: 10 min", sleep_label)
             ui.update_web_dashboard(web_buffer + (footer_real or ""))
+            meta_panel = {
+                "cycle": cycle,
+                "equity": round(total_equity or 0, 2),
+                "equity_inicial": round(equity_inicial or 0, 2),
+                "vix": guardian.vix,
+                "dxy": guardian.dxy,
+                "fng": guardian.fng,
+                "despertar": wake_str,
+                "completo": completo,
+            }
+            if connection.ledger is not None:
+                meta_panel["pnl_realizado"] = round(connection.ledger.realized_pnl(), 2)
+                meta_panel["comisiones"] = round(connection.ledger.fees(), 2)
+            publicar_panel(
+                board, filas, orden, fila_xmr, datos_xmr, header, footer_real, meta_panel
+            )
 
-            # 9. FINALIZACIÓN DE CICLO
+            # 9. FINALIZACIÓN DE CICLO (puente y XMR solo en ciclos completos)
             try:
                 reserva_cash = float(os.getenv("MIN_CASH_RESERVE", 100.0))
                 lote_bridge = float(os.getenv("MIN_BRIDGE_BATCH", 50.0))
-                if usdt_free > (reserva_cash + lote_bridge):
+                if completo and usdt_free > (reserva_cash + lote_bridge):
                     connection.bridge_transfer(
                         usdt_free - reserva_cash, os.getenv("REFUGE_ADDR"), "TRX"
                     )
@@ -450,16 +656,30 @@ def main():
             except:
                 pass
 
-            # ── Guardamos el progreso del ciclo actual para restaurar tras reinicios ──
-            save_daily_state(time.strftime("%Y-%m-%d"), equity_inicial, cycle)
+            # Ledger incremental (cada LEDGER_SYNC_SEC): los trades reales afinan las entradas
+            if completo and connection.sync_ledger(universo):
+                guardian.sincronizar_entradas()
 
-            cycle += 1
+            # ── Guardamos el progreso del ciclo actual para restaurar tras reinicios ──
+            if completo:
+                hoy = time.strftime("%Y-%m-%d", time.localtime(time.time()))
+                save_daily_state(hoy, equity_inicial, cycle)
+                cycle += 1
             guardian.save_state()
-            time.sleep(sleep_dur)
+            reloj.lap("cierre")
+            reloj.stop()
+
+            with metrics.span("ciclo.espera"):
+                evento = events.wait(sleep_dur, price_fn=live_price)
+            objetivo = evento.symbols  # None → ciclo completo
+            if not evento.full:
+                print(f"⚡ {evento} {' · '.join(evento.detail)}")
 
         except Exception as e:
+            reloj.stop(error=True)
             print(f"⚠️ Alerta de Sistema (Main Loop): {type(e).__name__} - {e}")
             print("⏳ Reintentando en 60 segundos...")
+            objetivo = None
             time.sleep(60)
 
 
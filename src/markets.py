@@ -0,0 +1,222 @@
+"""
+LULA MARKETS v1.0 — CACHÉ PERSISTENTE DE MERCADOS Y PRECISIONES
+El primer `load_markets` de ccxt baja y parsea varios MB (lento en la placa ARM)
+y se repetía en cada reinicio del contenedor. Aquí los mercados ya parseados se
+guardan en disco por exchange: al arrancar se cargan con `set_markets` (sin red)
+y un hilo los revalida en segundo plano cuando vencen (MARKETS_TTL_SEC).
+
+Con cada carga se precalcula una tabla por símbolo (paso de cantidad, mínimos
+de cantidad y notional, tick de precio), así el dimensionado de órdenes
+(execute_twap, rotar_capital, salidas) nunca toca la red:
+
+    cache = MarketsCache().attach("gen", gen).attach("safe", safe).start()
+    cache.amount_to_precision("gen", "BTC/USDT", 0.0012345)   # → "0.00123"
+    cache.spec("gen", "BTC/USDT").min_notional                  # → 5.0
+"""
+
+import json
+import os
+import threading
+import time
+from decimal import ROUND_DOWN, Decimal
+
+from journal import atomic_write_json
+
+try:
+    from ccxt.base.errors import InvalidOrder
+except ImportError:  # sin ccxt: misma clase, mismo uso (except Exception)
+
+    class InvalidOrder(Exception):
+        pass
+
+
+MARKETS_DIR = os.getenv("MARKETS_CACHE_DIR", "/app/data/markets")
+MARKETS_TTL_SEC = float(os.getenv("MARKETS_TTL_SEC", 24 * 3600))
+RETRY_SEC = 300  # revalidación fallida: reintento en 5 min (se sigue con lo guardado)
+
+# Modos de precisión de ccxt (ccxt.base.decimal_to_precision)
+DECIMAL_PLACES = 2
+TICK_SIZE = 4
+
+
+def _step(value, mode):
+    """Precisión ccxt → paso decimal (TICK_SIZE ya es el paso; DECIMAL_PLACES, dígitos)."""
+    if value is None:
+        return None
+    if mode == DECIMAL_PLACES:
+        return Decimal(1).scaleb(-int(value))
+    return Decimal(str(value))
+
+
+def _sandbox(ex):
+    """Testnet y real tienen mercados distintos: cada uno su fichero."""
+    if getattr(ex, "isSandboxModeEnabled", False):
+        return True
+    urls = getattr(ex, "urls", None) or {}
+    return bool(urls.get("test")) and urls.get("api") == urls.get("test")
+
+
+class MarketSpec:
+    """Lo que hace falta para dimensionar una orden de un símbolo, sin ccxt."""
+
+    __slots__ = ("symbol", "step", "tick", "min_qty", "min_notional")
+
+    def __init__(self, market, mode=TICK_SIZE):
+        precision = market.get("precision") or {}
+        limits = market.get("limits") or {}
+        self.symbol = market.get("symbol")
+        self.step = _step(precision.get("amount"), mode)
+        self.tick = _step(precision.get("price"), mode)
+        self.min_qty = float((limits.get("amount") or {}).get("min") or 0.0)
+        self.min_notional = float((limits.get("cost") or {}).get("min") or 0.0)
+
+    def amount(self, amount):
+        """Cantidad truncada al paso (como ccxt: TRUNCATE, sin ceros de relleno)."""
+        q = Decimal(repr(float(amount)))
+        if self.step:
+            q = (q / self.step).to_integral_value(rounding=ROUND_DOWN) * self.step
+        if q <= 0:
+            raise InvalidOrder(f"{self.symbol}: cantidad {amount} por debajo del paso {self.step}")
+        return format(q.normalize(), "f")
+
+
+class MarketsCache:
+    def __init__(self, path=MARKETS_DIR, ttl=MARKETS_TTL_SEC, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.clock = clock
+        self.exchanges = {}  # {nombre: exchange ccxt}
+        self.loaded_at = {}  # {nombre: ts de la descarga de los mercados en uso}
+        self.specs = {}  # {nombre: {símbolo: MarketSpec}}
+        self._next = {}  # {nombre: próxima revalidación}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------- alta de exchanges ----------
+
+    def attach(self, name, ex):
+        """
+        Mercados del disco si los hay (aunque estén vencidos: el hilo los renueva);
+        si no, descarga ahora (una vez, en el arranque y no en la primera orden).
+        """
+        self.exchanges[name] = ex
+        saved = self._read(name)
+        if saved is not None:
+            ex.set_markets(saved["markets"], saved.get("currencies") or None)
+            self._loaded(name, saved["ts"])
+            self._sync_time(name, ex)
+        else:
+            self.reload(name)
+        return self
+
+    def _loaded(self, name, ts):
+        ex = self.exchanges[name]
+        mode = getattr(ex, "precisionMode", TICK_SIZE)
+        specs = {s: MarketSpec(m, mode) for s, m in (ex.markets or {}).items()}
+        with self._lock:
+            self.specs[name] = specs
+            self.loaded_at[name] = ts
+            self._next[name] = ts + self.ttl
+
+    def _sync_time(self, name, ex):
+        """
+        `load_markets` de ccxt también mide el desfase de reloj (adjustForTimeDifference);
+        al restaurar del disco hay que pedirlo aparte o las firmas salen con -1021.
+        """
+        if not (getattr(ex, "options", None) or {}).get("adjustForTimeDifference"):
+            return
+        try:
+            ex.load_time_difference()
+        except Exception as e:
+            print(f"⚠️ Mercados {name}: sin desfase de reloj ({e})")
+
+    def reload(self, name):
+        """Descarga fresca (ccxt) → tabla de precisiones → disco. False si falla."""
+        ex = self.exchanges[name]
+        try:
+            ex.load_markets(True)
+        except Exception as e:
+            print(f"⚠️ Mercados {name}: revalidación fallida ({e})")
+            with self._lock:
+                self._next[name] = self.clock() + RETRY_SEC
+            return False
+        now = self.clock()
+        self._loaded(name, now)
+        self._write(name, ex, now)
+        return True
+
+    # ---------- lecturas (sin red) ----------
+
+    def spec(self, name, symbol):
+        with self._lock:
+            return self.specs.get(name, {}).get(symbol)
+
+    def amount_to_precision(self, name, symbol, amount):
+        """Tabla precalculada; símbolo desconocido → ccxt (que ya tiene los mercados)."""
+        spec = self.spec(name, symbol)
+        if spec is None or spec.step is None:
+            return self.exchanges[name].amount_to_precision(symbol, amount)
+        return spec.amount(amount)
+
+    def age(self, name):
+        ts = self.loaded_at.get(name)
+        return self.clock() - ts if ts else float("inf")
+
+    def status(self):
+        return {
+            n: {"symbols": len(self.specs.get(n, {})), "age_h": round(self.age(n) / 3600, 1)}
+            for n in self.exchanges
+        }
+
+    # ---------- revalidación en segundo plano ----------
+
+    def refresh_due(self):
+        now = self.clock()
+        with self._lock:
+            due = [n for n, t in self._next.items() if t <= now]
+        return sum(1 for n in due if self.reload(n))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.refresh_due()
+            with self._lock:
+                wake = min(self._next.values(), default=self.clock() + self.ttl)
+            self._stop.wait(max(1.0, min(3600.0, wake - self.clock())))
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="lula-markets", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    # ---------- persistencia ----------
+
+    def _file(self, name):
+        ex = self.exchanges[name]
+        ex_id = getattr(ex, "id", None) or name
+        return os.path.join(self.path, f"{name}_{ex_id}{'_test' if _sandbox(ex) else ''}.json")
+
+    def _write(self, name, ex, ts):
+        if not self.path:
+            return
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            data = {"ts": ts, "markets": ex.markets, "currencies": ex.currencies}
+            atomic_write_json(self._file(name), data)
+        except Exception as e:
+            print(f"⚠️ Error guardando mercados {name}: {e}")
+
+    def _read(self, name):
+        if not self.path or not os.path.exists(self._file(name)):
+            return None
+        try:
+            with open(self._file(name), "r") as f:
+                saved = json.load(f)
+            return saved if saved.get("markets") else None
+        except Exception as e:
+            print(f"⚠️ Caché de mercados {name} ilegible: {e}")
+            return None
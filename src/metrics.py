@@ -0,0 +1,324 @@
+"""
+LULA METRICS v1.0 — TRAZAS Y LATENCIAS DEL CICLO
+Spans ligeros (perf_counter + un bisect) que alimentan histogramas por etapa y
+por endpoint, con contadores de llamadas y de errores:
+
+    with metrics.span("brain.analyze_batch"): ...
+    @metrics.traced("guardian.analizar_riesgo")
+    metrics.instrument(DualExchangeManager, "conn")   # todos sus métodos
+    metrics.instrument_exchange(ex, "binance")         # cada endpoint REST de ccxt
+    t = metrics.CycleTimer("ciclo"); ...; t.lap("datos"); ...; t.stop()
+
+Se exponen en formato Prometheus (`/metrics` del panel) y en un resumen rodante
+en disco (`/app/data/metrics_summary.json`). METRICS_ENABLED=0 los apaga.
+"""
+
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from journal import atomic_write_json
+
+ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+SUMMARY_PATH = "/app/data/metrics_summary.json"
+SUMMARY_EVERY_SEC = float(os.getenv("METRICS_SUMMARY_SEC", 300))
+SUMMARY_KEEP = int(os.getenv("METRICS_SUMMARY_KEEP", 12))  # ventanas en disco (1 h)
+
+# Segundos: de 1 ms (caché) a 5 min (TWAP completo)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS += (30.0, 60.0, 300.0)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count", "errors", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # el último es +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+        self.max = 0.0
+
+    def observe(self, dt, error=False):
+        self.counts[bisect_left(BUCKETS, dt)] += 1
+        self.sum += dt
+        self.count += 1
+        if error:
+            self.errors += 1
+        if dt > self.max:
+            self.max = dt
+
+    def copy(self):
+        h = Histogram()
+        h.counts, h.sum, h.count = list(self.counts), self.sum, self.count
+        h.errors, h.max = self.errors, self.max
+        return h
+
+    def minus(self, prev):
+        """Diferencia con una copia anterior (ventana). El máximo es el acumulado."""
+        h = self.copy()
+        if prev is not None:
+            h.counts = [a - b for a, b in zip(self.counts, prev.counts)]
+            h.sum -= prev.sum
+            h.count -= prev.count
+            h.errors -= prev.errors
+        return h
+
+    def quantile(self, q):
+        """Estimación por interpolación lineal dentro del bucket (como histogram_quantile)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        acc = 0
+        for i, c in enumerate(self.counts):
+            if acc + c >= rank and c:
+                lo = BUCKETS[i - 1] if i > 0 else 0.0
+                hi = BUCKETS[i] if i < len(BUCKETS) else self.max
+                return min(lo + (hi - lo) * (rank - acc) / c, self.max)
+            acc += c
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "mean_ms": round(1000 * self.sum / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(1000 * self.quantile(0.50), 3),
+            "p95_ms": round(1000 * self.quantile(0.95), 3),
+            "p99_ms": round(1000 * self.quantile(0.99), 3),
+            "max_ms": round(1000 * self.max, 3),
+            "total_s": round(self.sum, 3),
+        }
+
+
+class _Span:
+    __slots__ = ("registry", "key", "t0")
+
+    def __init__(self, registry, key):
+        self.registry = registry
+        self.key = key
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.registry.observe(self.key, time.perf_counter() - self.t0, exc_type is not None)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class Registry:
+    def __init__(self, enabled=ENABLED):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._hist = {}  # {(span, endpoint): Histogram}
+        self.started = time.time()
+
+    def observe(self, key, dt, error=False):
+        with self._lock:
+            h = self._hist.get(key)
+            if h is None:
+                h = self._hist[key] = Histogram()
+            h.observe(dt, error)
+
+    def span(self, name, endpoint=""):
+        return _Span(self, (name, endpoint)) if self.enabled else _NULL
+
+    def traced(self, name, endpoint=""):
+        """Decorador: un span por llamada."""
+
+        def deco(fn):
+            if not self.enabled:
+                return fn
+            key = (name, endpoint)
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                t0 = time.perf_counter()
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException:
+                    self.observe(key, time.perf_counter() - t0, True)
+                    raise
+                self.observe(key, time.perf_counter() - t0)
+                return result
+
+            wrapper.__traced__ = True
+            return wrapper
+
+        return deco
+
+    def instrument(self, cls, prefix, names=None):
+        """Envuelve los métodos de una clase (todos los no mágicos si names=None)."""
+        for attr, fn in list(vars(cls).items()):
+            if names is not None and attr not in names:
+                continue
+            if attr.startswith("__") or not callable(fn) or getattr(fn, "__traced__", False):
+                continue
+            setattr(cls, attr, self.traced(f"{prefix}.{attr}")(fn))
+        return cls
+
+    def instrument_exchange(self, exchange, label):
+        """
+        Un span por petición REST de ccxt, etiquetado por endpoint: todos los
+        métodos implícitos (fetch_*, create_order...) acaban en `request`.
+        """
+        if not self.enabled or getattr(exchange.request, "__traced__", False):
+            return exchange
+        original = exchange.request
+        name = f"exchange.{label}"
+
+        @functools.wraps(original)
+        def request(path, api="public", method="GET", *args, **kwargs):
+            endpoint = f"{method} {api}/{path}" if isinstance(api, str) else f"{method} {path}"
+            with _Span(self, (name, endpoint)):
+                return original(path, api, method, *args, **kwargs)
+
+        request.__traced__ = True
+        exchange.request = request
+        return exchange
+
+    # ---------- lectura ----------
+
+    def snapshot(self):
+        with self._lock:
+            return {k: h.copy() for k, h in self._hist.items()}
+
+    def render(self):
+        """Formato de exposición de texto de Prometheus."""
+        snap = self.snapshot()
+        out = [
+            "# HELP lula_span_seconds Latencia por etapa / endpoint",
+            "# TYPE lula_span_seconds histogram",
+        ]
+        errors = ["# HELP lula_span_errors_total Llamadas que lanzaron excepción"]
+        errors.append("# TYPE lula_span_errors_total counter")
+        for (name, endpoint), h in sorted(snap.items()):
+            labels = f'span="{_esc(name)}"'
+            if endpoint:
+                labels += f',endpoint="{_esc(endpoint)}"'
+            acc = 0
+            for le, c in zip(BUCKETS, h.counts):
+                acc += c
+                out.append(f'lula_span_seconds_bucket{{{labels},le="{le}"}} {acc}')
+            out.append(f'lula_span_seconds_bucket{{{labels},le="+Inf"}} {h.count}')
+            out.append(f"lula_span_seconds_sum{{{labels}}} {h.sum:.6f}")
+            out.append(f"lula_span_seconds_count{{{labels}}} {h.count}")
+            errors.append(f"lula_span_errors_total{{{labels}}} {h.errors}")
+        out += errors
+        out.append("# TYPE lula_uptime_seconds gauge")
+        out.append(f"lula_uptime_seconds {time.time() - self.started:.0f}")
+        return "\n".join(out) + "\n"
+
+    def summary(self, prev=None):
+        """{"span[ endpoint]": stats} de lo ocurrido desde la foto `prev` (o desde el inicio)."""
+        prev = prev or {}
+        out = {}
+        for key, h in sorted(self.snapshot().items()):
+            w = h.minus(prev.get(key))
+            if w.count:
+                out[" ".join(k for k in key if k)] = w.summary()
+        return out
+
+
+def _esc(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+class CycleTimer:
+    """
+    Vueltas de un bucle largo sin re-indentar: cada lap() mide desde la anterior.
+        t = CycleTimer("ciclo"); ...; t.lap("datos"); ...; t.lap("ia"); t.stop()
+    Solo cuenta el primer stop(): el except del bucle puede volver a llamarlo.
+    """
+
+    __slots__ = ("registry", "prefix", "t0", "last", "stopped")
+
+    def __init__(self, prefix, registry=None):
+        self.registry = registry or REGISTRY
+        self.prefix = prefix
+        self.t0 = self.last = time.perf_counter()
+        self.stopped = False
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        dt, self.last = now - self.last, now
+        if self.registry.enabled:
+            self.registry.observe((f"{self.prefix}.{stage}", ""), dt)
+        return dt
+
+    def stop(self, error=False):
+        now = time.perf_counter()
+        if self.stopped:
+            return now - self.t0
+        self.stopped = True
+        if self.registry.enabled:
+            self.registry.observe((f"{self.prefix}.total", ""), now - self.t0, error)
+        return now - self.t0
+
+
+class SummaryWriter:
+    """Cada SUMMARY_EVERY_SEC añade una ventana al resumen en disco (últimas SUMMARY_KEEP)."""
+
+    def __init__(self, registry=None, path=SUMMARY_PATH, every=SUMMARY_EVERY_SEC):
+        self.registry = registry or REGISTRY
+        self.path = path
+        self.every = every
+        self.windows = []
+        self._prev = self.registry.snapshot()
+        self._since = time.time()
+        self._stop = threading.Event()
+
+    def dump(self):
+        now = time.time()
+        self.windows.append(
+            {
+                "desde": round(self._since, 1),
+                "hasta": round(now, 1),
+                "spans": self.registry.summary(self._prev),
+            }
+        )
+        self.windows = self.windows[-SUMMARY_KEEP:]
+        self._prev, self._since = self.registry.snapshot(), now
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        data = {"actualizado": round(now, 1), "total": self.registry.summary()}
+        data["ventanas"] = self.windows
+        atomic_write_json(self.path, data)
+
+    def _run(self):
+        while not self._stop.wait(self.every):
+            try:
+                self.dump()
+            except Exception as e:
+                print(f"⚠️ Error guardando métricas: {e}")
+
+    def start(self):
+        if self.registry.enabled:
+            threading.Thread(target=self._run, name="lula-metrics", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+
+REGISTRY = Registry()
+span = REGISTRY.span
+traced = REGISTRY.traced
+instrument = REGISTRY.instrument
+instrument_exchange = REGISTRY.instrument_exchange
+render = REGISTRY.render
@@ -0,0 +1,577 @@
+"""
+LULA PAPER v1.0 — EXCHANGE SIMULADO (PAPER TRADING)
+Sustituye a `gen`/`safe` con la misma superficie ccxt que usa el bot:
+fetch_ohlcv, fetch_order_book, fetch_ticker(s), fetch_balance, create_order /
+create_market_order, amount_to_precision, fetch_orders, withdraw y fetch_time.
+
+Las órdenes a mercado se casan nivel a nivel contra el libro (grabado y
+re-centrado en el precio actual, o sintético), con comisión taker, mínimo
+nocional y latencia inyectada. El mercado reproduce velas de candles.db (o
+sintéticas) sobre un reloj que puede ir más rápido que el real (PAPER_SPEED);
+con PAPER_SPEED != 1 el gestor instala ese reloj en time.time/time.sleep.
+Todo pasa por `request`, así que métricas y gobernador lo ven igual que a Binance.
+
+    PAPER_TRADING=1 python src/main.py                  # el gestor usa PaperExchange
+    python src/paper.py --cycles 2000                   # banco del ciclo del gestor
+"""
+
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+from bisect import bisect_right
+
+import numpy as np
+
+from candles import CANDLES_DB_PATH, TIMEFRAME_MS
+from governor import request_weight
+
+_real_time = time.time
+_real_sleep = time.sleep
+
+PAPER_SPEED = float(os.getenv("PAPER_SPEED", 1.0))  # 100 → una vela de 1h cada 36 s
+PAPER_FEE = float(os.getenv("PAPER_FEE", 0.001))  # taker de Binance
+PAPER_LATENCY_MS = float(os.getenv("PAPER_LATENCY_MS", 0))  # media; jitter lognormal
+PAPER_BOOKS_PATH = os.getenv("PAPER_BOOKS_PATH", "/app/data/paper_books.jsonl")
+PAPER_GEN_BALANCE = os.getenv("PAPER_GEN_BALANCE", "USDT:1000")
+PAPER_SAFE_BALANCE = os.getenv("PAPER_SAFE_BALANCE", "USDT:100")
+MIN_NOTIONAL = 5.0  # filtro NOTIONAL de Binance spot
+WITHDRAW_FEE = {"USDT": 1.0}  # red TRX
+WARMUP_BARS = 500  # historia disponible antes del "ahora" simulado
+BOOK_LEVELS = 20
+
+# Precios de partida del mercado sintético (orden de magnitud realista)
+SEED_PRICES = {"BTC": 60000.0, "ETH": 3000.0, "SOL": 150.0, "XMR": 150.0, "PEPE": 0.00001}
+SEED_PRICES.update({"XRP": 0.6, "ADA": 0.5, "POL": 0.5, "DOT": 7.0, "LINK": 15.0})
+
+
+try:
+    from ccxt.base.errors import BadSymbol, InsufficientFunds, InvalidOrder
+except ImportError:  # sin ccxt: mismas clases, mismo uso (except Exception)
+
+    class InsufficientFunds(Exception):
+        pass
+
+    class InvalidOrder(Exception):
+        pass
+
+    class BadSymbol(Exception):
+        pass
+
+
+# =========================
+# RELOJ
+# =========================
+
+
+class ScaledClock:
+    """Tiempo simulado que corre `speed` veces más rápido que el real."""
+
+    def __init__(self, speed=PAPER_SPEED, start=None):
+        self.speed = speed
+        self.t0 = _real_time()
+        self.start = self.t0 if start is None else float(start)
+
+    def now(self):
+        return self.start + (_real_time() - self.t0) * self.speed
+
+    def sleep(self, seconds):
+        _real_sleep(max(seconds, 0.0) / self.speed)
+
+    def install(self):
+        """Sustituye time.time / time.sleep por este reloj (todo el proceso), como tape."""
+        time.time = self.now
+        time.sleep = self.sleep
+        return self
+
+    def uninstall(self):
+        time.time, time.sleep = _real_time, _real_sleep
+
+
+# =========================
+# MERCADO
+# =========================
+
+
+def synthetic_history(symbols, bars, seed=7, tf_ms=3_600_000, end_ms=None):
+    """Velas horarias de paseo aleatorio: {"symbols", "ts" (B,), "ohlcv" (S, B, 5)}."""
+    rng = np.random.default_rng(seed)
+    S = len(symbols)
+    vol = 0.006 * np.exp(rng.normal(0, 0.3, (S, 1)))
+    p0 = np.array([SEED_PRICES.get(s.split("/")[0], 10.0) for s in symbols])[:, None]
+    close = p0 * np.exp(np.cumsum(rng.normal(0, 1, (S, bars)) * vol, axis=1))
+    open_ = np.concatenate([p0, close[:, :-1]], axis=1)
+    spread = np.abs(rng.normal(0, 1, (S, bars))) * vol * close
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    volume = rng.lognormal(10, 0.5, (S, bars)) / np.sqrt(p0)
+    end_ms = end_ms if end_ms is not None else int(time.time() * 1000) // tf_ms * tf_ms
+    return {
+        "symbols": list(symbols),
+        "ts": end_ms - (bars - 1 - np.arange(bars, dtype=np.int64)) * tf_ms,
+        "ohlcv": np.stack([open_, high, low, close, volume], axis=-1),
+    }
+
+
+def load_books(path=PAPER_BOOKS_PATH):
+    """
+    Libros grabados, una foto por línea: {"ts", "symbol", "bids", "asks"}.
+    Se guardan relativos al mid (forma del libro), no en precio absoluto.
+    """
+    books = {}
+    if not path or not os.path.exists(path):
+        return books
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+                bids, asks = rec["bids"][:BOOK_LEVELS], rec["asks"][:BOOK_LEVELS]
+                mid = (bids[0][0] + asks[0][0]) / 2
+            except (ValueError, KeyError, IndexError, TypeError):
+                continue
+            shape = (
+                [[p / mid, q * mid] for p, q in bids],  # precio relativo, tamaño en USD
+                [[p / mid, q * mid] for p, q in asks],
+            )
+            books.setdefault(rec["symbol"], []).append((int(rec["ts"]), shape))
+    for snaps in books.values():
+        snaps.sort(key=lambda s: s[0])
+    return books
+
+
+class PaperMarket:
+    """
+    Velas históricas reproducidas sobre el reloj: el "ahora" simulado arranca
+    en la vela WARMUP_BARS y avanza con `clock`. Compartido por gen y safe.
+    """
+
+    def __init__(self, history, clock=None, books=None, timeframe="1h", spread_bps=2.0):
+        self.clock = clock or ScaledClock()
+        self.timeframe = timeframe
+        self.tf_ms = TIMEFRAME_MS.get(timeframe, 3_600_000)
+        self.spread_bps = spread_bps
+        self.symbols = list(history["symbols"])
+        self._index = {s: i for i, s in enumerate(self.symbols)}
+        self.ohlcv = np.asarray(history["ohlcv"], dtype=np.float64)
+        ts = np.asarray(history["ts"], dtype=np.int64)
+        # Las velas se desplazan para que la WARMUP_BARS caiga en el "ahora" del reloj
+        start = min(WARMUP_BARS, len(ts) - 1)
+        self.offset = int(self.clock.now() * 1000) // self.tf_ms * self.tf_ms - int(ts[start])
+        self.ts = ts + self.offset
+        self.books = books or {}
+        self._book_ts = {s: [b[0] + self.offset for b in snaps] for s, snaps in self.books.items()}
+
+    @classmethod
+    def from_env(cls, symbols=None, clock=None, path=None):
+        """
+        Historia de candles.db si cubre los símbolos; si no, sintética. La ruta se
+        lee al llamar (no al importar candles), así el banco de __main__ la aísla.
+        """
+        import lullaby as strat
+
+        path = path or os.getenv("CANDLES_DB_PATH", CANDLES_DB_PATH)
+        symbols = symbols or strat.GENERATOR_COINS + [strat.TARGET_COIN]
+        history = None
+        if os.path.exists(path):
+            try:
+                from backtest import load_candles
+
+                history = load_candles(symbols, path)
+                faltan = set(symbols) - set(history["symbols"])
+                if faltan or len(history["ts"]) <= WARMUP_BARS:
+                    history = None
+            except Exception as e:
+                print(f"⚠️ Paper: sin historia en {path} ({e}), mercado sintético")
+        if history is None:
+            history = synthetic_history(symbols, bars=24 * 365)
+        return cls(history, clock=clock, books=load_books())
+
+    def now_ms(self):
+        return int(self.clock.now() * 1000)
+
+    def _row(self, symbol):
+        try:
+            return self._index[symbol]
+        except KeyError:
+            raise BadSymbol(f"paper: símbolo desconocido {symbol}")
+
+    def _bar(self, symbol, now_ms):
+        """(fila, índice de la vela en curso, fracción transcurrida)."""
+        i = self._row(symbol)
+        b = int(np.searchsorted(self.ts, now_ms, side="right")) - 1
+        b = min(max(b, 0), len(self.ts) - 1)
+        frac = min(1.0, max(0.0, (now_ms - self.ts[b]) / self.tf_ms))
+        return i, b, frac
+
+    def price(self, symbol, now_ms=None):
+        i, b, frac = self._bar(symbol, self.now_ms() if now_ms is None else now_ms)
+        o, c = self.ohlcv[i, b, 0], self.ohlcv[i, b, 3]
+        if not (math.isfinite(o) and math.isfinite(c)):  # hueco: último cierre conocido
+            closes = self.ohlcv[i, : b + 1, 3]
+            return float(closes[np.isfinite(closes)][-1])
+        return float(o + (c - o) * frac)
+
+    def ohlcv_bars(self, symbol, since=None, limit=500):
+        """Velas ccxt hasta el "ahora"; la última, abierta y parcial."""
+        now = self.now_ms()
+        i, b, frac = self._bar(symbol, now)
+        lo = b - limit + 1 if since is None else int(np.searchsorted(self.ts, since))
+        lo = max(0, lo)
+        hi = min(b + 1, lo + limit)
+        rows = self.ohlcv[i, lo:hi]
+        out = [[int(t), *r] for t, r in zip(self.ts[lo:hi].tolist(), rows.tolist())]
+        if out and hi == b + 1:
+            o, _, _, c, v = self.ohlcv[i, b].tolist()
+            p = o + (c - o) * frac
+            out[-1] = [int(self.ts[b]), o, max(o, p), min(o, p), p, v * frac]
+        return [r for r in out if math.isfinite(r[4])]
+
+    def book(self, symbol, limit=BOOK_LEVELS):
+        """Libro re-centrado en el precio actual (forma grabada o sintética)."""
+        now = self.now_ms()
+        mid = self.price(symbol, now)
+        snaps = self.books.get(symbol)
+        if snaps:
+            k = max(0, bisect_right(self._book_ts[symbol], now) - 1)
+            rel_bids, rel_asks = snaps[k][1]
+            bids = [[mid * p, usd / (mid * p)] for p, usd in rel_bids[:limit]]
+            asks = [[mid * p, usd / (mid * p)] for p, usd in rel_asks[:limit]]
+        else:
+            i, b, _ = self._bar(symbol, now)
+            usd_hour = float(np.nan_to_num(self.ohlcv[i, b, 4])) * mid
+            depth = max(usd_hour / 200, 500.0)  # USD en el primer nivel
+            half = mid * self.spread_bps / 20_000
+            bids, asks = [], []
+            for k in range(limit):
+                step = mid * 0.0002 * k
+                size = depth * (1.25**k) / mid
+                bids.append([mid - half - step, size])
+                asks.append([mid + half + step, size])
+        return {"symbol": symbol, "bids": bids, "asks": asks, "timestamp": now, "nonce": None}
+
+
+# =========================
+# EXCHANGE
+# =========================
+
+
+def parse_balances(spec):
+    """"USDT:1000,BTC:0.01" → {"USDT": 1000.0, "BTC": 0.01}"""
+    out = {}
+    for part in (spec or "").split(","):
+        if ":" in part:
+            k, v = part.split(":", 1)
+            out[k.strip().upper()] = float(v)
+    return out
+
+
+class PaperExchange:
+    _ids = itertools.count(1)
+
+    def __init__(self, name, market, balances=None, fee=PAPER_FEE, latency_ms=PAPER_LATENCY_MS):
+        self.id = name
+        self.market = market
+        self.fee = fee
+        self.latency_ms = latency_ms
+        self.enableRateLimit = False
+        self.last_response_headers = {}
+        self.markets = {s: self._market_info(s) for s in market.symbols}
+        self.currencies = {}
+        self.peer = None  # exchange que recibe las retiradas (puente gen → safe)
+        self.orders = {}  # {símbolo: [orden ccxt, ...]}
+        self.withdrawals = []
+        self._free = dict(balances or {})
+        self._lock = threading.Lock()
+        self._weight = [0, 0]  # [minuto, peso usado]
+
+    def _market_info(self, symbol):
+        base, quote = symbol.split("/")
+        p = self.market.price(symbol)
+        # Paso de cantidad de ~1 USD como en Binance (BTC 1e-5, SOL 1e-3, PEPE 1)
+        step = min(1.0, 10 ** math.floor(math.log10(1.0 / p))) if p > 0 else 1e-8
+        return {
+            "symbol": symbol,
+            "base": base,
+            "quote": quote,
+            "precision": {"amount": step},
+            "limits": {"cost": {"min": MIN_NOTIONAL}},
+        }
+
+    def link(self, other):
+        """Las retiradas de este exchange llegan al otro (y viceversa)."""
+        self.peer, other.peer = other, self
+        return self
+
+    # ---------- transporte ----------
+
+    def request(self, path, api="public", method="GET", params=None, headers=None, body=None):
+        if self.latency_ms:
+            time.sleep(random.lognormvariate(math.log(self.latency_ms), 0.35) / 1000)
+        minute = self.market.now_ms() // 60_000
+        with self._lock:
+            if self._weight[0] != minute:
+                self._weight = [minute, 0]
+            self._weight[1] += request_weight(path, params)
+            self.last_response_headers = {"x-mbx-used-weight-1m": str(self._weight[1])}
+        return getattr(self, "_h_" + path.replace("/", "_"))(**(params or {}))
+
+    def set_sandbox_mode(self, enabled):
+        return None
+
+    def load_markets(self, reload=False):
+        return self.markets
+
+    def close(self):
+        return None
+
+    # ---------- mercado ----------
+
+    def fetch_time(self, params=None):
+        return self.market.now_ms()
+
+    def fetch_ohlcv(self, symbol, timeframe="1h", since=None, limit=None, params=None):
+        args = {"symbol": symbol, "since": since, "limit": limit if limit and limit > 0 else 500}
+        return self.request("klines", "public", "GET", args)
+
+    def _h_klines(self, symbol, since=None, limit=500):
+        return self.market.ohlcv_bars(symbol, since, limit)
+
+    def fetch_order_book(self, symbol, limit=None, params=None):
+        return self.request("depth", "public", "GET", {"symbol": symbol, "limit": limit or 100})
+
+    def _h_depth(self, symbol, limit=100):
+        return self.market.book(symbol, min(limit, BOOK_LEVELS))
+
+    def fetch_ticker(self, symbol, params=None):
+        return self.request("ticker/24hr", "public", "GET", {"symbol": symbol})
+
+    def fetch_tickers(self, symbols=None, params=None):
+        return self.request("ticker/24hr", "public", "GET", {"symbols": symbols})
+
+    def _h_ticker_24hr(self, symbol=None, symbols=None):
+        if symbol is not None:
+            return self._ticker(symbol)
+        wanted = symbols or self.market.symbols
+        return {s: self._ticker(s) for s in wanted if s in self.markets}
+
+    def _ticker(self, symbol):
+        bars = self.market.ohlcv_bars(symbol, limit=24)
+        book = self.market.book(symbol, 1)
+        last = bars[-1][4] if bars else self.market.price(symbol)
+        return {
+            "symbol": symbol,
+            "timestamp": self.market.now_ms(),
+            "last": last,
+            "close": last,
+            "bid": book["bids"][0][0],
+            "ask": book["asks"][0][0],
+            "open": bars[0][1] if bars else last,
+            "high": max(b[2] for b in bars) if bars else last,
+            "low": min(b[3] for b in bars) if bars else last,
+            "baseVolume": sum(b[5] for b in bars),
+            "quoteVolume": sum(b[5] * b[4] for b in bars),
+        }
+
+    # ---------- cuenta ----------
+
+    def fetch_balance(self, params=None):
+        return self.request("account", "private", "GET", {})
+
+    def _h_account(self):
+        with self._lock:
+            free = {k: v for k, v in self._free.items() if v}
+        balance = {"info": {}, "free": dict(free), "used": {k: 0.0 for k in free}}
+        balance["total"] = dict(free)
+        for k, v in free.items():
+            balance[k] = {"free": v, "used": 0.0, "total": v}
+        return balance
+
+    def amount_to_precision(self, symbol, amount):
+        step = self.markets[symbol]["precision"]["amount"] if symbol in self.markets else 1e-8
+        decimals = max(0, -int(round(math.log10(step))))
+        q = math.floor(float(amount) / step + 1e-9) * step
+        return f"{q:.{decimals}f}"
+
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        args = {"symbol": symbol, "type": type, "side": side, "amount": amount, "price": price}
+        return self.request("order", "private", "POST", args)
+
+    def create_market_order(self, symbol, side, amount, price=None, params=None):
+        return self.create_order(symbol, "market", side, amount, price, params)
+
+    def create_market_buy_order(self, symbol, amount, params=None):
+        return self.create_order(symbol, "market", "buy", amount, None, params)
+
+    def create_market_sell_order(self, symbol, amount, params=None):
+        return self.create_order(symbol, "market", "sell", amount, None, params)
+
+    def _h_order(self, symbol, type, side, amount, price=None):
+        if type != "market":
+            raise InvalidOrder("paper: solo órdenes a mercado")
+        market = self.markets.get(symbol)
+        if market is None:
+            raise BadSymbol(f"paper: símbolo desconocido {symbol}")
+        qty = float(self.amount_to_precision(symbol, amount))
+        book = self.market.book(symbol)
+        filled, cost = self._walk(book["asks"] if side == "buy" else book["bids"], qty)
+        if cost < MIN_NOTIONAL:
+            raise InvalidOrder(f"paper: {symbol} nocional {cost:.2f} < {MIN_NOTIONAL}")
+        base, quote = market["base"], market["quote"]
+
+        with self._lock:
+            if side == "buy":
+                if self._free.get(quote, 0.0) + 1e-9 < cost:
+                    raise InsufficientFunds(f"paper: {quote} insuficiente para {cost:.2f}")
+                fee = {"cost": filled * self.fee, "currency": base}
+                self._free[quote] = self._free.get(quote, 0.0) - cost
+                self._free[base] = self._free.get(base, 0.0) + filled - fee["cost"]
+            else:
+                if self._free.get(base, 0.0) + 1e-12 < filled:
+                    raise InsufficientFunds(f"paper: {base} insuficiente para {filled}")
+                fee = {"cost": cost * self.fee, "currency": quote}
+                self._free[base] = self._free.get(base, 0.0) - filled
+                self._free[quote] = self._free.get(quote, 0.0) + cost - fee["cost"]
+            now = self.market.now_ms()
+            order = {
+                "id": str(next(self._ids)),
+                "timestamp": now,
+                "datetime": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now / 1000)),
+                "symbol": symbol,
+                "type": "market",
+                "side": side,
+                "price": cost / filled,
+                "average": cost / filled,
+                "amount": qty,
+                "filled": filled,
+                "remaining": 0.0,
+                "cost": cost,
+                "status": "closed",
+                "fee": fee,
+            }
+            self.orders.setdefault(symbol, []).append(order)
+        return dict(order)
+
+    def _walk(self, levels, qty):
+        """Consume niveles del libro; lo que no cabe se llena 10 bps peor que el último."""
+        left, cost = qty, 0.0
+        for p, q in levels:
+            take = min(left, q)
+            cost += take * p
+            left -= take
+            if left <= 0:
+                break
+        if left > 0 and levels:
+            worse = 1.001 if levels[0][0] <= levels[-1][0] else 0.999
+            cost += left * levels[-1][0] * worse
+        return qty, cost
+
+    def fetch_orders(self, symbol=None, since=None, limit=None, params=None):
+        args = {"symbol": symbol, "since": since, "limit": limit}
+        return self.request("allOrders", "private", "GET", args)
+
+    def _h_allOrders(self, symbol=None, since=None, limit=None):
+        with self._lock:
+            if symbol is None:
+                orders = sorted(
+                    (o for lst in self.orders.values() for o in lst), key=lambda o: o["timestamp"]
+                )
+            else:
+                orders = list(self.orders.get(symbol, []))
+        if since is not None:
+            orders = [o for o in orders if o["timestamp"] >= since]
+        return [dict(o) for o in (orders[-limit:] if limit else orders)]
+
+    def fetch_my_trades(self, symbol=None, since=None, limit=None, params=None):
+        args = {"symbol": symbol, "since": since, "limit": limit}
+        return self.request("myTrades", "private", "GET", args)
+
+    def _h_myTrades(self, symbol=None, since=None, limit=None):
+        """Cada orden a mercado se llena de una vez: un trade por orden."""
+        trades = []
+        for o in self._h_allOrders(symbol, since, limit):
+            t = {k: o[k] for k in ("timestamp", "datetime", "symbol", "side", "cost", "fee")}
+            t.update(id=f"t{o['id']}", order=o["id"], price=o["average"], amount=o["filled"])
+            trades.append(t)
+        return trades
+
+    def withdraw(self, code, amount, address=None, tag=None, params=None):
+        args = {"code": code, "amount": amount, "address": address}
+        return self.request("capital/withdraw/apply", "sapi", "POST", args)
+
+    def _h_capital_withdraw_apply(self, code, amount, address=None):
+        amount = float(amount)
+        fee = WITHDRAW_FEE.get(code, 0.0)
+        with self._lock:
+            if self._free.get(code, 0.0) + 1e-9 < amount:
+                raise InsufficientFunds(f"paper: {code} insuficiente para retirar {amount}")
+            self._free[code] -= amount
+            tx = {
+                "id": f"w{next(self._ids)}",
+                "timestamp": self.market.now_ms(),
+                "currency": code,
+                "amount": amount,
+                "fee": {"cost": fee, "currency": code},
+                "address": address,
+                "status": "ok",
+            }
+            self.withdrawals.append(tx)
+        if self.peer is not None and amount > fee:
+            self.peer.deposit(code, amount - fee)
+        return dict(tx)
+
+    def deposit(self, code, amount):
+        with self._lock:
+            self._free[code] = self._free.get(code, 0.0) + float(amount)
+
+
+def paper_pair(safe_id="coinex", clock=None):
+    """gen + safe simulados sobre un mismo mercado, con el puente enlazado."""
+    market = PaperMarket.from_env(clock=clock)
+    gen = PaperExchange("binance", market, parse_balances(PAPER_GEN_BALANCE))
+    safe = PaperExchange(safe_id, market, parse_balances(PAPER_SAFE_BALANCE))
+    gen.link(safe)
+    return gen, safe
+
+
+if __name__ == "__main__":
+    import argparse
+    import tempfile
+
+    parser = argparse.ArgumentParser(description="Banco del ciclo del gestor sobre PaperExchange")
+    parser.add_argument("--cycles", type=int, default=1000)
+    parser.add_argument("--speed", type=float, default=100.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    # Entorno aislado: velas en un temporal, sin stream ni transporte asíncrono
+    os.environ.update(PAPER_TRADING="1", PAPER_SPEED=str(args.speed), MARKET_STREAM="0")
+    os.environ["PAPER_LATENCY_MS"] = str(args.latency_ms)
+    os.environ.setdefault("CANDLES_DB_PATH", os.path.join(tempfile.mkdtemp(), "candles.db"))
+    import lullaby as strat
+    from connection import DualExchangeManager
+
+    conn = DualExchangeManager(testnet=False)
+    rng = random.Random(7)
+    t0 = time.perf_counter()
+    for n in range(args.cycles):
+        conn.begin_cycle()
+        bars = conn.prefetch_cycle(strat.GENERATOR_COINS, limit=200, safe=n % 10 == 0)
+        prices = {s: b[-1][4] for s, b in bars.items() if b}
+        equity = conn.get_total_equity_usd(prices)
+        sym = rng.choice(strat.GENERATOR_COINS)
+        held = conn.get_balance(conn.gen)["total"].get(sym.split("/")[0], 0.0)
+        try:
+            if held * prices[sym] > 15:
+                conn.gen.create_market_order(sym, "sell", conn.gen.amount_to_precision(sym, held))
+            else:
+                qty = conn.gen.amount_to_precision(sym, 20.0 / prices[sym])
+                conn.gen.create_market_order(sym, "buy", qty)
+        except Exception:
+            pass
+    dt = time.perf_counter() - t0
+    print(f"🧪 {args.cycles} ciclos en {dt:.2f}s → {args.cycles / dt * 60:,.0f} ciclos/min")
+    print(f"   equity simulado: {equity:.2f} USDT")
+    print(f"   órdenes: {sum(len(v) for v in conn.gen.orders.values())}")
@@ -0,0 +1,147 @@
+"""
+LULA PIPELINE v1.0 — CONTEXTO CONCURRENTE + COLA DE ÓRDENES EN SEGUNDO PLANO
+1) Contexto de mercado de todos los activos en paralelo (imbalance + riesgo).
+2) Decisiones en memoria en el hilo principal.
+3) Órdenes (TWAP incluido) en un worker aparte: un TWAP de 5 min ya no congela
+   la evaluación de riesgo del resto de monedas.
+Los resultados vuelven al hilo principal con `drain()`, así el Guardian solo se
+modifica desde un hilo.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# =========================
+# FASE 1 — CONTEXTO CONCURRENTE
+# =========================
+
+
+def gather_contexts(connection, guardian, analyzed_assets, max_workers=8):
+    """
+    Devuelve {symbol: (imb, ok_risk, risk_msg, riesgo_n)} para todos los activos.
+    Con los libros ya cacheados por ciclo esto no toca la red; si alguno caducó,
+    las descargas se solapan en lugar de ir en serie.
+    """
+
+    def ctx(asset):
+        symbol = asset["symbol"]
+        try:
+            imb = connection.get_smart_imbalance(symbol)
+        except Exception:
+            imb = 0
+        try:
+            ok_risk, risk_msg, riesgo_n = guardian.analizar_riesgo(
+                connection,
+                symbol,
+                asset["bars"],
+                (asset["prob"], asset["rsi"], asset["price"], asset["rvol"]),
+            )
+        except Exception:
+            ok_risk, risk_msg, riesgo_n = False, "ERR", 70
+        return symbol, (imb, ok_risk, risk_msg, riesgo_n)
+
+    if not analyzed_assets:
+        return {}
+    workers = max(1, min(max_workers, len(analyzed_assets)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(ctx, analyzed_assets))
+
+
+# =========================
+# FASE 3 — WORKER DE ÓRDENES
+# =========================
+
+
+class OrderJob:
+    __slots__ = ("symbol", "label", "fn", "args", "meta", "ejecutado", "error", "ts")
+
+    def __init__(self, symbol, label, fn, args, meta):
+        self.symbol = symbol
+        self.label = label
+        self.fn = fn
+        self.args = args
+        self.meta = meta or {}
+        self.ejecutado = 0.0
+        self.error = None
+        self.ts = time.time()
+
+
+class OrderWorker:
+    """
+    Cola FIFO de órdenes ejecutadas por N hilos en segundo plano.
+
+        worker.submit("SOL/USDT", "T1", strat.execute_twap, connection, "SOL/USDT", 50, price)
+        ...
+        for job in worker.drain():   # en el hilo principal
+            aplicar(job)
+    """
+
+    def __init__(self, n_threads=2, on_done=None):
+        self.n_threads = n_threads
+        self.on_done = on_done  # callback(job) desde el hilo del worker (p.ej. evento "fill")
+        self._jobs = queue.Queue()
+        self._done = queue.Queue()
+        self._inflight = {}  # {symbol: nº de órdenes pendientes, en curso o sin recoger}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.n_threads):
+            t = threading.Thread(target=self._loop, name=f"lula-orders-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def _loop(self):
+        while True:
+            job = self._jobs.get()
+            try:
+                job.ejecutado = float(job.fn(*job.args) or 0.0)
+            except Exception as e:
+                job.error = e
+                print(f"⚠️ Error en orden {job.label} {job.symbol}: {e}")
+            finally:
+                # Sigue "en vuelo" hasta que drain() la entrega al hilo principal
+                self._done.put(job)
+                self._jobs.task_done()
+                if self.on_done is not None:
+                    try:
+                        self.on_done(job)
+                    except Exception:
+                        pass
+
+    def submit(self, symbol, label, fn, *args, meta=None):
+        job = OrderJob(symbol, label, fn, args, meta)
+        with self._lock:
+            self._inflight[symbol] = self._inflight.get(symbol, 0) + 1
+        self._jobs.put(job)
+        return job
+
+    def busy(self, symbol):
+        """
+        ¿Hay una orden de este símbolo en cola, ejecutándose o terminada sin recoger?
+        Una terminada aún no está en el Guardian ni en el saldo del ciclo: comprar
+        otra vez sería duplicar la entrada.
+        """
+        with self._lock:
+            return symbol in self._inflight
+
+    def pending(self):
+        with self._lock:
+            return dict(self._inflight)
+
+    def drain(self):
+        """Órdenes terminadas desde la última llamada (para aplicarlas en el hilo principal)."""
+        done = []
+        while True:
+            try:
+                job = self._done.get_nowait()
+            except queue.Empty:
+                return done
+            with self._lock:
+                self._inflight[job.symbol] -= 1
+                if self._inflight[job.symbol] <= 0:
+                    del self._inflight[job.symbol]
+            done.append(job)
@@ -0,0 +1,254 @@
+"""
+LULA SCANNER v1.0 — UNIVERSO DINÁMICO EN DOS ETAPAS
+Etapa 1 (barata): UNA foto de tickers 24h de todos los pares USDT de Binance y un
+filtro vectorizado (volumen, spread, volatilidad) que puntúa cientos de pares.
+Etapa 2 (cara): solo los top-K pasan a velas, libro e inferencia NPU, como los
+15 de GENERATOR_COINS hoy. Con histéresis (se entra por el top-K, se sale al
+caer por debajo de EXIT_RANK o tras MIN_DWELL escaneos) el conjunto es estable.
+
+    scanner = UniverseScanner()
+    scanner.refresh(connection.gen)            # cada SCAN_EVERY_SEC como mucho
+    universo = scanner.universe(pinned=guardian.posiciones)
+
+Las posiciones abiertas siempre se evalúan (fijadas), aunque salgan del top-K.
+Con `allowed` (los símbolos con scaler entrenado, brain.scalers) solo entran pares
+que el modelo sabe escalar; el resto se queda en la etapa 1.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+import metrics
+from journal import atomic_write_json
+from lullaby import GENERATOR_COINS, TARGET_COIN
+
+SCAN_TOP_K = int(os.getenv("SCAN_TOP_K", 15))
+SCAN_EXIT_RANK = int(os.getenv("SCAN_EXIT_RANK", 0)) or None  # None → 2 × top-K
+SCAN_EVERY_SEC = float(os.getenv("SCAN_EVERY_SEC", 900))
+SCAN_MIN_DWELL = int(os.getenv("SCAN_MIN_DWELL", 4))  # escaneos mínimos dentro tras entrar
+UNIVERSE_PATH = "/app/data/universe.json"
+
+QUOTE = "USDT"
+MIN_QUOTE_VOLUME = float(os.getenv("SCAN_MIN_VOLUME", 5e6))  # USDT negociados en 24 h
+MAX_SPREAD_BPS = float(os.getenv("SCAN_MAX_SPREAD_BPS", 15))
+MIN_RANGE = 0.01  # rango 24h / precio: sin movimiento no hay operación
+MAX_RANGE = 0.35  # ...y por encima es un pump, no una tendencia
+
+# Pesos del score de la etapa 1 (sobre z-scores del universo elegible)
+W_VOLUME = 1.0
+W_RANGE = 1.0
+W_SPREAD = 0.5
+
+STABLES = {"USDC", "FDUSD", "TUSD", "BUSD", "DAI", "USDP", "USDD", "PYUSD", "EUR", "AEUR"}
+LEVERAGED = ("UP", "DOWN", "BULL", "BEAR")
+
+
+def _excluded(symbol):
+    base = symbol.split("/")[0]
+    if base in STABLES or symbol == TARGET_COIN:
+        return True
+    return any(base.endswith(x) and len(base) > len(x) + 2 for x in LEVERAGED)
+
+
+def _z(x):
+    sd = x.std()
+    return (x - x.mean()) / sd if sd > 0 else np.zeros_like(x)
+
+
+def ticker_arrays(tickers, markets=None, quote=QUOTE):
+    """
+    Pares spot activos contra `quote` → (símbolos, matriz (N, 5)):
+    [volumen_quote, bid, ask, last, rango_24h]. Campos ausentes → NaN.
+    """
+    symbols, rows = [], []
+    for symbol, t in tickers.items():
+        if not symbol.endswith("/" + quote) or _excluded(symbol):
+            continue
+        if markets is not None:
+            m = markets.get(symbol)
+            if m is None or m.get("active") is False or m.get("spot") is False:
+                continue
+        last = t.get("last") or t.get("close")
+        if not last:
+            continue
+        qv = t.get("quoteVolume")
+        if qv is None and t.get("baseVolume") is not None:
+            qv = t["baseVolume"] * last
+        high, low, opn = t.get("high"), t.get("low"), t.get("open")
+        if high and low:
+            rng = (high - low) / last
+        elif opn:
+            rng = abs(last - opn) / opn
+        else:
+            rng = None
+        symbols.append(symbol)
+        rows.append([qv, t.get("bid"), t.get("ask"), last, rng])
+    data = np.array(rows, dtype=float).reshape(-1, 5)  # None → NaN
+    return symbols, data
+
+
+def prefilter(symbols, data):
+    """
+    Etapa 1: filtro y score vectorizados. Devuelve [(símbolo, score)] de mayor
+    a menor, solo con los pares que pasan volumen, spread y rango.
+    """
+    if not symbols:
+        return []
+    qv, bid, ask, last, rng = data.T
+    mid = np.where((bid > 0) & (ask > 0), (bid + ask) / 2, last)
+    spread_bps = np.where((bid > 0) & (ask >= bid), (ask - bid) / mid * 1e4, np.nan)
+    with np.errstate(invalid="ignore"):
+        ok = (
+            (qv >= MIN_QUOTE_VOLUME)
+            & (spread_bps <= MAX_SPREAD_BPS)
+            & (rng >= MIN_RANGE)
+            & (rng <= MAX_RANGE)
+        )
+    if not ok.any():
+        return []
+    idx = np.flatnonzero(ok)
+    # El spread entra en log (1 pb mínimo): 1→2 pb pesa lo mismo que 5→10 pb
+    score = (
+        W_VOLUME * _z(np.log(qv[idx]))
+        + W_RANGE * _z(rng[idx])
+        - W_SPREAD * _z(np.log(np.maximum(spread_bps[idx], 1.0)))
+    )
+    order = np.argsort(-score, kind="stable")
+    return [(symbols[idx[i]], float(score[i])) for i in order]
+
+
+class UniverseScanner:
+    def __init__(
+        self,
+        base=None,
+        top_k=SCAN_TOP_K,
+        exit_rank=SCAN_EXIT_RANK,
+        min_dwell=SCAN_MIN_DWELL,
+        every=SCAN_EVERY_SEC,
+        path=UNIVERSE_PATH,
+        clock=time.time,
+        allowed=None,
+    ):
+        self.top_k = top_k
+        self.exit_rank = exit_rank or 2 * top_k
+        self.min_dwell = min_dwell
+        self.every = every
+        self.path = path
+        self.clock = clock
+        self.allowed = set(allowed) if allowed is not None else None
+        self.scores = {}  # último score de la etapa 1 por símbolo
+        self.scanned = 0  # pares vistos en la última foto
+        self.last_scan = 0.0
+        self.changes = []  # [(+/-, símbolo)] del último escaneo
+        # {símbolo: escaneos dentro}; arranque: lo guardado o la lista fija, ya asentados
+        base = [s for s in (base or GENERATOR_COINS) if self._eligible(s)]
+        self._dwell = {s: min_dwell for s in base[:top_k]}
+        self._load()
+
+    # ---------- etapa 2: conjunto activo con histéresis ----------
+
+    @property
+    def active(self):
+        return list(self._dwell)
+
+    def _eligible(self, symbol):
+        return self.allowed is None or symbol in self.allowed
+
+    def update(self, ranked):
+        """
+        ranked: [(símbolo, score)] de la etapa 1. Los activos siguen mientras estén
+        por encima de exit_rank (o no hayan cumplido min_dwell); los huecos se
+        llenan por orden con los que entran en el top-K.
+        """
+        if not ranked:
+            return self.active  # sin foto (fallo de red): no tocamos nada
+        ranked = [(s, sc) for s, sc in ranked if self._eligible(s)]
+        rank = {s: i for i, (s, _) in enumerate(ranked)}
+        self.scores = dict(ranked)
+        keep = {
+            s: n + 1
+            for s, n in self._dwell.items()
+            if rank.get(s, len(rank)) < self.exit_rank or (n < self.min_dwell and s in rank)
+        }
+        if len(keep) > self.top_k:  # top-K reducido en caliente: salen los peores
+            keep = dict(sorted(keep.items(), key=lambda kv: rank[kv[0]])[: self.top_k])
+        for s, _ in ranked[: self.top_k]:
+            if len(keep) >= self.top_k:
+                break
+            keep.setdefault(s, 0)
+        self.changes = [("+", s) for s in keep if s not in self._dwell]
+        self.changes += [("-", s) for s in self._dwell if s not in keep]
+        self._dwell = dict(sorted(keep.items(), key=lambda kv: rank.get(kv[0], len(rank))))
+        return self.active
+
+    def universe(self, pinned=()):
+        """Activos del escáner + fijados (posiciones abiertas), sin duplicados."""
+        out = self.active
+        out += [s for s in pinned if s not in self._dwell and s != TARGET_COIN]
+        return out
+
+    # ---------- refresco ----------
+
+    def due(self):
+        return self.clock() - self.last_scan >= self.every
+
+    def refresh(self, ex, force=False):
+        """Una foto de tickers (1 petición) → etapa 1 → etapa 2. Respeta la cadencia."""
+        if not (force or self.due()):
+            return self.active
+        self.last_scan = self.clock()
+        try:
+            tickers = ex.fetch_tickers()
+        except Exception as e:
+            print(f"⚠️ Escáner: sin tickers ({e}), mantengo el universo")
+            return self.active
+        symbols, data = ticker_arrays(tickers, getattr(ex, "markets", None))
+        self.scanned = len(symbols)
+        active = self.update(prefilter(symbols, data))
+        if self.changes:
+            cambios = " ".join(f"{op}{s.split('/')[0]}" for op, s in self.changes)
+            print(f"🔭 Universo ({self.scanned} pares): {cambios}")
+            self._save()
+        return active
+
+    def status(self):
+        return {
+            "activos": self.active,
+            "escaneados": self.scanned,
+            "ultimo": self.last_scan,
+            "scores": {s: round(self.scores.get(s, 0.0), 3) for s in self._dwell},
+        }
+
+    # ---------- persistencia ----------
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            atomic_write_json(self.path, {"dwell": self._dwell, "ts": self.last_scan})
+        except Exception as e:
+            print(f"⚠️ Error guardando universo: {e}")
+
+    def _load(self):
+        """Arranque en caliente: el universo del último escaneo (no se reinicia a la lista fija)."""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r") as f:
+                saved = json.load(f)
+            dwell = {
+                s: int(n) for s, n in saved.get("dwell", {}).items() if self._eligible(s)
+            }
+        except Exception as e:
+            print(f"⚠️ Universo guardado ilegible: {e}")
+            return
+        if dwell:
+            self._dwell = dwell
+            self.last_scan = float(saved.get("ts", 0.0))
+
+
+metrics.instrument(UniverseScanner, "scanner", names=("refresh",))
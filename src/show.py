@@ -131,7 +131,7 @@ def print_boot_sequence():
 
 
 def print_ui_header(vix, dxy, fng, cycle, total_equity, equity_init):
-    now = time.strftime("%H:%M:%S")
+    now = time.strftime("%H:%M:%S", time.localtime(time.time()))
 
     # Cálculo de rendimiento
     ganancia = total_equity - equity_init
@@ -268,7 +268,13 @@ def ansi_to_html(text):
     return text
 
 
+# El panel se sirve desde memoria (dashboard.py); el index.html en disco es opcional
+WRITE_HTML = os.getenv("DASHBOARD_WRITE_HTML", "0") == "1"
+
+
 def update_web_dashboard(content=""):
+    if not WRITE_HTML:
+        return
     try:
         path = "/app/data/index.html"
         html_colored_content = ansi_to_html(content)
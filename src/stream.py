@@ -0,0 +1,298 @@
+"""
+LULA STREAM v1.0 — MOTOR DE DATOS EN VIVO (WEBSOCKETS)
+Mantiene en memoria velas, libro de órdenes y ticker de cada símbolo a partir de
+los streams combinados de Binance. Corre en su propio hilo con un loop asyncio y
+se lee de forma síncrona desde connection.py.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+
+try:
+    import websockets
+except ImportError:  # El bot sigue funcionando por REST sin la librería
+    websockets = None
+
+BINANCE_WS_URL = "wss://stream.binance.com:9443/stream?streams="
+BINANCE_TESTNET_WS_URL = "wss://testnet.binance.vision/stream?streams="
+
+
+def to_stream_id(symbol):
+    """'BTC/USDT' → 'btcusdt'"""
+    return symbol.replace("/", "").lower()
+
+
+class LiveView:
+    """Foto en memoria de un símbolo. Cada campo guarda su propio timestamp."""
+
+    __slots__ = ("klines", "book", "ticker", "ts_kline", "ts_book", "ts_ticker")
+
+    def __init__(self):
+        self.klines = deque(maxlen=3)  # [[ts, o, h, l, c, v], ...] últimas velas vistas
+        self.book = None  # {"bids": [[p, q], ...], "asks": [[p, q], ...]}
+        self.ticker = None  # {"last": x, "bid": x, "ask": x, "quoteVolume": x}
+        self.ts_kline = 0.0
+        self.ts_book = 0.0
+        self.ts_ticker = 0.0
+
+
+class MarketStream:
+    """
+    Feed websocket (kline + depth + ticker) con reconexión automática.
+
+    Uso:
+        stream = MarketStream(["BTC/USDT", "ETH/USDT"])
+        stream.start()
+        stream.get_book("BTC/USDT", max_age=5)
+    """
+
+    def __init__(self, symbols, timeframe="1h", depth=20, url=None, testnet=False):
+        self.symbols = list(symbols)
+        self.timeframe = timeframe
+        self.depth = depth
+        self.url = url or (BINANCE_TESTNET_WS_URL if testnet else BINANCE_WS_URL)
+        self.views = {s: LiveView() for s in self.symbols}
+        self._by_id = {to_stream_id(s): s for s in self.symbols}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._running = False
+        self.connected = False
+        self.frames = 0
+
+    # =========================
+    # CICLO DE VIDA
+    # =========================
+
+    def start(self):
+        if websockets is None:
+            print("⚠️ websockets no instalado: datos de mercado por REST.")
+            return False
+        if self._thread and self._thread.is_alive():
+            return True
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="lula-stream", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._consume())
+        finally:
+            self._loop.close()
+
+    def _streams_url(self):
+        if self.url.rstrip("/").endswith("streams="):
+            names = []
+            for sid in self._by_id:
+                names += [
+                    f"{sid}@kline_{self.timeframe}",
+                    f"{sid}@depth{self.depth}@100ms",
+                    f"{sid}@ticker",
+                ]
+            return self.url + "/".join(names)
+        return self.url
+
+    async def _consume(self):
+        backoff = 1.0
+        while self._running:
+            try:
+                async with websockets.connect(self._streams_url(), ping_interval=20) as ws:
+                    self.connected = True
+                    with self._lock:  # lo anterior al corte puede no enlazar con lo nuevo
+                        for view in self.views.values():
+                            view.klines.clear()
+                    backoff = 1.0
+                    while self._running:
+                        try:
+                            raw = await asyncio.wait_for(ws.recv(), timeout=1.0)
+                        except asyncio.TimeoutError:
+                            continue
+                        self.handle_frame(raw)
+            except Exception as e:
+                if self._running:
+                    print(f"⚠️ Stream caído ({type(e).__name__}). Reconectando en {backoff:.0f}s")
+            finally:
+                self.connected = False
+            if self._running:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    # =========================
+    # PARSEO DE MENSAJES
+    # =========================
+
+    def handle_frame(self, raw):
+        """Aplica un frame combinado de Binance ({"stream": ..., "data": ...})."""
+        try:
+            msg = json.loads(raw) if isinstance(raw, (str, bytes)) else raw
+            stream = msg.get("stream", "")
+            data = msg.get("data", msg)
+            symbol = self._by_id.get(stream.split("@")[0])
+            if symbol is None and "s" in data:
+                symbol = self._by_id.get(data["s"].lower())
+            if symbol is None:
+                return
+        except Exception:
+            return
+
+        now = time.time()
+        view = self.views[symbol]
+        with self._lock:
+            self.frames += 1
+            if "@kline" in stream or data.get("e") == "kline":
+                k = data["k"]
+                bar = [
+                    int(k["t"]),
+                    float(k["o"]),
+                    float(k["h"]),
+                    float(k["l"]),
+                    float(k["c"]),
+                    float(k["v"]),
+                ]
+                if view.klines and view.klines[-1][0] == bar[0]:
+                    view.klines[-1] = bar
+                else:
+                    view.klines.append(bar)
+                view.ts_kline = now
+            elif "@depth" in stream or "bids" in data:
+                view.book = {
+                    "bids": [[float(p), float(q)] for p, q in data.get("bids", [])],
+                    "asks": [[float(p), float(q)] for p, q in data.get("asks", [])],
+                }
+                view.ts_book = now
+            elif "@ticker" in stream or data.get("e") == "24hrTicker":
+                view.ticker = {
+                    "last": float(data["c"]),
+                    "bid": float(data.get("b", 0) or 0),
+                    "ask": float(data.get("a", 0) or 0),
+                    "quoteVolume": float(data.get("q", 0) or 0),
+                }
+                view.ts_ticker = now
+
+    # =========================
+    # LECTURAS SÍNCRONAS
+    # =========================
+
+    def get_book(self, symbol, max_age=10.0):
+        view = self.views.get(symbol)
+        with self._lock:
+            if view is None or view.book is None or time.time() - view.ts_book > max_age:
+                return None
+            return {"bids": list(view.book["bids"]), "asks": list(view.book["asks"])}
+
+    def get_last_price(self, symbol, max_age=30.0):
+        view = self.views.get(symbol)
+        with self._lock:
+            if view is None:
+                return None
+            if view.ticker and time.time() - view.ts_ticker <= max_age:
+                return view.ticker["last"]
+            if view.klines and time.time() - view.ts_kline <= max_age:
+                return view.klines[-1][4]
+        return None
+
+    def get_klines(self, symbol, max_age=30.0):
+        """Últimas velas vistas por el stream (incluye la vela abierta)."""
+        view = self.views.get(symbol)
+        with self._lock:
+            if view is None or not view.klines or time.time() - view.ts_kline > max_age:
+                return []
+            return [list(b) for b in view.klines]
+
+
+# =========================
+# SERVIDOR DE REPETICIÓN (OFFLINE)
+# =========================
+
+
+class ReplayServer:
+    """
+    Servidor websocket local que reproduce frames grabados (un JSON por línea).
+    Sirve para probar MarketStream sin conexión:
+
+        server = ReplayServer("frames.jsonl", port=8765)
+        server.start()
+        MarketStream(symbols, url=server.url).start()
+    """
+
+    def __init__(self, frames_path, host="127.0.0.1", port=8765, interval=0.0, loop=False):
+        self.frames_path = frames_path
+        self.host = host
+        self.port = port
+        self.interval = interval
+        self.repeat = loop
+        self.url = f"ws://{host}:{port}/stream"
+        self._ready = threading.Event()
+        self._stop = None
+        self._loop = None
+        self._thread = None
+
+    def _frames(self):
+        with open(self.frames_path, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+
+    async def _handler(self, ws, *_):
+        frames = self._frames()
+        while True:
+            for raw in frames:
+                await ws.send(raw)
+                if self.interval:
+                    await asyncio.sleep(self.interval)
+            if not self.repeat:
+                break
+        await ws.wait_closed()
+
+    async def _serve(self):
+        self._stop = asyncio.Event()
+        async with websockets.serve(self._handler, self.host, self.port):
+            self._ready.set()
+            await self._stop.wait()
+
+    def start(self):
+        if websockets is None:
+            raise RuntimeError("websockets no instalado")
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self._serve())
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, name="lula-replay", daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+        return self
+
+    def stop(self):
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+def record_frames(symbols, out_path, seconds=60, testnet=False):
+    """Graba frames reales a un .jsonl para reproducirlos luego con ReplayServer."""
+    stream = MarketStream(symbols, testnet=testnet)
+
+    async def _rec():
+        end = time.time() + seconds
+        async with websockets.connect(stream._streams_url()) as ws:
+            with open(out_path, "w", encoding="utf-8") as f:
+                while time.time() < end:
+                    try:
+                        raw = await asyncio.wait_for(ws.recv(), timeout=1.0)
+                    except asyncio.TimeoutError:
+                        continue
+                    f.write((raw if isinstance(raw, str) else raw.decode()) + "\n")
+
+    asyncio.run(_rec())
@@ -2,30 +2,15 @@
 import os, sys
 
 
-def start_web_server():
-    from http.server import HTTPServer, SimpleHTTPRequestHandler
-
-    class TinyHandler(SimpleHTTPRequestHandler):
-        def log_message(self, format, *args):
-            return
-
-        def do_GET(self):
-            if self.path == "/favicon.ico":
-                self.send_response(204)
-                self.end_headers()
-                return
-            try:
-                return super().do_GET()
-            except:
-                pass
+def start_web_server(board=None):
+    """Panel web multihilo servido desde memoria (ver dashboard.py)."""
+    from dashboard import DashboardState, serve
 
     os.makedirs("/app/data", exist_ok=True)
-    os.chdir("/app/data")
     try:
-        server = HTTPServer(("0.0.0.0", 5000), TinyHandler)
-        server.serve_forever()
-    except:
-        pass
+        serve(board if board is not None else DashboardState())
+    except Exception as e:
+        print(f"⚠️ Panel web caído: {e}")
 
 
 def calculate_ia_weight(prob):
@@ -0,0 +1,373 @@
+"""
+LULA TAPE v1.0 — GRABACIÓN Y REPRODUCCIÓN DE SESIONES
+Graba cada petición/respuesta de la sesión (REST de gen/safe a nivel de
+`exchange.request`, y las fuentes macro: VIX, DXY, F&G y S&P 500) con su hora
+en una cinta compacta (JSONL + gzip). El reproductor devuelve las respuestas
+en el mismo orden por petición y sustituye `time.time`/`time.sleep` por un reloj
+virtual: un día de producción se reproduce en segundos, bajo un profiler.
+
+    TAPE_MODE=record TAPE_PATH=/app/data/sesion.tape.gz python src/main.py
+    python src/tape.py /app/data/sesion.tape.gz --profile        # reproduce main()
+
+En modo cinta el stream websocket y el transporte asíncrono se desactivan, el
+servicio macro se refresca en línea (sin hilo) y las velas arrancan en frío
+(en memoria), así grabación y reproducción parten del mismo estado.
+La reproducción escribe el estado del bot en /app/data: usar una copia.
+"""
+
+import atexit
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+
+TAPE_MODE = os.getenv("TAPE_MODE", "").lower()  # "" | record | replay
+TAPE_PATH = os.getenv("TAPE_PATH", "/app/data/session.tape.gz")
+TAPE_VERSION = 1
+VOLATILE_PARAMS = {"limit"}
+TAPE_TAIL_SEC = 3600  # reproducción más allá de la última respuesta grabada → fin
+
+_real_time = time.time
+_real_sleep = time.sleep
+_current = None
+
+
+class TapeEnd(BaseException):
+    """Fin de la cinta: atraviesa los `except Exception` del bucle y termina main()."""
+
+
+class TapeMiss(Exception):
+    """Petición que no está en la cinta (la sesión reproducida divergió)."""
+
+
+class TapeError(Exception):
+    """Excepción grabada cuya clase no existe al reproducir."""
+
+
+def _key(*parts):
+    return json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+
+
+def _loose(key):
+    """
+    Clave sin los parámetros que dependen del reloj (p.ej. `limit` de las velas
+    incrementales): si la hora virtual cae a otro lado de una vela, la petición
+    exacta no está en la cinta pero su gemela sí.
+    """
+    try:
+        path, api, method, params = json.loads(key)
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(params, dict) or not VOLATILE_PARAMS & params.keys():
+        return None
+    params = {k: v for k, v in params.items() if k not in VOLATILE_PARAMS}
+    return _key(path, api, method, params)
+
+
+def _error_class(name):
+    """La clase ccxt grabada; si no existe aquí, una con el mismo nombre (se filtra por él)."""
+    try:
+        import ccxt
+
+        cls = getattr(ccxt, name, None)
+        if isinstance(cls, type) and issubclass(cls, Exception):
+            return cls
+    except ImportError:
+        pass
+    return type(name or "TapeError", (TapeError,), {})
+
+
+# =========================
+# GRABACIÓN
+# =========================
+
+
+class TapeRecorder:
+    mode = "record"
+
+    def __init__(self, path=TAPE_PATH):
+        self.path = path
+        self.count = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = gzip.open(path, "wt", encoding="utf-8", compresslevel=6)
+        self._write({"tape": TAPE_VERSION, "t0": _real_time()})
+        atexit.register(self.close)
+
+    def _write(self, rec):
+        line = json.dumps(rec, separators=(",", ":"), default=str)
+        with self._lock:
+            if self._f is not None:
+                self._f.write(line + "\n")
+
+    def _record(self, t, channel, key, ok, payload):
+        self.count += 1
+        self._write([round(t, 3), channel, key, 1 if ok else 0, payload])
+
+    def wrap_exchange(self, ex, name):
+        """Envuelve el `request` crudo (antes que métricas y gobernador)."""
+        original = ex.request
+
+        def request(path, api="public", method="GET", params=None, *args, **kwargs):
+            key = _key(path, api, method, params or {})
+            t = _real_time()
+            try:
+                params = params if params is not None else {}
+                res = original(path, api, method, params, *args, **kwargs)
+            except Exception as e:
+                err = {"e": type(e).__name__, "m": str(e)}
+                self._record(t, f"ex.{name}", key, False, err)
+                raise
+            headers = dict(getattr(ex, "last_response_headers", None) or {})
+            self._record(t, f"ex.{name}", key, True, {"r": res, "h": headers})
+            return res
+
+        ex.request = request
+        return ex
+
+    def wrap_provider(self, provider):
+        """Envuelve `provider.fetch(name, current)` del servicio macro."""
+        original = provider.fetch
+
+        def fetch(name, current=None):
+            t = _real_time()
+            try:
+                value = original(name, current)
+            except Exception as e:
+                self._record(t, "macro", name, False, {"e": type(e).__name__, "m": str(e)})
+                raise
+            self._record(t, "macro", name, True, {"r": value})
+            return value
+
+        provider.fetch = fetch
+        return provider
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+
+# =========================
+# REPRODUCCIÓN
+# =========================
+
+
+class VirtualClock:
+    """
+    Reloj de la reproducción. Avanza con los `sleep` del hilo principal y salta
+    a la hora grabada de cada respuesta consumida. Los demás hilos solo ceden CPU.
+    """
+
+    def __init__(self, start):
+        self.t = float(start)
+        self._lock = threading.Lock()
+        self.slept = 0.0
+        self.end = None  # TapeReplayer lo llama al agotarse la cinta
+
+    def time(self):
+        return self.t
+
+    def seek(self, t):
+        with self._lock:
+            if t > self.t:
+                self.t = t
+
+    def sleep(self, seconds):
+        if threading.current_thread() is not threading.main_thread():
+            _real_sleep(min(max(seconds, 0.0), 0.005))
+            return
+        if self.end is not None:
+            self.end()
+        with self._lock:
+            self.t += max(0.0, seconds)
+            self.slept += max(0.0, seconds)
+
+
+class TapeReplayer:
+    mode = "replay"
+
+    def __init__(self, path=TAPE_PATH, strict=False, seed=0):
+        self.path = path
+        self.strict = strict
+        self.queues = defaultdict(deque)  # {(canal, clave): deque[[t, ok, payload, usada]]}
+        self.loose = defaultdict(deque)  # mismas entradas por clave sin parámetros volátiles
+        self.total = 0
+        self.served = 0
+        self.misses = 0
+        self.t0 = None
+        self.t_last = 0.0
+        self._lock = threading.Lock()
+        self._load()
+        self.clock = VirtualClock(self.t0)
+        self.clock.end = self._check_end
+        random.seed(seed)  # el riesgo del Guardian lleva ruido: misma semilla, misma sesión
+
+    def _load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("tape") != TAPE_VERSION:
+                raise ValueError(f"Cinta {self.path}: versión {header.get('tape')} no soportada")
+            self.t0 = header["t0"]
+            for line in f:
+                try:
+                    t, channel, key, ok, payload = json.loads(line)
+                except ValueError:
+                    break  # cola truncada (sesión cortada): se reproduce hasta aquí
+                entry = [t, ok, payload, False]
+                self.queues[(channel, key)].append(entry)
+                loose = _loose(key) if channel.startswith("ex.") else None
+                if loose is not None:
+                    self.loose[(channel, loose)].append(entry)
+                self.total += 1
+                self.t_last = max(self.t_last, t)
+
+    @property
+    def done(self):
+        return self.served >= self.total
+
+    def _check_end(self):
+        # Una respuesta que nadie vuelve a pedir no debe dejar la reproducción en bucle
+        if self.done or self.clock.t > self.t_last + TAPE_TAIL_SEC:
+            raise TapeEnd(f"cinta agotada ({self.served} respuestas)")
+
+    @staticmethod
+    def _pop(q):
+        while q:
+            entry = q.popleft()
+            if not entry[3]:
+                entry[3] = True
+                return entry
+        return None
+
+    def _next(self, channel, key):
+        with self._lock:
+            entry = self._pop(self.queues.get((channel, key)) or deque())
+            if entry is None and channel.startswith("ex."):
+                loose = _loose(key)
+                if loose is not None:
+                    entry = self._pop(self.loose.get((channel, loose)) or deque())
+            if entry is None:
+                self.misses += 1
+                if self.done:
+                    raise TapeEnd(f"cinta agotada ({self.served} respuestas)")
+                if self.strict:
+                    raise TapeEnd(f"petición fuera de la cinta: {channel} {key}")
+                raise TapeMiss(f"{channel} {key[:120]}")
+            t, ok, payload, _ = entry
+            self.served += 1
+        self.clock.seek(t)
+        if not ok:
+            raise _error_class(payload.get("e", ""))(payload.get("m", ""))
+        return payload
+
+    def wrap_exchange(self, ex, name):
+        def request(path, api="public", method="GET", params=None, *args, **kwargs):
+            payload = self._next(f"ex.{name}", _key(path, api, method, params or {}))
+            ex.last_response_headers = payload.get("h") or {}
+            return payload["r"]
+
+        ex.request = request
+        return ex
+
+    def wrap_provider(self, provider):
+        def fetch(name, current=None):
+            return self._next("macro", name)["r"]
+
+        provider.fetch = fetch
+        return provider
+
+    def install(self):
+        """Sustituye time.time / time.sleep por el reloj virtual (todo el proceso)."""
+        time.time = self.clock.time
+        time.sleep = self.clock.sleep
+        return self
+
+    def uninstall(self):
+        time.time, time.sleep = _real_time, _real_sleep
+
+    def stats(self):
+        return {
+            "respuestas": self.total,
+            "servidas": self.served,
+            "fallos": self.misses,
+            "horas_virtuales": round((self.clock.t - self.t0) / 3600, 2),
+            "horas_grabadas": round((self.t_last - self.t0) / 3600, 2),
+        }
+
+    def close(self):
+        self.uninstall()
+
+
+# =========================
+# ACCESO
+# =========================
+
+
+def current():
+    """La cinta activa del proceso (o None)."""
+    return _current
+
+
+def from_env(mode=TAPE_MODE, path=TAPE_PATH):
+    """Abre la cinta según TAPE_MODE (una vez por proceso). None = sin cinta."""
+    global _current
+    if _current is None and mode in ("record", "replay"):
+        if mode == "record":
+            _current = TapeRecorder(path)
+            print(f"📼 Grabando sesión en {path}")
+        else:
+            _current = TapeReplayer(path).install()
+            print(f"📼 Reproduciendo {path} ({_current.total} respuestas)")
+    return _current
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reproduce una sesión grabada de main()")
+    parser.add_argument("path")
+    parser.add_argument("--profile", action="store_true", help="cProfile de la reproducción")
+    parser.add_argument("--top", type=int, default=30)
+    parser.add_argument("--out", default=None, help="guardar las estadísticas (.prof)")
+    parser.add_argument("--strict", action="store_true", help="parar en la primera divergencia")
+    args = parser.parse_args()
+
+    # El módulo importado (no __main__) es el que ven connection y main
+    import tape as tp
+
+    tp._current = tp.TapeReplayer(args.path, strict=args.strict).install()
+    os.environ.update(TAPE_MODE="replay", TAPE_PATH=args.path)
+    print(f"📼 Reproduciendo {args.path} ({tp._current.total} respuestas)")
+
+    import main as lula
+
+    profiler = None
+    if args.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    wall0 = time.perf_counter()
+    try:
+        lula.main()
+    except tp.TapeEnd as e:
+        print(f"⏹️ {e}")
+    finally:
+        wall = time.perf_counter() - wall0
+        if profiler is not None:
+            profiler.disable()
+        tp._current.uninstall()
+
+    print(f"📼 {tp._current.stats()} en {wall:.2f}s reales")
+    if profiler is not None:
+        import pstats
+
+        stats = pstats.Stats(profiler).sort_stats("cumulative")
+        stats.print_stats(args.top)
+        if args.out:
+            stats.dump_stats(args.out)
@@ -0,0 +1,208 @@
+"""
+LULA TRANSPORT v1.0 — TRANSPORTE ASÍNCRONO PARA CCXT (FACHADA SÍNCRONA)
+Un bucle asyncio persistente en su propio hilo con UNA sesión aiohttp:
+conexiones keep-alive reutilizadas entre ciclos, caché DNS y un tope global de
+peticiones simultáneas. main.py sigue siendo síncrono: cada llamada se lanza al
+bucle y se espera su resultado.
+
+    tr = AsyncTransport().start()
+    tr.add("gen", "binance", config, sandbox=True, markets_from=gen_sync, governor=gov)
+    tr.call("gen", "fetch_balance")
+    tr.gather([("gen", "fetch_ohlcv", ("BTC/USDT", "1h"), {"limit": 200}),
+               ("safe", "fetch_ticker", ("XMR/USDT",), {})])   # → [res | Exception]
+
+Sin aiohttp o sin ccxt.async_support, `available()` es False y el gestor sigue
+con ccxt síncrono e hilos.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import metrics
+from governor import LANE_CTX, current_lane
+
+try:
+    import aiohttp
+    import ccxt.async_support as ccxt_async
+except ImportError:  # el bot funciona igual con ccxt síncrono
+    aiohttp = None
+    ccxt_async = None
+
+MAX_CONCURRENCY = int(os.getenv("TRANSPORT_CONCURRENCY", 16))
+DNS_TTL_SEC = int(os.getenv("TRANSPORT_DNS_TTL", 300))
+KEEPALIVE_SEC = float(os.getenv("TRANSPORT_KEEPALIVE", 30))
+CALL_TIMEOUT_SEC = float(os.getenv("TRANSPORT_TIMEOUT", 30))
+
+
+def available():
+    return aiohttp is not None and ccxt_async is not None
+
+
+class AsyncTransport:
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, factory=None):
+        """factory(exchange_id, config) → exchange asíncrono (por defecto ccxt.async_support)."""
+        self.max_concurrency = max_concurrency
+        self.factory = factory
+        self.loop = None
+        self.session = None
+        self.exchanges = {}
+        self._sem = None
+        self._thread = None
+        self._ready = threading.Event()
+
+    # ---------- ciclo de vida ----------
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="lula-async", daemon=True)
+            self._thread.start()
+            self._ready.wait(5)
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        self._ready.set()
+        self.loop.run_forever()
+
+    async def _session(self):
+        if self.session is None and aiohttp is not None:
+            connector = aiohttp.TCPConnector(
+                limit=self.max_concurrency,
+                ttl_dns_cache=DNS_TTL_SEC,
+                keepalive_timeout=KEEPALIVE_SEC,
+                enable_cleanup_closed=True,
+            )
+            self.session = aiohttp.ClientSession(connector=connector)
+        return self.session
+
+    def close(self):
+        if self.loop is None:
+            return
+
+        async def _close():
+            for ex in self.exchanges.values():
+                try:
+                    await ex.close()
+                except Exception:
+                    pass
+            if self.session is not None:
+                await self.session.close()
+
+        try:
+            self.run(_close(), timeout=10)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    # ---------- exchanges ----------
+
+    def add(self, name, exchange_id, config, sandbox=False, markets_from=None, governor=None):
+        """
+        Crea el gemelo asíncrono de un exchange (misma config, sesión compartida).
+        governor: el RequestGovernor de ese exchange en el ccxt síncrono (solo Binance);
+        sin él, el limitador propio de ccxt.
+        """
+
+        async def _make():
+            config_async = dict(config)
+            session = await self._session()
+            if session is not None:
+                config_async["session"] = session  # ccxt no abre (ni cierra) la suya
+            config_async["asyncio_loop"] = self.loop
+            config_async["enableRateLimit"] = governor is None
+            if self.factory is not None:
+                ex = self.factory(exchange_id, config_async)
+            else:
+                ex = getattr(ccxt_async, exchange_id)(config_async)
+            if sandbox:
+                ex.set_sandbox_mode(True)
+            return ex
+
+        ex = self.run(_make())
+        self._instrument(ex, name)
+        if governor is not None:  # por fuera: la espera de turno no cuenta como latencia
+            governor.attach_async(ex, self.loop)
+        self.exchanges[name] = ex
+        if markets_from is not None:
+            self.share_markets(name, markets_from)
+        return ex
+
+    def share_markets(self, name, sync_exchange):
+        """
+        Reutiliza los mercados ya cargados por el ccxt síncrono (sin otra descarga)
+        y su desfase de reloj: sin `load_markets` el gemelo no lo mide y firmaría
+        con la hora local (adjustForTimeDifference).
+        """
+        markets = getattr(sync_exchange, "markets", None)
+        if markets:
+            self.exchanges[name].set_markets(markets, getattr(sync_exchange, "currencies", None))
+        offset = (getattr(sync_exchange, "options", None) or {}).get("timeDifference")
+        if offset is not None:
+            self.exchanges[name].options["timeDifference"] = offset
+
+    def _instrument(self, ex, name):
+        """Métricas por endpoint, igual que en el ccxt síncrono."""
+        original = ex.request
+        label = f"exchange.{name}"
+
+        async def request(path, api="public", method="GET", params=None, *args, **kwargs):
+            endpoint = f"{method} {api}/{path}" if isinstance(api, str) else f"{method} {path}"
+            with metrics.span(label, endpoint):
+                return await original(path, api, method, params, *args, **kwargs)
+
+        ex.request = request
+
+    # ---------- fachada síncrona ----------
+
+    def run(self, coro, timeout=CALL_TIMEOUT_SEC):
+        """Ejecuta una corrutina en el bucle y espera su resultado desde cualquier hilo."""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            future.cancel()  # que no siga ocupando el semáforo
+            raise TimeoutError(f"transporte: sin respuesta en {timeout:g}s") from None
+
+    async def _call(self, name, method, args, kwargs, lane_name=None):
+        # El carril del hilo que llamó (with lane(...)) no cruza al bucle: va por tarea
+        LANE_CTX.set(lane_name)
+        async with self._sem:
+            return await getattr(self.exchanges[name], method)(*args, **kwargs)
+
+    def call(self, name, method, *args, **kwargs):
+        return self.run(self._call(name, method, args, kwargs, current_lane()))
+
+    def gather(self, calls, timeout=CALL_TIMEOUT_SEC):
+        """
+        calls: [(exchange, método, args, kwargs)]. Todas a la vez, como mucho
+        max_concurrency en vuelo. Devuelve los resultados en orden; un fallo (o
+        pasar de `timeout`, contando la cola del semáforo) se devuelve como la
+        excepción sin cancelar al resto.
+        """
+        if not calls:
+            return []
+
+        lane_name = current_lane()
+
+        async def _one(n, m, a, k):
+            try:
+                call = self._call(n, m, tuple(a), dict(k), lane_name)
+                return await asyncio.wait_for(call, timeout)
+            except asyncio.TimeoutError:
+                return TimeoutError(f"{n}.{m}: sin respuesta en {timeout:g}s")
+
+        async def _all():
+            tasks = [_one(n, m, a, k) for n, m, a, k in calls]
+            return await asyncio.gather(*tasks, return_exceptions=True)
+
+        t0 = time.perf_counter()
+        try:
+            results = self.run(_all(), timeout + 5.0)  # margen: los tramos ya cortan solos
+        except TimeoutError as e:
+            results = [e] * len(calls)
+        metrics.REGISTRY.observe(("transport.gather", ""), time.perf_counter() - t0)
+        return results